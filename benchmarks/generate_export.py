@@ -0,0 +1,120 @@
+"""
+Generate synthetic Esploro exports for benchmarking the converters.
+
+Usage:
+    python benchmarks/generate_export.py export.csv --rows 1000000 --extra-columns 10
+
+The file has the ``RESEARCH_ASSET_ID`` and ``ASSET_KEYWORDS`` columns the
+converters expect, plus a title and any number of extra text columns. Knobs
+control the keyword count distribution, the share of hashtag keywords, the
+share of empty (NaN) cells and the share of quoted fields that embed ``@@``,
+commas, quotes or newlines.
+"""
+
+import argparse
+import csv
+import random
+
+DISTRIBUTIONS = ('uniform', 'poisson', 'skewed')
+
+def keyword_count(rng, distribution, mean, maximum):
+    """Draw the number of keywords for one asset"""
+    if distribution == 'uniform':
+        count = rng.randint(0, 2 * mean)
+    elif distribution == 'poisson':
+        # Knuth's method is fine for the small means used here
+        limit = pow(2.718281828459045, -mean)
+        count, product = 0, rng.random()
+        while product > limit:
+            count += 1
+            product *= rng.random()
+    else:
+        # Most assets have a few keywords, a long tail has very many
+        count = int(rng.paretovariate(1.5) * mean / 3)
+    return min(count, maximum)
+
+def generate_export(path, rows=10000, extra_columns=3, distribution='poisson',
+                    mean_keywords=6, max_keywords=400, hashtag_ratio=0.2,
+                    nan_ratio=0.05, quoted_ratio=0.05, vocabulary=20000, seed=0):
+    """
+    Write a synthetic export to path
+
+    Args:
+        path (str): Output CSV path
+        rows (int): Number of assets
+        extra_columns (int): Additional pass-through text columns
+        distribution (str): Keyword count distribution: uniform, poisson or skewed
+        mean_keywords (int): Mean keywords per asset
+        max_keywords (int): Cap on keywords per asset
+        hashtag_ratio (float): Share of keywords written as #hashtags
+        nan_ratio (float): Share of empty keyword and extra cells
+        quoted_ratio (float): Share of cells that need CSV quoting (embedded
+            @@, commas, quotes or newlines)
+        vocabulary (int): Number of distinct keywords
+        seed (int): Random seed, so runs are reproducible
+
+    Returns:
+        int: Size of the generated file in bytes
+    """
+    rng = random.Random(seed)
+    words = [f'keyword {i}' for i in range(vocabulary)]
+    awkward = ['with, comma', 'with "quotes"', 'multi\nline', ' padded ']
+
+    header = ['', 'RESEARCH_ASSET_ID', 'ASSET_KEYWORDS', 'TITLE']
+    header += [f'FIELD_{i+1}' for i in range(extra_columns)]
+
+    with open(path, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(header)
+        for row in range(rows):
+            if rng.random() < nan_ratio:
+                keywords = ''
+            else:
+                tokens = []
+                for _ in range(keyword_count(rng, distribution, mean_keywords, max_keywords)):
+                    token = words[int(rng.paretovariate(1.2)) % vocabulary]
+                    if rng.random() < quoted_ratio:
+                        token = f'{token} {rng.choice(awkward)}'
+                    if rng.random() < hashtag_ratio:
+                        token = '#' + token.replace(' ', '_')
+                    tokens.append(token)
+                keywords = '@@'.join(tokens)
+
+            title = f'Asset {row}'
+            if rng.random() < quoted_ratio:
+                title = f'{title}: notes @@ "draft", part {row % 7}'
+
+            extras = []
+            for i in range(extra_columns):
+                if rng.random() < nan_ratio:
+                    extras.append('')
+                elif rng.random() < quoted_ratio:
+                    extras.append(f'value {i}, {rng.choice(awkward)}')
+                else:
+                    extras.append(f'value {rng.randint(0, 10000)}')
+
+            writer.writerow([row, f'RA{row:09d}', keywords, title] + extras)
+        return csvfile.tell()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic Esploro keywords export")
+    parser.add_argument('output', help='CSV file to write')
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--extra-columns', type=int, default=3)
+    parser.add_argument('--distribution', choices=DISTRIBUTIONS, default='poisson')
+    parser.add_argument('--mean-keywords', type=int, default=6)
+    parser.add_argument('--max-keywords', type=int, default=400)
+    parser.add_argument('--hashtag-ratio', type=float, default=0.2)
+    parser.add_argument('--nan-ratio', type=float, default=0.05)
+    parser.add_argument('--quoted-ratio', type=float, default=0.05)
+    parser.add_argument('--vocabulary', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    size = generate_export(args.output, args.rows, args.extra_columns, args.distribution,
+                           args.mean_keywords, args.max_keywords, args.hashtag_ratio,
+                           args.nan_ratio, args.quoted_ratio, args.vocabulary, args.seed)
+    print(f"Wrote {args.rows} rows ({size / 1e6:.1f} MB) to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+"""
+Load test the web app: requests/s and latency percentiles for each conversion type.
+
+Usage:
+    python benchmarks/load_test.py --rows 2000 --requests 200 --concurrency 8
+    python benchmarks/load_test.py --url http://127.0.0.1:8000 --input export.csv
+
+Without --url a server is started on a free local port: the production entry
+point (src/wsgi.py, gunicorn or waitress with --workers) when one of them is
+installed, otherwise the threaded development server in this process. Its
+cache, job and work folders live in a temporary directory.
+
+Concurrent clients post the export to /upload for the numbered, same_name and
+hashtag_separate conversions in turn and read each response to the end, after
+an untimed warm-up round that lets every server process import and set up. Every
+upload gets one extra row with a unique ID, so each request really converts
+instead of being answered from the result cache; --cached sends identical
+uploads to measure cache hits. Results are printed and saved as JSON.
+"""
+
+import argparse
+import csv
+import http.client
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(BENCH_DIR, '..', 'src')
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, SRC_DIR)
+
+from generate_export import DISTRIBUTIONS, generate_export
+
+CONVERSION_TYPES = ('numbered', 'same_name', 'hashtag_separate')
+DELIVERIES = ('stream', 'file')
+SERVER_START_SECONDS = 30
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+def multipart_body(fields, filename, content):
+    """Encode form fields and one file as multipart/form-data, returning (body, content type)"""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+                 'Content-Type: text/csv\r\n\r\n'.encode())
+    parts.append(content)
+    parts.append(f'\r\n--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+def unique_row(columns, request_id):
+    """A CSV row for the export's columns that makes an upload's content unique"""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow([f'load-test-{request_id}'] + [''] * (columns - 1))
+    return buffer.getvalue().encode('utf-8')
+
+def post_upload(url, body, content_type):
+    """Post one upload and read the whole response, returning (seconds, ok)"""
+    parts = urlsplit(url)
+    started = time.perf_counter()
+    connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=300)
+    try:
+        connection.request('POST', '/upload', body, {'Content-Type': content_type})
+        response = connection.getresponse()
+        response.read()
+        ok = response.status == 200 and 'text/html' not in response.getheader('Content-Type', '')
+    except OSError:
+        ok = False
+    finally:
+        connection.close()
+    return time.perf_counter() - started, ok
+
+def run_load(url, content, conversion_type, delivery, requests, concurrency, cached=False):
+    """
+    Post requests uploads with concurrency clients at once
+
+    Returns:
+        dict: requests, errors, seconds, requests/s and p50/p95/max latency (ms)
+    """
+    columns = len(next(csv.reader(io.StringIO(content.split(b'\n', 1)[0].decode('utf-8-sig')))))
+    if not content.endswith(b'\n'):
+        content += b'\r\n'
+    fields = {'conversion_type': conversion_type, 'delivery': delivery}
+    shared = multipart_body(fields, 'export.csv', content) if cached else None
+    # Unique across runs too, so neither converted results nor parsed keywords are reused
+    run_id = uuid.uuid4().hex[:8]
+
+    def one(request_number):
+        body, content_type = shared or multipart_body(fields, 'export.csv',
+                                                      content + unique_row(columns, f'{run_id}-{request_number}'))
+        return post_upload(url, body, content_type)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies = [seconds * 1000 for seconds, ok in results if ok]
+    return {
+        'conversion_type': conversion_type,
+        'requests': requests,
+        'errors': sum(1 for _, ok in results if not ok),
+        'seconds': elapsed,
+        'requests_per_second': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 0.50),
+        'p95_ms': percentile(latencies, 0.95),
+        'max_ms': max(latencies, default=None),
+    }
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def _wait_for(url, process=None):
+    # True once the server answers, False if it exited first or never came up
+    parts = urlsplit(url)
+    deadline = time.monotonic() + SERVER_START_SECONDS
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            return False
+        try:
+            connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=5)
+            connection.request('GET', '/help')
+            connection.getresponse().read()
+            connection.close()
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+def start_server(workdir, workers):
+    """
+    Start a local server, returning (url, description, stop callable)
+
+    The production entry point is tried first; the development server is the fallback.
+    """
+    env = dict(os.environ,
+               KEYWORDS_SECRET_KEY=f'load-test-{uuid.uuid4().hex}',
+               KEYWORDS_CACHE_FOLDER=os.path.join(workdir, 'cache'),
+               KEYWORDS_JOB_FOLDER=os.path.join(workdir, 'jobs'),
+               KEYWORDS_WORK_FOLDER=workdir)
+    port = _free_port()
+    url = f'http://127.0.0.1:{port}'
+    process = subprocess.Popen([sys.executable, os.path.join(SRC_DIR, 'wsgi.py'), '--port', str(port),
+                                '--workers', str(workers)],
+                               cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if _wait_for(url, process):
+        def stop():
+            process.terminate()
+            process.wait()
+        return url, f'wsgi.py, {workers} workers', stop
+    process.kill()
+    process.wait()
+
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    from web_app import create_app
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    app = create_app({key[len('KEYWORDS_'):]: value for key, value in env.items() if key.startswith('KEYWORDS_')})
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    def stop():
+        server.shutdown()
+        thread.join()
+    return f'http://127.0.0.1:{server.server_port}', 'development server (threaded, 1 process)', stop
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the web app's conversions")
+    parser.add_argument('--url', help='Running server to test (default: start one locally)')
+    parser.add_argument('--input', help='Existing CSV export to upload (skips generation)')
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--distribution', choices=DISTRIBUTIONS, default='poisson')
+    parser.add_argument('--mean-keywords', type=int, default=6)
+    parser.add_argument('--types', nargs='+', choices=CONVERSION_TYPES, default=list(CONVERSION_TYPES))
+    parser.add_argument('--delivery', choices=DELIVERIES, default='stream')
+    parser.add_argument('--requests', type=int, default=200, help='Requests per conversion type')
+    parser.add_argument('--concurrency', type=int, default=8, help='Clients posting at the same time')
+    parser.add_argument('--warmup', type=int, default=32, help='Untimed requests sent first')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Server processes for the local production server')
+    parser.add_argument('--cached', action='store_true', help='Send identical uploads (result cache hits)')
+    parser.add_argument('--output', default='load_test_results.json', help='JSON results file')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        input_file = args.input
+        if input_file is None:
+            input_file = os.path.join(tmpdir, 'synthetic_export.csv')
+            generate_export(input_file, args.rows, distribution=args.distribution,
+                            mean_keywords=args.mean_keywords)
+        with open(input_file, 'rb') as f:
+            content = f.read()
+
+        url, server, stop = (args.url, args.url, lambda: None) if args.url else start_server(tmpdir, args.workers)
+        print(f"Load testing {server}: {len(content) / 1e6:.2f} MB uploads, {args.requests} requests per type, "
+              f"{args.concurrency} concurrent clients, delivery={args.delivery}")
+        try:
+            if args.warmup:
+                run_load(url, content, args.types[0], args.delivery, args.warmup, args.concurrency, args.cached)
+            results = [run_load(url, content, conversion_type, args.delivery, args.requests, args.concurrency,
+                                args.cached)
+                       for conversion_type in args.types]
+        finally:
+            stop()
+
+    print(f"{'conversion':<18} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'errors':>6}")
+    for result in results:
+        print(f"{result['conversion_type']:<18} {result['requests_per_second']:>8.1f} "
+              f"{result['p50_ms'] or 0:>8.1f} {result['p95_ms'] or 0:>8.1f} {result['max_ms'] or 0:>8.1f} "
+              f"{result['errors']:>6}")
+
+    report = {
+        'server': server,
+        'params': {'input': args.input, 'rows': None if args.input else args.rows, 'upload_mb': len(content) / 1e6,
+                   'delivery': args.delivery, 'requests': args.requests, 'concurrency': args.concurrency,
+                   'cached': args.cached},
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""
+Measure how the multiprocess converter scales with the number of workers.
+
+Usage:
+    python benchmarks/parallel_scaling.py export.csv [--workers 1 2 4 8] [--mode numbered]
+
+Each run converts the same file into a temporary output and reports wall time,
+MB/s and speedup over the single-process streaming engine.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from parallel_converter import parallel_convert
+from stream_converter import MODES, stream_convert
+
+def time_run(input_file, mode, workers):
+    """Convert once and return elapsed seconds"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        output_file = os.path.join(tmpdir, 'out.csv')
+        start = time.perf_counter()
+        if workers == 1:
+            stream_convert(input_file, output_file, mode)
+        else:
+            parallel_convert(input_file, output_file, mode, workers=workers)
+        return time.perf_counter() - start
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('input_file', help='CSV export to convert')
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=[1, 2, 4, 8, 16, 32], help='Worker counts to try')
+    parser.add_argument('--mode', choices=MODES, default='numbered')
+    args = parser.parse_args(argv)
+
+    size_mb = os.path.getsize(args.input_file) / 1e6
+    print(f"{'workers':>7}  {'seconds':>8}  {'MB/s':>8}  {'speedup':>7}")
+    baseline = None
+    for workers in args.workers:
+        elapsed = time_run(args.input_file, args.mode, workers)
+        baseline = baseline or elapsed
+        print(f"{workers:>7}  {elapsed:>8.2f}  {size_mb / elapsed:>8.1f}  {baseline / elapsed:>6.2f}x")
+
+if __name__ == '__main__':
+    main()
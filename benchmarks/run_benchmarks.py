@@ -0,0 +1,208 @@
+"""
+Benchmark every conversion mode and engine of both converter modules.
+
+Usage:
+    python benchmarks/run_benchmarks.py --rows 200000 --output results.json
+    python benchmarks/run_benchmarks.py --input export.csv --compare old.json
+
+A synthetic export is generated (see generate_export.py) unless --input is
+given. Each conversion runs in a fresh subprocess so its peak RSS can be
+measured in isolation; rows/s, MB/s and peak RSS are printed and saved as JSON.
+With --compare, timings are shown next to a previous results file.
+
+--round-trip also checks the reverse converter: each mode's output (plain and
+capped) is collapsed back to @@ delimited form and converted again, which
+must reproduce the output byte for byte; the collapse is timed as well.
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(BENCH_DIR, '..', 'src')
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, SRC_DIR)
+
+from generate_export import DISTRIBUTIONS, generate_export
+
+MODULES = ('keywords_converter', 'web_app')
+MODES = ('numbered', 'same_name', 'hashtag_separate')
+ENGINES = ('pandas', 'stream', 'vectorized')
+
+def _child(module_name, mode, engine, input_file, output_file):
+    """Run one conversion in this process and print its measurements as JSON"""
+    import contextlib
+    import importlib
+    import io
+
+    module = importlib.import_module(module_name)
+    convert = getattr(module, f'convert_keywords_format_{mode}')
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = convert(input_file, output_file, engine=engine)
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        'seconds': elapsed,
+        'rows': result[1] if result else None,
+        'output_bytes': os.path.getsize(output_file),
+        # ru_maxrss is in kilobytes on Linux
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }))
+
+def run_case(module_name, mode, engine, input_file, workdir):
+    """Run one conversion in a subprocess and return its measurements"""
+    output_file = os.path.join(workdir, f'{module_name}_{mode}_{engine}.csv')
+    command = [sys.executable, os.path.abspath(__file__), '--child',
+               module_name, mode, engine, os.path.abspath(input_file), output_file]
+    env = dict(os.environ, PYTHONPATH=os.path.abspath(SRC_DIR))
+    # Run in the scratch folder so nothing is left in the caller's working directory
+    completed = subprocess.run(command, cwd=workdir, env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        return {'error': completed.stderr.strip().splitlines()[-1]}
+    measured = json.loads(completed.stdout.strip().splitlines()[-1])
+    os.remove(output_file)
+    return measured
+
+def run_benchmarks(input_file, modules=MODULES, modes=MODES, engines=ENGINES):
+    """
+    Time every module/mode/engine combination on input_file
+
+    Returns:
+        list: One dict per case with seconds, rows/s, MB/s and peak RSS
+    """
+    size_mb = os.path.getsize(input_file) / 1e6
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for module_name in modules:
+            for mode in modes:
+                for engine in engines:
+                    measured = run_case(module_name, mode, engine, input_file, workdir)
+                    case = {'module': module_name, 'mode': mode, 'engine': engine}
+                    case.update(measured)
+                    if 'seconds' in measured:
+                        case['rows_per_s'] = (measured['rows'] or 0) / measured['seconds']
+                        case['mb_per_s'] = size_mb / measured['seconds']
+                    results.append(case)
+                    print(_format_case(case), flush=True)
+    return results
+
+def check_round_trip(input_file, modes=MODES, caps=(None, 3)):
+    """
+    Convert input_file, collapse the output with reverse_convert and convert
+    the result again, for every mode and cap
+
+    Returns:
+        list: One dict per case with mode, cap, seconds and rows/s of the
+        collapse and whether the second conversion matched the first
+    """
+    from reverse_converter import reverse_convert
+    from stream_converter import stream_convert
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        converted = os.path.join(workdir, 'converted.csv')
+        collapsed = os.path.join(workdir, 'collapsed.csv')
+        reconverted = os.path.join(workdir, 'reconverted.csv')
+        for mode in modes:
+            for cap in caps:
+                stream_convert(input_file, converted, mode, cap=cap)
+                start = time.perf_counter()
+                _, rows = reverse_convert(converted, collapsed)
+                elapsed = time.perf_counter() - start
+                stream_convert(collapsed, reconverted, mode, cap=cap)
+                with open(converted, 'rb') as first, open(reconverted, 'rb') as second:
+                    identical = first.read() == second.read()
+                case = {'mode': mode, 'cap': cap, 'seconds': elapsed, 'rows_per_s': rows / elapsed,
+                        'identical': identical}
+                results.append(case)
+                print(f"reverse {mode:<17} cap={cap!s:<5} {elapsed:>8.2f}s {case['rows_per_s']:>10.0f} rows/s  "
+                      f"{'round trip OK' if identical else 'ROUND TRIP MISMATCH'}", flush=True)
+    return results
+
+def _case_key(case):
+    return case['module'], case['mode'], case['engine']
+
+def _format_case(case, previous=None):
+    label = f"{case['module']:<19} {case['mode']:<17} {case['engine']:<11}"
+    if 'error' in case:
+        return f"{label} FAILED: {case['error']}"
+    line = (f"{label} {case['seconds']:>8.2f}s {case['rows_per_s']:>10.0f} rows/s "
+            f"{case['mb_per_s']:>7.1f} MB/s {case['peak_rss_mb']:>8.1f} MB RSS")
+    if previous and 'seconds' in previous:
+        line += f"  ({previous['seconds'] / case['seconds']:.2f}x vs previous)"
+    return line
+
+def main(argv=None):
+    if argv is None and len(sys.argv) > 1 and sys.argv[1] == '--child':
+        _child(*sys.argv[2:])
+        return
+
+    parser = argparse.ArgumentParser(description="Benchmark the keyword converters")
+    parser.add_argument('--input', help='Existing CSV export to benchmark (skips generation)')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--extra-columns', type=int, default=3)
+    parser.add_argument('--distribution', choices=DISTRIBUTIONS, default='poisson')
+    parser.add_argument('--mean-keywords', type=int, default=6)
+    parser.add_argument('--hashtag-ratio', type=float, default=0.2)
+    parser.add_argument('--nan-ratio', type=float, default=0.05)
+    parser.add_argument('--quoted-ratio', type=float, default=0.05)
+    parser.add_argument('--modules', nargs='+', choices=MODULES, default=list(MODULES))
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    parser.add_argument('--engines', nargs='+', choices=ENGINES, default=list(ENGINES))
+    parser.add_argument('--output', default='benchmark_results.json', help='JSON results file')
+    parser.add_argument('--compare', help='Previous JSON results file to compare against')
+    parser.add_argument('--round-trip', action='store_true',
+                        help='Also collapse each output with the reverse converter and check that '
+                             'converting it again reproduces the output')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        input_file = args.input
+        params = {'input': input_file}
+        if input_file is None:
+            input_file = os.path.join(tmpdir, 'synthetic_export.csv')
+            params = {'rows': args.rows, 'extra_columns': args.extra_columns,
+                      'distribution': args.distribution, 'mean_keywords': args.mean_keywords,
+                      'hashtag_ratio': args.hashtag_ratio, 'nan_ratio': args.nan_ratio,
+                      'quoted_ratio': args.quoted_ratio}
+            generate_export(input_file, args.rows, args.extra_columns, args.distribution,
+                            args.mean_keywords, hashtag_ratio=args.hashtag_ratio,
+                            nan_ratio=args.nan_ratio, quoted_ratio=args.quoted_ratio)
+        params['input_mb'] = os.path.getsize(input_file) / 1e6
+        print(f"Benchmarking {params['input_mb']:.1f} MB export")
+
+        results = run_benchmarks(input_file, args.modules, args.modes, args.engines)
+        round_trip = check_round_trip(input_file, args.modes) if args.round_trip else None
+
+    if args.compare:
+        with open(args.compare) as f:
+            previous = {_case_key(case): case for case in json.load(f)['results']}
+        print(f"\nCompared with {args.compare}:")
+        for case in results:
+            print(_format_case(case, previous.get(_case_key(case))))
+
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'params': params,
+        'results': results,
+    }
+    if round_trip is not None:
+        report['round_trip'] = round_trip
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to {args.output}")
+    if round_trip and not all(case['identical'] for case in round_trip):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,412 @@
+"""
+pandas' type inference and number formatting for streamed rows.
+
+``pandas.read_csv`` turns the cells it can parse into integers, floats or
+booleans, and ``DataFrame.to_csv`` writes those values back in its own
+format: ``001`` becomes ``1``, ``1.50`` becomes ``1.5``, ``true`` becomes
+``True`` and an integer column with missing cells is written as floats
+(``2.0``). The streaming engines read cells as text, so this module lets them
+write what the pandas engine writes without holding the file in memory:
+
+1. ``ColumnTypes`` is fed every data row in the first pass. It keeps, per
+   column, one small state for each block of rows pandas infers a type for
+   (``pandas_chunk_rows``; the C parser works through the file in blocks of
+   that many rows and infers each block's types on its own).
+2. ``ColumnTypes.formats`` resolves the dtype pandas gives each block and the
+   dtype the blocks are concatenated into, and returns ``ColumnFormats``,
+   which rewrites the cells of the second pass the way ``to_csv`` writes them.
+
+The C parser tries int64, then uint64 (after an overflow), then Python ints
+(after another), then float64, bool and finally text, and each attempt stops
+at the first cell it cannot convert, so which attempt a block ends up with
+can depend on which cell comes first. The state records, besides what every
+cell allowed, the error the first failing cell gave each integer attempt.
+Two outcomes keep the block's cells as read, missing-value markers included
+(``'raw'``): integers beyond 64 bits mixed with other values, and integers
+above the int64 range mixed with negative or missing ones.
+
+The state is a few bytes per column for every block (65536 rows for a
+10-column file), so memory stays constant for practical purposes.
+
+Floats are parsed with a port of the C parser's ``precise_xstrtod``, which
+is not correctly rounded for numbers with 16 or more significant digits, so
+the written value is the one pandas computed rather than Python's ``float()``.
+"""
+
+import re
+import sys
+
+from keyword_parser import NA_VALUES
+
+# State bits: what the cells of one column in one block allow
+NA = 1             # a missing-value marker
+SIGNED = 2         # a cell starting with '-' (uint64 attempt)
+UINT = 4           # an integer above int64 max (uint64 attempt)
+NOT_PYLONG = 8     # a cell Python's int parser rejects
+NOT_FLOAT = 16
+NOT_BOOL = 32
+# Error of the first cell the int64 attempt failed on, and of the uint64 attempt
+INT64_ERROR = 3 << 6
+INT64_OVERFLOW = 1 << 6
+INT64_INVALID = 2 << 6
+INT64_NO_DIGITS = 3 << 6
+UINT64_ERROR = 3 << 8
+UINT64_OVERFLOW = 1 << 8
+UINT64_INVALID = 2 << 8
+UINT64_NO_DIGITS = 3 << 8
+_ERRORS = INT64_ERROR | UINT64_ERROR
+
+INT64_MIN = -(1 << 63)
+INT64_MAX = (1 << 63) - 1
+UINT64_MAX = (1 << 64) - 1
+
+# Whitespace the C parser skips around numbers
+_SPACE_CHARS = ' \t\n\r\x0b\x0c'
+_SPACE = '[ \t\n\r\x0b\x0c]*'
+_LEADING_INTEGER = re.compile(_SPACE + r'([+-]?)([0-9]*)')
+_PYLONG = re.compile(_SPACE + r'[+-]?[0-9](?:_?[0-9])*' + _SPACE + r'\Z')
+_FLOAT = re.compile(_SPACE + r'([+-]?)([0-9]*)(?:\.([0-9]*))?(?:[eE]([+-]?[0-9]+))?' + _SPACE + r'\Z')
+_INFINITY = {'inf': float('inf'), '+inf': float('inf'), '-inf': float('-inf'),
+             'infinity': float('inf'), '+infinity': float('inf'), '-infinity': float('-inf')}
+_BOOLS = frozenset(['true', 'false'])
+_POWERS = [float(f'1e{i}') for i in range(309)]
+# Significant digits precise_xstrtod accumulates before ignoring the rest
+_MAX_DIGITS = 17
+# Digits beyond which Python refuses to parse an integer (0 means no limit)
+_MAX_INT_DIGITS = sys.get_int_max_str_digits() if hasattr(sys, 'get_int_max_str_digits') else 0
+# Distinct cells a ColumnTypes remembers the state of before its cache is cleared
+CLASSIFY_CACHE_SIZE = 1 << 16
+
+def pandas_chunk_rows(width):
+    """Rows per block the pandas C parser infers types for, given the number of columns"""
+    heuristic = 2 ** 20 // max(width, 1)
+    rows = 1
+    while rows * 2 < heuristic:
+        rows *= 2
+    return rows
+
+def parse_float(text):
+    """
+    The float pandas.read_csv reads from text, or None if it is not a number
+
+    Ported from precise_xstrtod in pandas' tokenizer: digits are accumulated
+    in a double (17 at most) and the result scaled by a power of ten.
+    """
+    match = _FLOAT.match(text)
+    if match is None or not (match.group(2) or match.group(3)):
+        return _INFINITY.get(text.lower()) if text.isascii() else None
+    sign, whole, fraction, exponent_text = match.groups()
+    number = 0.0
+    digits = 0
+    exponent = 0
+    for digit in whole:
+        if digits < _MAX_DIGITS:
+            number = number * 10.0 + (ord(digit) - 48)
+            digits += 1
+        else:
+            exponent += 1
+    if fraction:
+        fraction = fraction[:_MAX_DIGITS - digits]
+        for digit in fraction:
+            number = number * 10.0 + (ord(digit) - 48)
+        exponent -= len(fraction)
+    if sign == '-':
+        number = -number
+    if exponent_text:
+        exponent += int(exponent_text)
+
+    if exponent > 308:
+        if number == 0:
+            return 0.0
+        return float('inf') if number > 0 else float('-inf')
+    if exponent > 0:
+        return number * _POWERS[exponent]
+    if exponent < -308:
+        if exponent < -616:
+            return 0.0
+        return number / _POWERS[-308 - exponent] / _POWERS[308]
+    return number / _POWERS[-exponent]
+
+def _leading_integer(digits):
+    # Value of the digits strtoll/strtoull read, or None when it is beyond uint64
+    significant = digits.lstrip('0')
+    return int(significant or '0') if len(significant) <= 20 else None
+
+def classify(cell):
+    """State bits of one cell, as the C parser's conversion attempts see it"""
+    if cell in NA_VALUES:
+        return NA
+    state = 0
+
+    # int64: str_to_int64
+    match = _LEADING_INTEGER.match(cell)
+    sign, digits = match.groups()
+    rest = cell[match.end():]
+    if not digits:
+        state |= INT64_NO_DIGITS
+    else:
+        value = _leading_integer(digits)
+        if value is not None and sign == '-':
+            value = -value
+        if value is None or not INT64_MIN <= value <= INT64_MAX:
+            state |= INT64_INVALID if rest else INT64_OVERFLOW
+        elif rest.lstrip(_SPACE_CHARS):
+            state |= INT64_INVALID
+
+    # uint64: str_to_uint64 takes any cell starting with '-' as a signed integer
+    if sign == '-':
+        state |= SIGNED
+    elif not digits:
+        state |= UINT64_NO_DIGITS
+    else:
+        value = _leading_integer(digits)
+        if value is None or value > UINT64_MAX:
+            state |= UINT64_INVALID if rest else UINT64_OVERFLOW
+        elif rest.lstrip(_SPACE_CHARS):
+            state |= UINT64_INVALID
+        elif value > INT64_MAX:
+            state |= UINT
+
+    if not (cell.isascii() and _PYLONG.match(cell)) or (
+            _MAX_INT_DIGITS and len(cell) > _MAX_INT_DIGITS and sum(map(str.isdigit, cell)) > _MAX_INT_DIGITS):
+        state |= NOT_PYLONG
+    if parse_float(cell) is None:
+        state |= NOT_FLOAT
+    if not (cell.isascii() and cell.lower() in _BOOLS):
+        state |= NOT_BOOL
+    return state
+
+def settled(state):
+    """True if no further cell can change the kind of a block with this state"""
+    int64_error = state & INT64_ERROR
+    if not int64_error:
+        return False
+    if int64_error == INT64_OVERFLOW:
+        uint64_error = state & UINT64_ERROR
+        if not uint64_error:
+            return False
+        if uint64_error == UINT64_OVERFLOW:
+            return bool(state & NOT_PYLONG)
+    return state & (NOT_FLOAT | NOT_BOOL) == NOT_FLOAT | NOT_BOOL
+
+def block_kind(state):
+    """
+    The kind of array pandas makes of one block of a column, from its state
+
+    Returns:
+        str: 'na' (all missing), 'int', 'uint', 'int_float' (integers with
+        missing cells, as float64), 'float', 'bool', 'bool_object' (booleans
+        with missing cells), 'int_object' (Python ints), 'raw' (the cells as
+        read, missing-value markers included) or 'text'
+    """
+    if state == NA:
+        return 'na'
+    int64_error = state & INT64_ERROR
+    if not int64_error:
+        return 'int_float' if state & NA else 'int'
+    if int64_error == INT64_OVERFLOW:
+        uint64_error = state & UINT64_ERROR
+        if uint64_error == UINT64_OVERFLOW:
+            return 'raw' if state & NOT_PYLONG else 'int_object'
+        if not uint64_error:
+            if state & UINT and state & (SIGNED | NA):
+                return 'raw'
+            if state & SIGNED:
+                return 'raw' if state & NOT_PYLONG else 'int_object'
+            return 'uint'
+    if not state & NOT_FLOAT:
+        return 'float'
+    if not state & NOT_BOOL:
+        return 'bool_object' if state & NA else 'bool'
+    return 'text'
+
+_DTYPES = {'na': 'float64', 'float': 'float64', 'int_float': 'float64', 'int': 'int64', 'uint': 'uint64',
+           'bool': 'bool', 'bool_object': 'object', 'int_object': 'object', 'raw': 'object', 'text': 'object'}
+_NUMERIC = frozenset(['int64', 'uint64', 'float64'])
+
+def column_dtype(kinds):
+    """The dtype pandas concatenates blocks of these kinds into"""
+    dtypes = {_DTYPES[kind] for kind in kinds}
+    if len(dtypes) == 1:
+        return dtypes.pop()
+    if dtypes <= _NUMERIC:
+        return 'float64'
+    return 'object'
+
+def _to_int(cell):
+    return str(int(cell))
+
+def _int_to_float(cell):
+    return repr(float(int(cell)))
+
+def _to_float(cell):
+    return repr(parse_float(cell))
+
+def _to_bool(cell):
+    return 'True' if cell.lower() == 'true' else 'False'
+
+def _converter(kind, dtype):
+    # How to_csv writes a cell of a block of this kind in a column of this dtype
+    if kind in ('na', 'text', 'raw'):
+        return None
+    if kind == 'float':
+        return _to_float
+    if kind == 'int_float' or (dtype == 'float64' and kind in ('int', 'uint')):
+        return _int_to_float
+    if kind in ('bool', 'bool_object'):
+        return _to_bool
+    return _to_int
+
+class ColumnFormats:
+    """
+    Rewrites cells the way DataFrame.to_csv writes the values pandas read
+
+    Args:
+        chunk_rows (int): Rows per block, as in ColumnTypes
+        converters (list): For every block, a list of (column index,
+            converter) for the columns whose cells are rewritten
+        raw (list): For every block, the indexes of the columns kept as read
+    """
+
+    def __init__(self, chunk_rows, converters, raw):
+        self.chunk_rows = chunk_rows
+        self.converters = converters
+        self.raw = raw
+
+    def converts(self, index):
+        """True if cells of column index are written other than as read in any block"""
+        return (any(i == index for block in self.converters for i, _ in block)
+                or any(index in block for block in self.raw))
+
+    def same_rows(self, other, rows):
+        """True if both rewrite the first rows rows the same way"""
+        blocks = -(-rows // self.chunk_rows)
+        return (self.chunk_rows == other.chunk_rows
+                and self.converters[:blocks] == other.converters[:blocks]
+                and self.raw[:blocks] == other.raw[:blocks])
+
+    def _block(self, block):
+        if block < len(self.converters):
+            return self.converters[block], self.raw[block]
+        return (), ()
+
+    def apply(self, rows, na_rep, kw_index=None, first_row=0):
+        """
+        Yield rows (as produced by data_rows) as to_csv writes their cells
+
+        Missing cells become na_rep, or None in the keywords column, except in
+        blocks pandas kept as read.
+
+        Args:
+            rows: Data rows
+            na_rep (str): Text written for a missing cell
+            kw_index (int): Index of the keywords column
+            first_row (int): Position of the first row among the file's data rows
+        """
+        chunk_rows = self.chunk_rows
+        block = first_row // chunk_rows
+        left = chunk_rows - first_row % chunk_rows
+        converters, raw = self._block(block)
+        na_values = NA_VALUES
+        for row in rows:
+            if not left:
+                block += 1
+                left = chunk_rows
+                converters, raw = self._block(block)
+            left -= 1
+            cells = [na_rep if cell in na_values else cell for cell in row]
+            if kw_index is not None and row[kw_index] in na_values:
+                cells[kw_index] = None
+            for index, convert in converters:
+                cell = row[index]
+                if cell not in na_values:
+                    cells[index] = convert(cell)
+            for index in raw:
+                cells[index] = row[index]
+            yield cells
+
+class ColumnTypes:
+    """
+    State of the values in every column, per block of rows, for ColumnFormats
+
+    Args:
+        width (int): Number of columns
+        first_row (int): Position among the file's data rows of the first row
+            added (for a part of a file)
+        blocks (list): States recorded so far, one list per block (as in
+            ``self.blocks``), to add more rows to
+    """
+
+    def __init__(self, width, first_row=0, blocks=None):
+        self.width = width
+        self.chunk_rows = pandas_chunk_rows(width)
+        self.blocks = [list(states) for states in blocks] if blocks else []
+        self.rows = first_row
+        self._states = None
+        self._pending = None
+        self._left = 0
+        self._cache = {}
+
+    def _start_block(self, row_number):
+        block = row_number // self.chunk_rows
+        while len(self.blocks) <= block:
+            self.blocks.append([0] * self.width)
+        self._states = self.blocks[block]
+        # Columns whose kind is already known in this block need no more checks
+        self._pending = [i for i in range(self.width) if not settled(self._states[i])]
+        self._left = self.chunk_rows - row_number % self.chunk_rows
+
+    def add(self, row):
+        """Record the values of one data row (padded to width)"""
+        if not self._left:
+            self._start_block(self.rows)
+        self._left -= 1
+        self.rows += 1
+        states = self._states
+        cache = self._cache
+        changed = False
+        for i in self._pending:
+            cell = row[i]
+            flag = cache.get(cell)
+            if flag is None:
+                if len(cache) >= CLASSIFY_CACHE_SIZE:
+                    cache.clear()
+                flag = cache[cell] = classify(cell)
+            state = states[i]
+            if flag & _ERRORS:
+                # Only the first failing cell decides an attempt's error
+                if state & INT64_ERROR:
+                    flag &= ~INT64_ERROR
+                if state & UINT64_ERROR:
+                    flag &= ~UINT64_ERROR
+                changed = True
+            states[i] = state | flag
+        if changed:
+            self._pending = [i for i in self._pending if not settled(states[i])]
+
+    def update(self, other):
+        """Merge the states recorded by another ColumnTypes for the rows that follow these"""
+        while len(self.blocks) < len(other.blocks):
+            self.blocks.append([0] * self.width)
+        for mine, theirs in zip(self.blocks, other.blocks):
+            for i, state in enumerate(theirs):
+                if mine[i] & INT64_ERROR:
+                    state &= ~INT64_ERROR
+                if mine[i] & UINT64_ERROR:
+                    state &= ~UINT64_ERROR
+                mine[i] |= state
+        self.rows = max(self.rows, other.rows)
+        self._left = 0
+
+    def formats(self):
+        """Resolve every column's dtype and return the ColumnFormats for the second pass"""
+        kinds = [[block_kind(states[i]) for i in range(self.width)] for states in self.blocks]
+        dtypes = [column_dtype([block[i] for block in kinds]) for i in range(self.width)]
+        converters = []
+        raw = []
+        for block in kinds:
+            converters.append([(i, convert) for i, convert in
+                               ((i, _converter(kind, dtypes[i])) for i, kind in enumerate(block))
+                               if convert is not None])
+            raw.append([i for i, kind in enumerate(block) if kind == 'raw'])
+        return ColumnFormats(self.chunk_rows, converters, raw)
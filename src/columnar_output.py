@@ -0,0 +1,221 @@
+"""
+Parquet and Arrow IPC (Feather) output for the numbered and hashtag_separate
+conversions.
+
+A warehouse loading the wide CSV has to re-parse hundreds of mostly empty
+``ASSET_KEYWORDS_n`` columns. These formats carry a schema instead, and every
+keyword column is dictionary-encoded against one vocabulary shared by the
+whole file, so a keyword repeated across assets is stored once. Missing
+keywords are nulls rather than empty strings.
+
+With ``long_table=True`` the output is one row per keyword, (asset id,
+position, keyword), plus a ``hashtag`` flag in hashtag_separate mode, which
+avoids the sparse wide layout altogether. Positions start at 1 and follow the
+keyword order of the export.
+
+The other columns are written as strings exactly as the streaming engine would
+write them (numbers and booleans formatted like pandas, missing-value markers
+as nulls), or as read with passthrough. pyarrow is an optional dependency,
+imported only when a columnar format is requested.
+"""
+
+from itertools import islice
+
+from compression import atomic_output
+from dialect import csv_reader, open_input_text
+from keyword_parser import NA_VALUES
+from metrics import file_size, stage
+from preview import ID_COLUMN
+from stream_converter import check_mode, data_rows, output_layout, parse_csv
+
+FORMATS = ('parquet', 'arrow', 'feather')
+# File extension and download mimetype of every output format
+EXTENSIONS = {'csv': '.csv', 'parquet': '.parquet', 'arrow': '.arrow', 'feather': '.feather'}
+MIMETYPES = {
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+    'arrow': 'application/vnd.apache.arrow.file',
+    'feather': 'application/vnd.apache.arrow.file',
+}
+# Rows converted into each record batch / Parquet row group
+BATCH_ROWS = 64 * 1024
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError('Parquet/Arrow output needs pyarrow: pip install "pyarrow>=7.0"') from None
+    return pyarrow
+
+def check_format(output_format, mode):
+    """Raise ValueError for an unknown output format or a mode it cannot write"""
+    if output_format != 'csv' and output_format not in FORMATS:
+        raise ValueError(f"Unknown output format {output_format!r}; expected csv or one of {', '.join(FORMATS)}")
+    if output_format != 'csv' and mode == 'same_name':
+        raise ValueError("Parquet/Arrow output has unique column names, so it supports the numbered "
+                         "and hashtag_separate modes only")
+
+def _open_writer(pa, output_file, output_format, schema):
+    if output_format == 'parquet':
+        import pyarrow.parquet as pq
+        return pq.ParquetWriter(output_file, schema)
+    # Feather V2 is the Arrow IPC file format
+    return pa.ipc.new_file(output_file, schema)
+
+def _text_array(pa, values, verbatim):
+    if verbatim:
+        return pa.array(values, pa.string())
+    return pa.array([None if value in NA_VALUES else value for value in values], pa.string())
+
+def _wide_batches(pa, rows, parsed, layout, dictionary, schema):
+    """Record batches of the wide layout, BATCH_ROWS rows at a time"""
+    words = parsed.vocabulary.words
+    text_columns = ([0] if layout['style'] == 'cli' else []) + layout['keep']
+    max_keywords = layout['max_keywords']
+    hashtag_separate = layout['mode'] == 'hashtag_separate'
+    # Formatted rows already hold None for missing cells
+    verbatim = layout['passthrough'] or layout['formats'] is not None
+    row_index = 0
+    while True:
+        batch = list(islice(rows, BATCH_ROWS))
+        if not batch:
+            return
+        arrays = [_text_array(pa, [row[i] for row in batch], verbatim) for i in text_columns]
+
+        indices = []
+        hashtag_column = []
+        for row in range(row_index, row_index + len(batch)):
+            ids = parsed.ids(row)
+            if hashtag_separate:
+                hashtags = [words[word_id] for word_id in ids if words[word_id][0] == '#']
+                hashtag_column.append('@@'.join(hashtags) if hashtags else None)
+                ids = [word_id for word_id in ids if words[word_id][0] != '#']
+            indices.append(ids)
+        for position in range(max_keywords):
+            column = [ids[position] if position < len(ids) else None for ids in indices]
+            arrays.append(pa.DictionaryArray.from_arrays(pa.array(column, pa.int32()), dictionary))
+        if hashtag_separate:
+            arrays.append(pa.array(hashtag_column, pa.string()))
+
+        row_index += len(batch)
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+def _long_batches(pa, rows, parsed, layout, id_index, dictionary, schema):
+    """Record batches of the long layout, one row per keyword"""
+    words = parsed.vocabulary.words
+    hashtag_separate = layout['mode'] == 'hashtag_separate'
+    verbatim = layout['passthrough'] or layout['formats'] is not None
+    row_index = 0
+    while True:
+        batch = list(islice(rows, BATCH_ROWS))
+        if not batch:
+            return
+        ids = []
+        positions = []
+        keywords = []
+        hashtags = []
+        for row in batch:
+            asset_id = row[id_index]
+            if not verbatim and asset_id in NA_VALUES:
+                asset_id = None
+            for position, word_id in enumerate(parsed.ids(row_index), 1):
+                ids.append(asset_id)
+                positions.append(position)
+                keywords.append(word_id)
+                hashtags.append(words[word_id][0] == '#')
+            row_index += 1
+
+        arrays = [pa.array(ids, pa.string()), pa.array(positions, pa.int32()),
+                  pa.DictionaryArray.from_arrays(pa.array(keywords, pa.int32()), dictionary)]
+        if hashtag_separate:
+            arrays.append(pa.array(hashtags, pa.bool_()))
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+def _long_id_column(columns, keywords_col):
+    if ID_COLUMN in columns:
+        return ID_COLUMN
+    for col in columns:
+        if col != keywords_col:
+            return col
+    raise ValueError("The long table needs an asset id column besides the keywords column")
+
+def columnar_convert(input_file, output_file, mode='numbered', style='cli', output_format='parquet',
+                     long_table=False, passthrough=False, normalizer=None):
+    """
+    Convert an @@ delimited keywords CSV to Parquet or Arrow IPC (Feather)
+
+    Args:
+        input_file (str): Path to input CSV file
+        output_file (str): Path to output file
+        mode (str): 'numbered' or 'hashtag_separate'
+        style (str): 'cli' to match keywords_converter.py, 'web' to match web_app.py
+        output_format (str): 'parquet', 'arrow' or 'feather'
+        long_table (bool): Write (asset id, position, keyword) rows instead of
+            one column per keyword
+        passthrough (bool): Keep missing-value markers of the other columns
+            instead of writing nulls
+        normalizer (KeywordNormalizer): Normalize and dedupe each row's keywords
+
+    Returns:
+        tuple: (max_keywords, total_rows); for 'hashtag_separate' max_keywords
+        counts regular keywords only
+
+    Raises:
+        ValueError: If the keywords column cannot be found, or for an
+            unsupported format or mode
+        ImportError: If pyarrow is not installed
+    """
+    check_mode(mode, style)
+    check_format(output_format, mode)
+    if output_format == 'csv':
+        raise ValueError("columnar_convert writes Parquet or Arrow; use an engine for CSV output")
+    pa = _import_pyarrow()
+
+    bytes_in = file_size(input_file)
+    with open_input_text(input_file) as csvfile:
+        with stage('split', bytes_in=bytes_in) as record:
+            columns, keywords_col, parsed, formats = parse_csv(csvfile, style, normalizer, passthrough)
+            record['rows'] = len(parsed)
+        max_keywords = parsed.max_regular if mode == 'hashtag_separate' else parsed.max_keywords
+
+        with stage('layout'):
+            layout = output_layout(columns, keywords_col, mode, style, max_keywords, passthrough, formats=formats)
+
+            # The parse vocabulary is the one dictionary of every keyword column
+            # and batch: IPC files cannot replace a dictionary between batches
+            dictionary = pa.array(parsed.vocabulary.words, pa.string())
+            keyword_type = pa.dictionary(pa.int32(), pa.string())
+
+            if long_table:
+                id_col = _long_id_column(columns, keywords_col)
+                fields = [pa.field(id_col, pa.string()), pa.field('position', pa.int32()),
+                          pa.field(keywords_col, keyword_type)]
+                if mode == 'hashtag_separate':
+                    fields.append(pa.field('hashtag', pa.bool_()))
+            else:
+                header = layout['header']
+                text_count = len(header) - max_keywords - (mode == 'hashtag_separate')
+                fields = [pa.field(name, pa.string()) for name in header[:text_count]]
+                fields += [pa.field(name, keyword_type) for name in header[text_count:text_count + max_keywords]]
+                if mode == 'hashtag_separate':
+                    fields.append(pa.field(header[-1], pa.string()))
+            schema = pa.schema(fields)
+
+        csvfile.seek(0)
+        reader = csv_reader(csvfile)
+        next(reader)
+        rows = data_rows(reader, layout['width'])
+        if formats is not None:
+            rows = formats.apply(rows, None, layout['kw_index'])
+        if long_table:
+            batches = _long_batches(pa, rows, parsed, layout, columns.index(id_col), dictionary, schema)
+        else:
+            batches = _wide_batches(pa, rows, parsed, layout, dictionary, schema)
+
+        with stage('write', rows=len(parsed), bytes_in=bytes_in) as record:
+            with atomic_output(output_file) as path, _open_writer(pa, path, output_format, schema) as writer:
+                for batch in batches:
+                    writer.write_batch(batch)
+    record['bytes_out'] = file_size(output_file)
+
+    return max_keywords, len(parsed)
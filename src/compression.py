@@ -0,0 +1,267 @@
+"""
+Compressed input and output for every converter.
+
+Inputs are recognised by their magic bytes, so a gzip, zstd or zip export is
+decompressed as a stream whatever its name. The engines read their input
+twice (keyword scan, then output), so the decompressing readers returned here
+can be rewound to the start, which decompresses the input again instead of
+keeping it in memory or on disk. Only the first CSV member of a zip archive
+is read. With ``max_bytes`` a reader raises ``DecompressedSizeError`` as soon
+as a pass has decompressed more than that, so a small upload that expands
+to gigabytes (a decompression bomb) is stopped early.
+
+Outputs are compressed while they are written; the codec follows the output
+file's suffix (``.gz``, ``.zst`` or ``.zip``), any other name is written
+uncompressed exactly as before. ``atomic_output`` has a conversion write its
+output under a temporary name and put it in place only once it succeeded.
+
+zstd needs the optional ``zstandard`` package; gzip and zip only use the
+standard library.
+"""
+
+import gzip
+import io
+import os
+import shutil
+import tempfile
+import zipfile
+import zlib
+from contextlib import contextmanager
+
+# Codec of each recognised file suffix, and the suffix written for each codec
+CODEC_SUFFIXES = {'.gz': 'gzip', '.gzip': 'gzip', '.zst': 'zstd', '.zstd': 'zstd', '.zip': 'zip'}
+SUFFIXES = {'gzip': '.gz', 'zstd': '.zst', 'zip': '.zip'}
+CODECS = tuple(SUFFIXES)
+_MAGIC = (
+    (b'\x1f\x8b', 'gzip'),
+    (b'\x28\xb5\x2f\xfd', 'zstd'),
+    (b'PK\x03\x04', 'zip'),
+)
+
+class DecompressedSizeError(ValueError):
+    """A compressed input decompresses to more bytes than allowed"""
+
+def _import_zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("zstd compression needs zstandard: pip install zstandard") from None
+    return zstandard
+
+def split_suffix(filename):
+    """
+    Split a compression suffix off a file name
+
+    Returns:
+        tuple: (name without the codec suffix, codec or None), e.g.
+        ('export.csv', 'gzip') for 'export.csv.gz'
+    """
+    name, ext = os.path.splitext(filename)
+    codec = CODEC_SUFFIXES.get(ext.lower())
+    return (name, codec) if codec else (filename, None)
+
+def detect_codec(source):
+    """
+    Return the codec of a path or seekable binary file from its magic bytes, or None
+
+    A file object is left at its start.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            head = f.read(4)
+    else:
+        head = source.read(4)
+        source.seek(0)
+    for magic, codec in _MAGIC:
+        if head.startswith(magic):
+            return codec
+    return None
+
+class _RewindableReader(io.RawIOBase):
+    """
+    Decompressing reader whose only seek is back to the start, done by
+    decompressing the source again
+    """
+
+    def __init__(self, source, open_reader, owns_source):
+        self._source = source
+        self._open_reader = open_reader
+        self._owns_source = owns_source
+        self._reader = open_reader(source)
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._reader.read(len(buffer))
+        buffer[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR and offset == 0:
+            return self._position
+        if whence != io.SEEK_SET or offset != 0:
+            raise io.UnsupportedOperation('compressed input can only be rewound to the start')
+        self._source.seek(0)
+        self._reader = self._open_reader(self._source)
+        self._position = 0
+        return 0
+
+    def close(self):
+        if not self.closed and self._owns_source:
+            self._source.close()
+        super().close()
+
+class _LimitedReader(io.RawIOBase):
+    """Decompressing reader that fails once a pass has read more than max_bytes"""
+
+    def __init__(self, reader, max_bytes):
+        self._reader = reader
+        self._max_bytes = max_bytes
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        count = self._reader.readinto(buffer)
+        self._position += count
+        if self._position > self._max_bytes:
+            raise DecompressedSizeError(f"The input decompresses to more than {self._max_bytes} bytes")
+        return count
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self._position = self._reader.seek(offset, whence)
+        return self._position
+
+    def close(self):
+        if not self.closed:
+            self._reader.close()
+        super().close()
+
+def _zip_member(archive):
+    names = [info.filename for info in archive.infolist() if not info.is_dir()]
+    if not names:
+        raise ValueError('The zip archive holds no files')
+    csv_names = [name for name in names if name.lower().endswith('.csv')]
+    return (csv_names or names)[0]
+
+def open_input(source, max_bytes=None):
+    """
+    Open a path or seekable binary file for reading, decompressing it if needed
+
+    A file object passed in is left open when the returned stream is closed.
+
+    Args:
+        max_bytes (int): Raise DecompressedSizeError while reading once a
+            compressed input has decompressed to more than this many bytes
+
+    Returns:
+        A binary stream that can be rewound with seek(0); an uncompressed file
+        object is returned as is
+    """
+    codec = detect_codec(source)
+    is_path = isinstance(source, (str, os.PathLike))
+    if codec is None:
+        return open(source, 'rb') if is_path else source
+    if codec == 'gzip':
+        reader = gzip.open(source, 'rb') if is_path else gzip.GzipFile(fileobj=source, mode='rb')
+    elif codec == 'zip':
+        # The member keeps the archive's file open after the archive is closed
+        with zipfile.ZipFile(source) as archive:
+            reader = archive.open(_zip_member(archive))
+    else:
+        decompressor = _import_zstandard().ZstdDecompressor()
+        raw = open(source, 'rb') if is_path else source
+        reader = io.BufferedReader(_RewindableReader(raw, decompressor.stream_reader, owns_source=is_path))
+    if max_bytes is None:
+        return reader
+    return io.BufferedReader(_LimitedReader(reader, max_bytes))
+
+class _ZipWriter(io.RawIOBase):
+    """Writes the single member of a new zip archive and closes both together"""
+
+    def __init__(self, output_file):
+        self._archive = zipfile.ZipFile(output_file, 'w', zipfile.ZIP_DEFLATED)
+        member = os.path.basename(split_suffix(output_file)[0])
+        self._member = self._archive.open(member, 'w', force_zip64=True)
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return self._member.write(data)
+
+    def close(self):
+        if not self.closed:
+            self._member.close()
+            self._archive.close()
+        super().close()
+
+def open_output(output_file):
+    """Open output_file for binary writing, compressed according to its suffix"""
+    codec = split_suffix(output_file)[1]
+    if codec is None:
+        return open(output_file, 'wb')
+    if codec == 'gzip':
+        return gzip.open(output_file, 'wb')
+    if codec == 'zip':
+        return io.BufferedWriter(_ZipWriter(output_file))
+    return _import_zstandard().ZstdCompressor().stream_writer(open(output_file, 'wb'))
+
+@contextmanager
+def atomic_output(output_file):
+    """
+    Yield the path to write output_file to; it replaces output_file only if the block succeeds
+
+    The path has output_file's name in a temporary folder next to it, so the
+    codec, the gzip header and the zip member name are those of output_file.
+    A conversion that fails leaves no empty or partial output_file behind
+    that would later pass for an up-to-date one.
+    """
+    folder = tempfile.mkdtemp(prefix='.tmp-', dir=os.path.dirname(os.path.abspath(output_file)))
+    try:
+        path = os.path.join(folder, os.path.basename(output_file))
+        yield path
+        os.replace(path, output_file)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+def open_output_text(output_file):
+    """open_output as a text stream, encoded the way every engine writes CSV"""
+    if split_suffix(output_file)[1] is None:
+        return open(output_file, 'w', newline='', encoding='utf-8')
+    return io.TextIOWrapper(open_output(output_file), encoding='utf-8', newline='')
+
+def compress_chunks(chunks, codec):
+    """
+    Compress an iterable of bytes chunks into one gzip or zstd stream
+
+    Yields compressed bytes as soon as the compressor produces them, so a
+    streamed response stays streamed.
+    """
+    if codec == 'gzip':
+        compressor = zlib.compressobj(wbits=31)
+    elif codec == 'zstd':
+        compressor = _import_zstandard().ZstdCompressor().compressobj()
+    else:
+        raise ValueError(f"Cannot stream {codec!r} output; expected gzip or zstd")
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,51 @@
+"""
+Byte-level CSV record handling for scans that should not decode whole rows.
+
+Records are cut from raw lines by tracking the parity of '"' bytes, so a
+quoted field spanning several lines stays one record. Records without quotes
+are split on b',' directly; records with quotes are decoded and handed to the
+csv module, which keeps the results identical to ``csv.reader``.
+"""
+
+import csv
+import io
+
+def iter_records(lines):
+    """Join lines into CSV records, continuing a record while it leaves a quote open"""
+    record = None
+    for line in lines:
+        if record is not None:
+            record += line
+            if line.count(b'"') & 1:
+                yield record
+                record = None
+        elif b'"' in line and line.count(b'"') & 1:
+            record = line
+        else:
+            yield line
+    if record is not None:
+        yield record
+
+def parse_quoted(record):
+    """Parse one record containing quotes with the csv module, as a list of str"""
+    return next(csv.reader(io.StringIO(record.decode('utf-8'), newline='')), [])
+
+def keyword_fields(records, kw_index):
+    """
+    Yield the raw bytes of the keywords field of every non-blank record
+
+    Rows too short to reach the keywords column yield b''.
+    """
+    max_split = kw_index + 1
+    for record in records:
+        if b'"' in record:
+            row = parse_quoted(record)
+            if not row:
+                continue
+            yield row[kw_index].encode('utf-8') if kw_index < len(row) else b''
+        else:
+            record = record.rstrip(b'\r\n')
+            if not record:
+                continue
+            fields = record.split(b',', max_split)
+            yield fields[kw_index] if kw_index < len(fields) else b''
@@ -0,0 +1,293 @@
+"""
+CSV dialect and encoding detection from a sample of the input.
+
+Exports saved from Excel may start with a byte order mark, use ';' or tabs
+between fields and be encoded in cp1252 rather than UTF-8. Instead of reading
+them with the default settings and retrying when that fails, the input is
+sniffed once from its first SNIFF_BYTES (after decompression), plus
+PROBE_BLOCKS small blocks spread through an uncompressed file for the
+encoding, and read with what was found:
+
+- ``encoding``: from a UTF-8, UTF-16 or UTF-32 BOM when there is one, else
+  ``'utf-8-sig'`` when every sampled byte is valid UTF-8, else ``'cp1252'``
+  (``'latin-1'`` when the sample has bytes cp1252 leaves undefined)
+- ``bom``: the BOM found (``'utf-8'``, ``'utf-16'``, ``'utf-32'``) or None
+- ``delimiter``: of the DELIMITERS that cut at least CONSISTENT_SHARE of the
+  sampled rows to the header's width, the one giving the most columns (then
+  the most such rows); ',' wins ties
+- ``quotechar``: '"', or "'" for a sample that quotes fields with single
+  quotes only
+
+A non-UTF-8 byte beyond the sampled blocks still fails decoding with a
+UnicodeDecodeError naming its position.
+
+The result is a ``SourceDialect``, a ``csv.Dialect`` that also carries the
+encoding. ``open_input_text`` decodes an input with it and attaches it to the
+returned stream, where ``csv_reader`` picks it up, so the engines' two passes
+need no extra arguments. Paths are sniffed once per process and cached by
+path, size and modification time, so every pass over a file and every
+repeated look at it in a batch run reuses the first result.
+
+Inputs in the default dialect (UTF-8, ',' and '"') keep the byte-level paths
+of the parallel engine and the preview; other dialects are read through the
+csv module.
+"""
+
+import codecs
+import csv
+import io
+import os
+import re
+import threading
+from itertools import islice
+
+from compression import detect_codec, open_input
+
+SNIFF_BYTES = 32 * 1024
+PROBE_BLOCKS = 8
+PROBE_BYTES = 4 * 1024
+DELIMITERS = (',', ';', '\t', '|')
+# Rows of the sample parsed per candidate delimiter
+SNIFF_ROWS = 200
+# Share of sampled rows that must be as wide as the header
+CONSISTENT_SHARE = 0.9
+# UTF-32 LE is checked first, its BOM starts with the UTF-16 LE one
+_BOMS = (
+    (codecs.BOM_UTF32_LE, 'utf-32', 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32', 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8', 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16', 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16', 'utf-16'),
+)
+# A field opened and closed by single quotes
+_SINGLE_QUOTED = re.compile(r"(?:^|[,;\t|])'[^'\n]*'(?:[,;\t|]|$)", re.MULTILINE)
+
+class SourceDialect(csv.Dialect):
+    """
+    csv dialect of an input file, plus the encoding it is decoded with
+
+    Args:
+        delimiter (str): Field delimiter
+        quotechar (str): Quote character
+        encoding (str): Python codec the file is decoded with
+        bom (str): BOM found at the start of the file, or None
+    """
+
+    delimiter = ','
+    quotechar = '"'
+    escapechar = None
+    doublequote = True
+    skipinitialspace = False
+    lineterminator = '\r\n'
+    quoting = csv.QUOTE_MINIMAL
+    strict = False
+
+    def __init__(self, delimiter=',', quotechar='"', encoding='utf-8-sig', bom=None):
+        self.delimiter = delimiter
+        self.quotechar = quotechar
+        self.encoding = encoding
+        self.bom = bom
+        super().__init__()
+
+    @property
+    def is_default(self):
+        """True for UTF-8 (with or without BOM), ',' and '"', the dialect the byte-level paths read"""
+        return self.encoding == 'utf-8-sig' and self.delimiter == ',' and self.quotechar == '"'
+
+    def describe(self):
+        """Short description for messages, e.g. "';' delimited, cp1252" """
+        delimiter = 'tab' if self.delimiter == '\t' else repr(self.delimiter)
+        encoding = 'utf-8' if self.encoding == 'utf-8-sig' else self.encoding
+        bom = ' with BOM' if self.bom else ''
+        return f"{delimiter} delimited, {encoding}{bom}"
+
+    def __eq__(self, other):
+        if not isinstance(other, SourceDialect):
+            return NotImplemented
+        return (self.delimiter, self.quotechar, self.encoding, self.bom) == \
+               (other.delimiter, other.quotechar, other.encoding, other.bom)
+
+    def __hash__(self):
+        return hash((self.delimiter, self.quotechar, self.encoding, self.bom))
+
+    def __repr__(self):
+        return (f"SourceDialect(delimiter={self.delimiter!r}, quotechar={self.quotechar!r}, "
+                f"encoding={self.encoding!r}, bom={self.bom!r})")
+
+DEFAULT_DIALECT = SourceDialect()
+
+class CsvText(io.TextIOWrapper):
+    """Text stream of a CSV input; ``dialect`` is the SourceDialect it was decoded with"""
+
+    dialect = DEFAULT_DIALECT
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+def _valid_utf8(block, final):
+    # A probe block may start inside a multi-byte character
+    start = 0
+    while start < min(3, len(block)) and 0x80 <= block[start] < 0xC0:
+        start += 1
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(block[start:], final)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+def detect_encoding(head, probes=(), complete=False):
+    """
+    Pick the encoding of a file from its first bytes and sampled blocks
+
+    Args:
+        head (bytes): The first bytes of the file
+        probes (list): Blocks of bytes from further into the file
+        complete (bool): head is the whole file, so it may not end inside a character
+
+    Returns:
+        tuple: (encoding, bom)
+    """
+    for bom, name, encoding in _BOMS:
+        if head.startswith(bom):
+            return encoding, name
+    if _valid_utf8(head, complete) and all(_valid_utf8(block, False) for block in probes):
+        return 'utf-8-sig', None
+    try:
+        for block in (head, *probes):
+            block.decode('cp1252')
+    except UnicodeDecodeError:
+        return 'latin-1', None
+    return 'cp1252', None
+
+def _score(text, delimiter, quotechar):
+    rows = []
+    try:
+        for row in islice(csv.reader(io.StringIO(text, newline=''), delimiter=delimiter, quotechar=quotechar),
+                          SNIFF_ROWS):
+            # Blank lines and lines of only spaces and tabs are skipped by
+            # the engines, like pandas does
+            if row and (len(row) > 1 or row[0].strip(' \t')):
+                rows.append(row)
+    except csv.Error:
+        pass
+    if not rows:
+        return None
+    width = len(rows[0])
+    # The last row may be cut short by the end of the sample (or be an
+    # unfinished last row of the file), so it is not held against the delimiter
+    body = rows[1:-1] if len(rows) > 2 else rows[1:]
+    consistent = sum(len(row) == width for row in body)
+    return consistent >= CONSISTENT_SHARE * len(body), width, consistent
+
+def sniff_text(text):
+    """
+    Pick the delimiter and quote character of decoded sample text
+
+    Returns:
+        tuple: (delimiter, quotechar)
+    """
+    quotechar = "'" if '"' not in text and _SINGLE_QUOTED.search(text) else '"'
+    scores = [(score, delimiter) for delimiter in DELIMITERS
+              if (score := _score(text, delimiter, quotechar)) is not None]
+    if not scores:
+        return ',', quotechar
+    # max keeps the first of equal scores, so DELIMITERS order breaks ties
+    return max(scores, key=lambda scored: scored[0])[1], quotechar
+
+def sniff_dialect(stream, probe=True):
+    """
+    Sniff the dialect of a seekable binary stream and leave it at its start
+
+    Args:
+        stream: Binary stream at its start (decompressed already)
+        probe (bool): Also check the encoding of blocks spread through the
+            stream; it must support seeking to its end and to any offset
+
+    Returns:
+        SourceDialect
+    """
+    head = stream.read(SNIFF_BYTES)
+    complete = len(head) < SNIFF_BYTES
+    probes = []
+    if probe and not complete:
+        stream.seek(0, io.SEEK_END)
+        size = stream.tell()
+        step = (size - SNIFF_BYTES) // PROBE_BLOCKS
+        if step > PROBE_BYTES:
+            for block in range(1, PROBE_BLOCKS + 1):
+                stream.seek(SNIFF_BYTES + block * step - PROBE_BYTES)
+                probes.append(stream.read(PROBE_BYTES))
+    stream.seek(0)
+
+    encoding, bom = detect_encoding(head, probes, complete)
+    text = head.decode(encoding, errors='replace')
+    if not complete and '\n' in text:
+        # Leave out the row cut off by the end of the sample
+        text = text[:text.rindex('\n') + 1]
+    delimiter, quotechar = sniff_text(text)
+    return SourceDialect(delimiter, quotechar, encoding, bom)
+
+def _cache_key(path):
+    stat = os.stat(path)
+    return os.path.realpath(path), stat.st_size, stat.st_mtime_ns
+
+def input_dialect(source, stream=None):
+    """
+    Dialect of a path (sniffed once and cached) or seekable binary file
+
+    Args:
+        source: Path or seekable binary file, possibly compressed
+        stream: source already opened with compression.open_input, sniffed
+            instead of opening source again (needed for a compressed file
+            object); left at its start
+
+    Returns:
+        SourceDialect
+    """
+    is_path = isinstance(source, (str, os.PathLike))
+    if is_path:
+        key = _cache_key(source)
+        with _cache_lock:
+            dialect = _cache.get(key)
+        if dialect is not None:
+            return dialect
+
+    # Decompressed streams can only be rewound, so only the head is sampled
+    probe = detect_codec(source) is None
+    if stream is not None:
+        dialect = sniff_dialect(stream, probe)
+    elif is_path:
+        with open_input(source) as f:
+            dialect = sniff_dialect(f, probe)
+    else:
+        dialect = sniff_dialect(source, probe)
+
+    if is_path:
+        with _cache_lock:
+            _cache[key] = dialect
+    return dialect
+
+def open_input_text(source, max_bytes=None):
+    """
+    Open a path or seekable binary file as CSV text, decompressed if needed and
+    decoded with its dialect's encoding
+
+    Args:
+        max_bytes (int): Limit on the decompressed size (see compression.open_input)
+
+    Returns:
+        CsvText: Text stream whose ``dialect`` attribute csv_reader reads
+    """
+    raw = open_input(source, max_bytes)
+    try:
+        dialect = input_dialect(source, raw)
+    except Exception:
+        raw.close()
+        raise
+    csvfile = CsvText(raw, encoding=dialect.encoding, newline='')
+    csvfile.dialect = dialect
+    return csvfile
+
+def csv_reader(csvfile):
+    """csv.reader over a text stream, in the dialect open_input_text found (the default otherwise)"""
+    return csv.reader(csvfile, getattr(csvfile, 'dialect', DEFAULT_DIALECT))
@@ -0,0 +1,252 @@
+"""
+Incremental conversion of exports that grow by appended rows.
+
+Nightly exports mostly grow at the end, so reconverting them in full repeats
+work already done. ``incremental_convert`` keeps a JSON manifest next to the
+output recording how much of the input has been converted:
+
+- ``offset``: bytes of the input converted so far (always a row boundary)
+- ``rows``: data rows converted so far
+- ``max_keywords``: widest row so far (regular keywords in hashtag mode)
+- ``prefix_sha256``: hash of the first ``offset`` bytes of the input
+- ``types``: the column types recorded so far (``ColumnTypes.blocks``, see
+  column_types), or null with ``passthrough``
+
+On the next run the prefix hash is checked, only the rows after ``offset``
+are scanned, and when they fit the existing keyword columns they are
+converted and appended to the output; the header and earlier rows are left
+alone. The output is rebuilt from scratch (with a new header) only when the
+new rows need more keyword columns than the output has, when they change how
+pandas would write the earlier rows (a column of integers that gains a float
+is written as floats throughout), or when the manifest no longer describes
+the input, the output or the options. With a ``cap`` the output never widens
+past the cap.
+
+The result is identical to a full ``stream_convert`` of the whole input.
+Incremental runs need an uncompressed input and output; a compressed input,
+or one in another encoding or delimiter than UTF-8 and ',' (see dialect), is
+converted in full every time.
+"""
+
+import csv
+import hashlib
+import io
+import json
+import os
+
+from column_types import ColumnTypes
+from compression import detect_codec, split_suffix
+from dialect import input_dialect
+from keyword_parser import ParsedKeywords
+from stream_converter import (check_mode, data_rows, find_keywords_column, output_layout, read_columns,
+                              reparse_keywords, scan_rows, stream_convert, write_rows)
+
+# 2 was used by manifests that held a fingerprint of the prefix
+MANIFEST_VERSION = 3
+_BLOCK_SIZE = 1 << 20
+
+class _Window(io.RawIOBase):
+    """
+    Bytes start..end of an open binary file, read as a file of their own
+
+    Reads stop at end even if the file has grown since, so the converted rows
+    are exactly the ones the manifest records.
+    """
+
+    def __init__(self, raw, start, end):
+        self._raw = raw
+        self._start = start
+        self._end = end
+        self._position = start
+        raw.seek(start)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        count = min(len(buffer), self._end - self._position)
+        if count <= 0:
+            return 0
+        data = self._raw.read(count)
+        buffer[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position - self._start
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.tell()
+        elif whence == io.SEEK_END:
+            offset += self._end - self._start
+        self._position = self._start + max(0, min(offset, self._end - self._start))
+        self._raw.seek(self._position)
+        return self.tell()
+
+    def close(self):
+        # The caller closes the underlying file
+        super().close()
+
+def manifest_path(output_file):
+    """Manifest kept next to output_file, e.g. out.csv.manifest.json"""
+    return output_file + '.manifest.json'
+
+def hash_bytes(raw, start, end, digest=None):
+    """
+    Feed bytes start..end of an open binary file to a SHA-256 digest
+
+    Returns:
+        The digest, a new one unless digest is given
+    """
+    if digest is None:
+        digest = hashlib.sha256()
+    raw.seek(start)
+    remaining = end - start
+    while remaining > 0:
+        block = raw.read(min(_BLOCK_SIZE, remaining))
+        if not block:
+            break
+        digest.update(block)
+        remaining -= len(block)
+    return digest
+
+def read_manifest(manifest_file):
+    """Return the manifest stored in manifest_file, or None if it is missing or unreadable"""
+    try:
+        with open(manifest_file, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(manifest, dict) or manifest.get('version') != MANIFEST_VERSION:
+        return None
+    return manifest
+
+def write_manifest(manifest_file, manifest):
+    """Write a manifest atomically, so an interrupted run leaves the old one"""
+    tmp_file = manifest_file + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_file, manifest_file)
+
+def _prefix_digest(raw, manifest, options, output_file, size):
+    """
+    The digest of the manifest's input prefix if the output holds exactly
+    that prefix of this input, else None
+    """
+    if manifest is None or manifest.get('options') != options:
+        return None
+    offset = manifest['offset']
+    # A last row without its newline may have been continued by the append
+    if not manifest['complete'] or size < offset:
+        return None
+    if not os.path.exists(output_file) or os.path.getsize(output_file) != manifest['output_bytes']:
+        return None
+    digest = hash_bytes(raw, 0, offset)
+    return digest if digest.hexdigest() == manifest['prefix_sha256'] else None
+
+def _key_width(max_keywords, cap):
+    return max_keywords if cap is None else min(max_keywords, cap)
+
+def incremental_convert(input_file, output_file, mode='numbered', style='cli', passthrough=False, cap=None,
+                        manifest_file=None):
+    """
+    Convert only the rows appended to input_file since the last run
+
+    Args:
+        input_file (str): Path to input CSV file
+        output_file (str): Path to output CSV file (uncompressed)
+        mode (str): One of 'numbered', 'same_name' or 'hashtag_separate'
+        style (str): 'cli' to match keywords_converter.py, 'web' to match web_app.py
+        passthrough (bool): Copy fields outside the keywords column verbatim
+        cap (int): Write at most cap keyword columns plus an overflow column
+        manifest_file (str): Manifest path, manifest_path(output_file) by default
+
+    Returns:
+        dict: max_keywords and total_rows (as returned by stream_convert),
+        new_rows (rows converted by this run) and rebuilt (True when the
+        output was written from scratch)
+
+    Raises:
+        ValueError: If the keywords column cannot be found, or for a
+            compressed output
+    """
+    check_mode(mode, style)
+    if split_suffix(output_file)[1]:
+        raise ValueError("Incremental conversion appends to the output, which must not be compressed")
+    if manifest_file is None:
+        manifest_file = manifest_path(output_file)
+    options = {'mode': mode, 'style': style, 'passthrough': passthrough, 'cap': cap}
+
+    if detect_codec(input_file) or not input_dialect(input_file).is_default:
+        max_keywords, total_rows = stream_convert(input_file, output_file, mode, style, passthrough=passthrough,
+                                                  cap=cap)
+        if os.path.exists(manifest_file):
+            os.remove(manifest_file)
+        return {'max_keywords': max_keywords, 'total_rows': total_rows, 'new_rows': total_rows, 'rebuilt': True}
+
+    manifest = read_manifest(manifest_file)
+    with open(input_file, 'rb') as raw:
+        size = os.fstat(raw.fileno()).st_size
+        digest = _prefix_digest(raw, manifest, options, output_file, size)
+        rebuilt = digest is None
+        with io.TextIOWrapper(_Window(raw, 0, size if rebuilt else manifest['offset']), encoding='utf-8-sig',
+                              newline='') as text:
+            columns = read_columns(csv.reader(text))
+        if not rebuilt:
+            offset = manifest['offset']
+            keywords_col = find_keywords_column(columns, style)
+            kw_index = columns.index(keywords_col)
+            with io.TextIOWrapper(_Window(raw, offset, size), encoding='utf-8', newline='') as text:
+                formats = types = None
+                if not passthrough:
+                    types = ColumnTypes(len(columns), manifest['rows'], manifest['types'])
+                stats = scan_rows(csv.reader(text), len(columns), kw_index, types=types)
+                if types is not None:
+                    formats = types.formats()
+                    # The rows already written must be written the same way
+                    # with the new rows' types
+                    old_formats = ColumnTypes(len(columns), blocks=manifest['types']).formats()
+                    rebuilt = not old_formats.same_rows(formats, manifest['rows'])
+                    if not rebuilt and formats.converts(kw_index):
+                        text.seek(0)
+                        stats = reparse_keywords(data_rows(csv.reader(text), len(columns)), kw_index, formats,
+                                                 ParsedKeywords(keep_tokens=False, na_values=()), manifest['rows'])
+                new_max = stats.max_regular if mode == 'hashtag_separate' else stats.max_keywords
+                max_keywords = max(manifest['max_keywords'], new_max)
+                # New rows that need more keyword columns mean a new header
+                # and wider earlier rows: rebuild instead
+                rebuilt = rebuilt or _key_width(max_keywords, cap) != _key_width(manifest['max_keywords'], cap)
+                if not rebuilt:
+                    layout = output_layout(columns, keywords_col, mode, style, max_keywords, passthrough, cap,
+                                           formats=formats)
+                    text.seek(0)
+                    with open(output_file, 'a', newline='', encoding='utf-8') as outfile:
+                        new_rows = write_rows(data_rows(csv.reader(text), len(columns)), outfile, layout,
+                                              first_row=manifest['rows'])
+                    total_rows = manifest['rows'] + new_rows
+                    hash_bytes(raw, offset, size, digest)
+        if rebuilt:
+            types = None if passthrough else ColumnTypes(len(columns))
+            max_keywords, total_rows = stream_convert(_Window(raw, 0, size), output_file, mode, style,
+                                                      passthrough=passthrough, cap=cap, types=types)
+            new_rows = total_rows
+            digest = hash_bytes(raw, 0, size)
+        raw.seek(max(size - 1, 0))
+        complete = size == 0 or raw.read(1) == b'\n'
+
+    write_manifest(manifest_file, {
+        'version': MANIFEST_VERSION,
+        'options': options,
+        'offset': size,
+        'rows': total_rows,
+        'max_keywords': max_keywords,
+        'prefix_sha256': digest.hexdigest(),
+        'types': None if types is None else types.blocks,
+        'complete': complete,
+        'output_bytes': os.path.getsize(output_file),
+    })
+    return {'max_keywords': max_keywords, 'total_rows': total_rows, 'new_rows': new_rows, 'rebuilt': rebuilt}
@@ -0,0 +1,237 @@
+"""
+Background conversion jobs for the web app.
+
+Large uploads are saved to a per-job folder and converted by a bounded pool of
+worker threads, so the request that submitted them returns immediately with a
+job ID. Clients poll the job for row-level progress and download the result
+when it is done. Finished jobs (and their files) are removed once they are
+older than the configured TTL; the job folder itself is scanned for stale
+folders at most once per cleanup interval, not on every poll. Each job
+records the seconds spent in each conversion stage, and an ``on_finish``
+callback sees every job that finishes.
+
+Each job's status is also written to ``job.json`` in its folder (replaced
+atomically on every update), so when several server processes share the job
+folder any of them can answer status and download requests for a job that
+another one is running. The conversion itself stays in the process that
+accepted the upload, and the pending-job limit applies per process.
+"""
+
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from compression import SUFFIXES
+from keyword_parser import KeywordNormalizer
+from metrics import profiling
+from stream_converter import stream_convert
+
+JOB_FILE = 'job.json'
+_JOB_ID = re.compile(r'[0-9a-f]{32}$')
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while too many jobs are waiting"""
+
+class JobManager:
+    """
+    Run conversions in a bounded worker pool and track their progress
+
+    Args:
+        job_folder (str): Directory holding one sub-folder per job
+        max_workers (int): Hard limit on conversions running at the same time
+        max_pending (int): Jobs allowed to wait or run before submit refuses more
+        ttl_seconds (int): How long finished jobs and their output are kept
+        on_finish (callable): Called from the worker thread with a copy of each
+            job once it is done or failed
+        cleanup_interval (float): Minimum seconds between scans of the job
+            folder for stale folders
+    """
+
+    def __init__(self, job_folder, max_workers=2, max_pending=20, ttl_seconds=3600, on_finish=None,
+                 cleanup_interval=60):
+        self.job_folder = job_folder
+        self.max_pending = max_pending
+        self.ttl_seconds = ttl_seconds
+        self.on_finish = on_finish
+        self.cleanup_interval = cleanup_interval
+        self._last_scan = None
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='conversion')
+        self._jobs = {}
+        self._lock = threading.Lock()
+        os.makedirs(job_folder, exist_ok=True)
+        self._remove_stale_folders()
+        self._last_scan = time.monotonic()
+
+    def job_path(self, job_id, filename):
+        """Path of a file inside a job's folder"""
+        return os.path.join(self.job_folder, job_id, filename)
+
+    def submit(self, file, mode, download_name, passthrough=False, compression=None, cap=None, normalize=False):
+        """
+        Save an uploaded file and queue its conversion
+
+        Args:
+            file: Uploaded file (anything with a ``save(path)`` method)
+            mode (str): Conversion mode for stream_convert
+            download_name (str): File name offered when the result is downloaded
+            passthrough (bool): Copy the other columns exactly as uploaded
+            compression (str): Compress the output with 'gzip', 'zstd' or 'zip'
+            cap (int): Keep at most cap keyword columns plus an overflow column
+            normalize (bool): Normalize and dedupe each row's keywords
+
+        Returns:
+            str: The new job ID
+
+        Raises:
+            QueueFullError: If max_pending jobs are already queued or running
+        """
+        self.cleanup_expired()
+        with self._lock:
+            active = sum(1 for job in self._jobs.values() if job['status'] in ('queued', 'running'))
+            if active >= self.max_pending:
+                raise QueueFullError(f'{active} conversions are already queued; try again later')
+
+            job_id = uuid.uuid4().hex
+            os.makedirs(os.path.join(self.job_folder, job_id))
+            job = self._jobs[job_id] = {
+                'id': job_id,
+                'status': 'queued',
+                'mode': mode,
+                'passthrough': passthrough,
+                'cap': cap,
+                'normalize': normalize,
+                'output_name': 'output.csv' + SUFFIXES.get(compression, ''),
+                'download_name': download_name,
+                'rows_done': 0,
+                'total_rows': None,
+                'max_keywords': None,
+                'error': None,
+                'stages': {},
+                'created': time.time(),
+                'finished': None,
+            }
+            self._save(job)
+
+        file.save(self.job_path(job_id, 'input.csv'))
+        self._executor.submit(self._run, job_id)
+        return job_id
+
+    def _save(self, job):
+        # Called with the lock held, so a fixed temporary name is safe
+        path = self.job_path(job['id'], JOB_FILE)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(job, f)
+        os.replace(path + '.tmp', path)
+
+    def _load(self, job_id):
+        # A job submitted to another process sharing the job folder
+        if not _JOB_ID.match(job_id):
+            return None
+        try:
+            with open(self.job_path(job_id, JOB_FILE)) as f:
+                job = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if job['finished'] is not None and job['finished'] < time.time() - self.ttl_seconds:
+            return None
+        return job
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields)
+            self._save(self._jobs[job_id])
+
+    def _run(self, job_id):
+        mode = self._jobs[job_id]['mode']
+        passthrough = self._jobs[job_id]['passthrough']
+        cap = self._jobs[job_id]['cap']
+        normalizer = KeywordNormalizer() if self._jobs[job_id]['normalize'] else None
+        self._update(job_id, status='running')
+
+        def progress(rows_done, total_rows):
+            self._update(job_id, rows_done=rows_done, total_rows=total_rows)
+
+        try:
+            with profiling() as profile:
+                max_keywords, total_rows = stream_convert(
+                    self.job_path(job_id, 'input.csv'), self.output_path(job_id),
+                    mode, style='web', progress=progress, passthrough=passthrough, cap=cap, normalizer=normalizer)
+            if mode == 'hashtag_separate':
+                max_keywords += 1
+            self._update(job_id, status='done', max_keywords=max_keywords,
+                         rows_done=total_rows, total_rows=total_rows, stages=profile.totals())
+        except Exception as e:
+            self._update(job_id, status='failed', error=str(e))
+        finally:
+            self._update(job_id, finished=time.time())
+            input_path = self.job_path(job_id, 'input.csv')
+            if os.path.exists(input_path):
+                os.remove(input_path)
+        if self.on_finish is not None:
+            with self._lock:
+                job = dict(self._jobs[job_id])
+            self.on_finish(job)
+
+    def get(self, job_id):
+        """
+        Return a copy of a job's status, or None if it is unknown or expired
+
+        Jobs of other processes sharing the job folder are read from their job.json.
+        """
+        self.cleanup_expired()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job:
+                return dict(job)
+        return self._load(job_id)
+
+    def output_path(self, job_id):
+        """Path of a finished job's converted file"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        job = job or self._load(job_id)
+        return self.job_path(job_id, job['output_name'])
+
+    def _remove_stale_folders(self):
+        # Folders of jobs this process does not track (left by a previous
+        # process, or run by another one) are removed once their job.json,
+        # last written when the job finished, is older than the TTL
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            tracked = set(self._jobs)
+        for name in os.listdir(self.job_folder):
+            path = os.path.join(self.job_folder, name)
+            if name in tracked or not os.path.isdir(path):
+                continue
+            try:
+                job_file = os.path.join(path, JOB_FILE)
+                modified = os.path.getmtime(job_file if os.path.exists(job_file) else path)
+            except OSError:
+                continue
+            if modified < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def cleanup_expired(self):
+        """Forget finished jobs older than the TTL and delete their files"""
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job['finished'] is not None and job['finished'] < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+        for job_id in expired:
+            shutil.rmtree(os.path.join(self.job_folder, job_id), ignore_errors=True)
+        # Listing the job folder costs a stat per folder, so it is throttled
+        now = time.monotonic()
+        with self._lock:
+            scan = self._last_scan is None or now - self._last_scan >= self.cleanup_interval
+            if scan:
+                self._last_scan = now
+        if scan:
+            self._remove_stale_folders()
+        return len(expired)
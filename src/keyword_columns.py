@@ -0,0 +1,286 @@
+"""
+Finding the keyword columns of an export and converting several at once.
+
+The converters take the keywords column from the header alone: the CLI needs
+``ASSET_KEYWORDS`` and the web app takes the first column with 'keyword' in
+its name, so an export whose keywords sit in another column (or that also has
+a ``KEYWORD_COUNT`` column) is converted wrongly and has to be redone.
+``score_columns`` instead scores every column on the first SAMPLE_ROWS rows:
+
+- ``delimited``: share of filled cells holding more than one '@@' separated
+  keyword (weighted DELIMITED_WEIGHT)
+- ``hashtags``: share of filled cells holding a '#' keyword (HASHTAG_WEIGHT)
+- ``name_match``: the name contains 'keyword' (NAME_WEIGHT)
+
+``select_columns`` turns a selection into column names: explicit names,
+``'auto'`` for the best scoring column or ``'all'`` for every column that
+scores at least MIN_SCORE with '@@' or hashtags in its sample.
+
+``convert_columns`` converts any number of columns in one pass over the file
+with the streaming engine's two-pass scheme: the first pass finds the widest
+row of every selected column at once, the second writes each row with every
+selected column expanded. The expanded columns follow the other columns in
+selection order, each laid out like a single-column conversion (keyword
+columns, then the overflow column with a cap). In hashtag mode each column's
+hashtags go to a column named after it in lower case, so ``ASSET_KEYWORDS``
+keeps its ``asset_keywords`` column; a column whose name is already lower
+case gets ``<name>_hashtags`` instead (see stream_converter.hashtag_column). The other columns are written like
+stream_convert writes them (see column_types), so a one-column conversion is
+identical to the single-column converters' output.
+"""
+
+import csv
+from itertools import islice
+
+from column_types import ColumnTypes
+from compression import atomic_output, open_output_text
+from dialect import csv_reader, open_input_text
+from keyword_parser import NA_VALUES, ParsedKeywords, partition_hashtags, split_keywords
+from metrics import file_size, stage
+from stream_converter import check_mode, data_rows, hashtag_column, keyword_header, output_layout, read_columns
+
+SAMPLE_ROWS = 1000
+DELIMITED_WEIGHT = 0.5
+HASHTAG_WEIGHT = 0.2
+NAME_WEIGHT = 0.3
+# Lowest score 'all' accepts
+MIN_SCORE = 0.25
+SELECTIONS = ('auto', 'all')
+
+def score_sample(columns, rows):
+    """
+    Score every column of sampled data rows as a keywords column
+
+    Returns:
+        list: One dict per column, best first: column, score, filled (share of
+        rows with a value), delimited, hashtags, mean_keywords (per filled
+        cell) and name_match
+    """
+    scores = []
+    for index, column in enumerate(columns):
+        filled = delimited = hashtags = keywords = 0
+        for row in rows:
+            tokens = split_keywords(row[index])
+            if not tokens:
+                continue
+            filled += 1
+            keywords += len(tokens)
+            delimited += len(tokens) > 1
+            hashtags += any(token[0] == '#' for token in tokens)
+        delimited_share = delimited / filled if filled else 0.0
+        hashtag_share = hashtags / filled if filled else 0.0
+        name_match = 'keyword' in column.lower()
+        scores.append({
+            'column': column,
+            'score': (DELIMITED_WEIGHT * delimited_share + HASHTAG_WEIGHT * hashtag_share
+                      + NAME_WEIGHT * name_match),
+            'filled': filled / len(rows) if rows else 0.0,
+            'delimited': delimited_share,
+            'hashtags': hashtag_share,
+            'mean_keywords': keywords / filled if filled else 0.0,
+            'name_match': name_match,
+        })
+    # sorted is stable, so equal scores keep the column order
+    return sorted(scores, key=lambda score: -score['score'])
+
+def score_columns(input_file, sample_rows=SAMPLE_ROWS):
+    """
+    Score the columns of a file on its first sample_rows data rows
+
+    Returns:
+        list: As returned by score_sample
+    """
+    with open_input_text(input_file) as csvfile:
+        reader = csv_reader(csvfile)
+        columns = read_columns(reader)
+        rows = list(islice(data_rows(reader, len(columns)), sample_rows))
+    return score_sample(columns, rows)
+
+def select_columns(input_file, selection, scores=None):
+    """
+    Resolve a column selection against a file
+
+    Args:
+        input_file (str): Path to input CSV file
+        selection (list): Column names, or one of 'auto' (best scoring column)
+            and 'all' (every column that looks @@ delimited)
+        scores (list): score_columns(input_file), when already computed
+
+    Returns:
+        list: The selected column names
+
+    Raises:
+        ValueError: If a named column is missing, a column is named twice, or
+            no column looks like keywords
+    """
+    if scores is None:
+        scores = score_columns(input_file)
+    if list(selection) in (['auto'], ['all']):
+        likely = [score for score in scores
+                  if score['score'] >= MIN_SCORE and (score['delimited'] or score['hashtags'])]
+        if not likely:
+            raise ValueError("No column looks like @@ delimited keywords; name the keywords column(s) explicitly")
+        return [likely[0]['column']] if selection[0] == 'auto' else [score['column'] for score in likely]
+
+    columns = [score['column'] for score in scores]
+    missing = [name for name in selection if name not in columns]
+    if missing:
+        raise ValueError(f"Column(s) {', '.join(map(repr, missing))} not found in the CSV file\n"
+                         f"Available columns: {columns}")
+    if len(set(selection)) != len(selection):
+        raise ValueError("A keywords column is selected more than once")
+    return list(selection)
+
+def columns_layout(columns, keywords_cols, mode, style, widths, passthrough=False, cap=None, normalizer=None,
+                   formats=None):
+    """
+    Describe the output of a conversion of several keywords columns
+
+    The other columns, first column and missing-value rules follow
+    output_layout for the same mode and style.
+
+    Args:
+        widths (list): Widest row of each keywords column (regular keywords
+            in hashtag mode)
+
+    Returns:
+        dict: output_layout's keys (kw_index and max_keywords for the first
+        column) plus kw_indexes and widths (capped) for every keywords column
+    """
+    layout = output_layout(columns, keywords_cols[0], mode, style, 0, passthrough, cap, normalizer, formats)
+    keep = [i for i in layout['keep'] if columns[i] not in keywords_cols]
+    header = [''] if style == 'cli' else []
+    header += [columns[i] for i in keep]
+    if cap is not None:
+        widths = [min(width, cap) for width in widths]
+    for keywords_col, width in zip(keywords_cols, widths):
+        header += keyword_header(keywords_col, mode, width, overflow=cap is not None,
+                                 hashtag_col=hashtag_column(keywords_col))
+    layout.update(keep=keep, header=header, max_keywords=widths[0], widths=widths,
+                  kw_indexes=[columns.index(col) for col in keywords_cols])
+    return layout
+
+def write_columns_rows(rows, out, layout):
+    """
+    Write every row (as produced by data_rows) with each keywords column expanded
+
+    Returns:
+        int: Number of rows written
+    """
+    keep = layout['keep']
+    na_rep = layout['na_rep']
+    cap = layout['cap']
+    first_column = layout['style'] == 'cli'
+    hashtag_separate = layout['mode'] == 'hashtag_separate'
+    passthrough = layout['passthrough']
+    normalizer = layout['normalizer']
+    formats = layout['formats']
+    expansions = list(zip(layout['kw_indexes'], layout['widths']))
+    writer = csv.writer(out, lineterminator=layout['lineterminator'])
+    if formats is not None:
+        # Missing cells come out as None, in the keywords columns too
+        rows = formats.apply(rows, None)
+    na_values = () if formats is not None else NA_VALUES
+
+    total_rows = 0
+    for row in rows:
+        if passthrough:
+            cells = [row[i] for i in keep]
+            if first_column:
+                cells.insert(0, row[0])
+        elif formats is not None:
+            cells = [na_rep if row[i] is None else row[i] for i in keep]
+            if first_column:
+                cells.insert(0, '' if row[0] is None else row[0])
+        else:
+            cells = [na_rep if row[i] in NA_VALUES else row[i] for i in keep]
+            if first_column:
+                cells.insert(0, '' if row[0] in NA_VALUES else row[0])
+
+        for kw_index, width in expansions:
+            keywords = split_keywords(row[kw_index], na_values, normalizer)
+            if hashtag_separate:
+                keywords, hashtag_keywords = partition_hashtags(keywords)
+            if cap is not None:
+                overflow = '@@'.join(keywords[cap:])
+                keywords = keywords[:cap]
+            cells += keywords
+            cells += [''] * (width - len(keywords))
+            if cap is not None:
+                cells.append(overflow)
+            if hashtag_separate:
+                cells.append('@@'.join(hashtag_keywords))
+        writer.writerow(cells)
+        total_rows += 1
+    return total_rows
+
+def convert_columns(input_file, output_file, keywords_cols, mode='numbered', style='cli', passthrough=False,
+                    cap=None, normalizer=None):
+    """
+    Convert several @@ delimited columns of a file in one two-pass conversion
+
+    Args:
+        input_file (str): Path to input CSV file
+        output_file (str): Path to output CSV file
+        keywords_cols (list): Columns to expand, or a one-item selection
+            ['auto'] or ['all'] resolved with select_columns
+        mode (str): One of 'numbered', 'same_name' or 'hashtag_separate'
+        style (str): 'cli' to match keywords_converter.py, 'web' to match web_app.py
+        passthrough (bool): Copy the other fields verbatim
+        cap (int): Write at most cap keyword columns per keywords column plus
+            an overflow column
+        normalizer (KeywordNormalizer): Normalize and dedupe each cell's keywords
+
+    Returns:
+        tuple: ({column: widest row}, total_rows); in hashtag mode the widths
+        count regular keywords only
+
+    Raises:
+        ValueError: If a column cannot be found or selected
+    """
+    check_mode(mode, style)
+    if cap is not None and cap < 0:
+        raise ValueError(f"The keyword cap must be 0 or more, got {cap}")
+    keywords_cols = select_columns(input_file, keywords_cols)
+    bytes_in = file_size(input_file)
+    with open_input_text(input_file) as csvfile, atomic_output(output_file) as path, open_output_text(path) as outfile:
+        with stage('split', bytes_in=bytes_in) as record:
+            reader = csv_reader(csvfile)
+            columns = read_columns(reader)
+            indexes = [columns.index(col) for col in keywords_cols]
+            stats = [ParsedKeywords(keep_tokens=False, normalizer=normalizer) for _ in indexes]
+            adds = [(index, column_stats.add) for index, column_stats in zip(indexes, stats)]
+            types = None if passthrough else ColumnTypes(len(columns))
+            total_rows = 0
+            for row in data_rows(reader, len(columns)):
+                for index, add in adds:
+                    add(row[index])
+                if types is not None:
+                    types.add(row)
+                total_rows += 1
+            record['rows'] = total_rows
+            formats = None if types is None else types.formats()
+            if formats is not None and any(formats.converts(index) for index in indexes):
+                # Count the keywords again as pandas splits the values it formats
+                stats = [ParsedKeywords(keep_tokens=False, na_values=(), normalizer=normalizer) for _ in indexes]
+                adds = [(index, column_stats.add) for index, column_stats in zip(indexes, stats)]
+                csvfile.seek(0)
+                reader = csv_reader(csvfile)
+                next(reader)
+                for row in formats.apply(data_rows(reader, len(columns)), None):
+                    for index, add in adds:
+                        add(row[index])
+        widths = [column_stats.max_regular if mode == 'hashtag_separate' else column_stats.max_keywords
+                  for column_stats in stats]
+        with stage('layout'):
+            layout = columns_layout(columns, keywords_cols, mode, style, widths, passthrough, cap, normalizer,
+                                    formats)
+
+        with stage('write', rows=total_rows, bytes_in=bytes_in) as record:
+            csvfile.seek(0)
+            reader = csv_reader(csvfile)
+            next(reader)
+            csv.writer(outfile, lineterminator=layout['lineterminator']).writerow(layout['header'])
+            write_columns_rows(data_rows(reader, len(columns)), outfile, layout)
+    record['bytes_out'] = file_size(output_file)
+    return dict(zip(keywords_cols, widths)), total_rows
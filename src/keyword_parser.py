@@ -0,0 +1,358 @@
+"""
+Shared @@ keyword parsing for every converter and engine.
+
+``split_keywords`` is the single split/strip implementation: it splits once and
+strips each token once (the old ``kw.strip() ... if kw.strip()`` comprehension
+stripped every token twice). ``parse_keywords`` runs it over a whole column and
+stores the result compactly as one flat token buffer plus row offsets instead
+of a list of lists, collecting per-file statistics and, when asked, the
+hashtag/regular partition in the same pass.
+
+Given a ``Vocabulary``, the buffer interns its tokens: each distinct keyword
+is stored once and the buffer holds its integer id, which cuts the memory of
+a parsed column to a few bytes per keyword and counts keyword frequencies in
+the same pass. The accessors still return keyword strings.
+
+Given a ``KeywordNormalizer``, every row is normalized right after it is
+split, in the same pass: tokens are put in Unicode NFC and a row keeps only
+the first of the keywords that differ only in case or a leading '#' (``Data``,
+``data `` and ``#Data`` count once, as ``Data``). The kept keyword keeps its
+case. Each distinct token is normalized once and remembered, so a repeated
+token costs one dict lookup.
+"""
+
+import re
+import unicodedata
+from array import array
+
+# Cells pandas.read_csv treats as missing by default
+NA_VALUES = frozenset([
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan',
+    '1.#IND', '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a',
+    'nan', 'null',
+])
+
+NA_BYTES = frozenset(value.encode('utf-8') for value in NA_VALUES)
+# Everything str.strip() removes, as UTF-8 bytes
+_BLANK = re.compile(rb'(?:[\s\x1c-\x1f]|\xc2[\x85\xa0]|\xe1\x9a\x80|\xe2\x80[\x80-\x8a\xa8\xa9\xaf]'
+                    rb'|\xe2\x81\x9f|\xe3\x80\x80)*')
+# Maps every byte that can start or end a whitespace character (and the space
+# itself) to '@', so an empty or whitespace-only token shows up as a run of
+# three or more '@' or as '@@' at either end
+_WHITESPACE_AS_AT = bytes.maketrans(
+    b' \t\n\x0b\x0c\r\x1c\x1d\x1e\x1f\xc2\xe1\xe2\xe3\x80\x81\x82\x83\x84\x85\x86\x87\x88\x89\x8a\x9f\xa0\xa8\xa9\xaf',
+    b'@' * 30)
+
+_strip = str.strip
+
+def keyword_text(value, na_values=NA_VALUES):
+    """
+    Return a keywords cell as text, or None when the cell is missing
+
+    Accepts raw CSV strings as well as pandas values (NaN, pd.NA, numbers).
+    """
+    if value.__class__ is str:
+        return None if value in na_values else value
+    if value is None:
+        return None
+    try:
+        if value != value:
+            return None
+    except TypeError:
+        # pd.NA refuses to be used in a boolean context
+        return None
+    return str(value)
+
+# Distinct tokens remembered by a KeywordNormalizer before its cache is cleared
+NORMALIZE_CACHE_SIZE = 1 << 20
+
+class KeywordNormalizer:
+    """
+    Per-row keyword normalization: Unicode NFC and case-insensitive dedupe
+
+    Args:
+        nfc (bool): Put every keyword in Unicode normalization form C
+        dedupe (bool): Keep only the first of a row's keywords that are equal
+            once casefolded and stripped of a leading '#'
+    """
+
+    def __init__(self, nfc=True, dedupe=True):
+        self.nfc = nfc
+        self.dedupe = dedupe
+        # token -> (keyword written, dedupe key)
+        self._cache = {}
+
+    def _entry(self, token):
+        keyword = unicodedata.normalize('NFC', token) if self.nfc else token
+        key = keyword[1:] if keyword[0] == '#' else keyword
+        entry = (keyword, key.casefold())
+        if len(self._cache) >= NORMALIZE_CACHE_SIZE:
+            self._cache.clear()
+        self._cache[token] = entry
+        return entry
+
+    def normalize(self, keywords):
+        """Normalize the split keywords of one row, keeping their order"""
+        cache = self._cache
+        if not self.dedupe:
+            return [(cache.get(kw) or self._entry(kw))[0] for kw in keywords]
+        normalized = []
+        seen = set()
+        for kw in keywords:
+            keyword, key = cache.get(kw) or self._entry(kw)
+            if key not in seen:
+                seen.add(key)
+                normalized.append(keyword)
+        return normalized
+
+def _split_text(text):
+    # One C-level split, one strip per token, empty tokens dropped
+    return [kw for kw in map(_strip, text.split('@@')) if kw]
+
+def split_keywords(value, na_values=NA_VALUES, normalizer=None):
+    """Split one @@ delimited cell into stripped, non-empty keywords (normalized with normalizer)"""
+    text = keyword_text(value, na_values)
+    if text is None:
+        return []
+    if normalizer is not None:
+        return normalizer.normalize(_split_text(text))
+    return _split_text(text)
+
+def count_keywords(field, regular_only=False):
+    """
+    Count the keywords of one raw (undecoded) keywords field
+
+    Counts '@@' delimiters in the bytes instead of splitting; only fields with
+    possible empty tokens are decoded and split. Agrees with
+    len(split_keywords(...)), or with the number of regular (non-hashtag)
+    keywords when regular_only is set.
+    """
+    if field in NA_BYTES:
+        return 0
+    delimiters = field.count(b'@@')
+    if not delimiters:
+        if _BLANK.fullmatch(field):
+            return 0
+        if not (regular_only and b'#' in field):
+            return 1
+    else:
+        marked = field.translate(_WHITESPACE_AS_AT)
+        if not (b'@@@' in marked or marked[:2] == b'@@' or marked[-2:] == b'@@'):
+            # No whitespace after any delimiter, so every token but the first
+            # starts right after one
+            if regular_only:
+                first = _BLANK.match(field).end()
+                return delimiters + 1 - field.count(b'@@#') - (field[first:first + 1] == b'#')
+            return delimiters + 1
+    # Possibly an empty token or a padded hashtag: split for real
+    keywords = _split_text(field.decode('utf-8'))
+    if regular_only:
+        return len(partition_hashtags(keywords)[0])
+    return len(keywords)
+
+def partition_hashtags(keywords):
+    """Split keywords into (regular, hashtag) lists, keeping their order"""
+    regular = []
+    hashtags = []
+    for kw in keywords:
+        if kw[0] == '#':
+            hashtags.append(kw)
+        else:
+            regular.append(kw)
+    return regular, hashtags
+
+class Vocabulary:
+    """
+    Distinct keywords, numbered in order of first appearance
+
+    ``intern`` turns a row's keywords into ids, adding new keywords, and
+    counts them; ``words[id]`` is the keyword and ``counts[id]`` its count.
+    """
+
+    def __init__(self):
+        self.ids = {}
+        self.words = []
+        self.counts = array('q')
+
+    def __len__(self):
+        return len(self.words)
+
+    def __contains__(self, word):
+        return word in self.ids
+
+    def intern(self, words):
+        """Count one occurrence of each of words and return their ids"""
+        ids = self.ids
+        try:
+            word_ids = list(map(ids.__getitem__, words))
+        except KeyError:
+            for word in words:
+                if word not in ids:
+                    ids[word] = len(self.words)
+                    self.words.append(word)
+                    self.counts.append(0)
+            word_ids = list(map(ids.__getitem__, words))
+        counts = self.counts
+        for word_id in word_ids:
+            counts[word_id] += 1
+        return word_ids
+
+    def most_common(self, n=None, hashtags=None):
+        """
+        (keyword, count) pairs, most frequent first
+
+        Args:
+            n (int): Number of pairs, all when None
+            hashtags (bool): Only hashtags (True), only regular keywords
+                (False) or both (None)
+        """
+        pairs = [(word, count) for word, count in zip(self.words, self.counts)
+                 if hashtags is None or (word[0] == '#') == hashtags]
+        pairs.sort(key=lambda pair: pair[1], reverse=True)
+        return pairs if n is None else pairs[:n]
+
+class ParsedKeywords:
+    """
+    Keywords of a whole column stored as one flat token buffer
+
+    Row ``i`` owns ``tokens[offsets[i]:offsets[i+1]]``. When the column was
+    parsed with ``partition=True`` each row's regular keywords come first and
+    its hashtags start at ``hashtag_starts[i]``; otherwise rows keep their
+    original keyword order.
+
+    With ``keep_tokens=False`` only the statistics are collected, which keeps
+    a scan over a huge file in constant memory.
+
+    With a ``vocabulary`` every keyword is counted in it, and ``tokens`` holds
+    vocabulary ids instead of strings. With a ``normalizer`` each row is
+    normalized as it is split, so the statistics count normalized keywords.
+    """
+
+    def __init__(self, partition=False, keep_tokens=True, na_values=NA_VALUES, vocabulary=None, normalizer=None):
+        self.partition = partition
+        self.keep_tokens = keep_tokens
+        self.na_values = na_values
+        self.vocabulary = vocabulary
+        self.normalizer = normalizer
+        self.tokens = [] if vocabulary is None else array('l')
+        self.offsets = array('q', [0])
+        self.hashtag_starts = array('q')
+        self.rows = 0
+        self.keyword_count = 0
+        self.hashtag_count = 0
+        self.max_keywords = 0
+        self.max_regular = 0
+
+    def __len__(self):
+        return self.rows
+
+    def __getstate__(self):
+        # The normalizer and its cache are only needed while parsing
+        state = dict(self.__dict__)
+        state['normalizer'] = None
+        return state
+
+    def add(self, value):
+        """Parse one cell, append it as the next row and update the statistics"""
+        text = keyword_text(value, self.na_values)
+        if text is None:
+            keywords = []
+        else:
+            keywords = _split_text(text)
+            if self.normalizer is not None:
+                keywords = self.normalizer.normalize(keywords)
+        if keywords and '#' in text:
+            regular, hashtags = partition_hashtags(keywords)
+        else:
+            regular, hashtags = keywords, ()
+
+        self.rows += 1
+        self.keyword_count += len(keywords)
+        self.hashtag_count += len(hashtags)
+        if len(keywords) > self.max_keywords:
+            self.max_keywords = len(keywords)
+        if len(regular) > self.max_regular:
+            self.max_regular = len(regular)
+
+        if self.vocabulary is not None and keywords:
+            intern = self.vocabulary.intern
+            if self.partition and self.keep_tokens:
+                regular = intern(regular)
+                hashtags = intern(hashtags)
+            else:
+                keywords = intern(keywords)
+
+        if self.keep_tokens:
+            if self.partition:
+                self.tokens.extend(regular)
+                self.hashtag_starts.append(len(self.tokens))
+                self.tokens.extend(hashtags)
+            else:
+                self.tokens.extend(keywords)
+            self.offsets.append(len(self.tokens))
+
+    def _words(self, start, end):
+        if self.vocabulary is None:
+            return self.tokens[start:end]
+        words = self.vocabulary.words
+        return [words[word_id] for word_id in self.tokens[start:end]]
+
+    def keywords(self, row):
+        """All keywords of a row (regular first when partitioned)"""
+        return self._words(self.offsets[row], self.offsets[row + 1])
+
+    def regular(self, row):
+        """Regular (non-hashtag) keywords of a partitioned row"""
+        return self._words(self.offsets[row], self.hashtag_starts[row])
+
+    def hashtags(self, row):
+        """Hashtag keywords of a partitioned row"""
+        return self._words(self.hashtag_starts[row], self.offsets[row + 1])
+
+    def ids(self, row):
+        """Vocabulary ids of a row's keywords, for a buffer parsed with a vocabulary"""
+        return self.tokens[self.offsets[row]:self.offsets[row + 1]]
+
+    def nth(self, position, regular=False):
+        """
+        The keyword at ``position`` for every row, '' where a row is shorter
+
+        With ``regular=True`` only the regular keywords of a partitioned
+        column are considered.
+        """
+        tokens = self.tokens
+        starts = self.offsets
+        ends = self.hashtag_starts if regular else self.offsets[1:]
+        column = []
+        if self.vocabulary is None:
+            for start, end in zip(starts, ends):
+                index = start + position
+                column.append(tokens[index] if index < end else '')
+        else:
+            words = self.vocabulary.words
+            for start, end in zip(starts, ends):
+                index = start + position
+                column.append(words[tokens[index]] if index < end else '')
+        return column
+
+def parse_keywords(values, partition=False, keep_tokens=True, na_values=NA_VALUES, vocabulary=None,
+                   normalizer=None):
+    """
+    Parse an iterable of keywords cells into a ParsedKeywords buffer
+
+    Args:
+        values: Keywords cells (pandas Series, list, or any iterable)
+        partition (bool): Order each row as regular keywords then hashtags
+        keep_tokens (bool): Keep the tokens, or only collect statistics
+        na_values: Cell values treated as missing
+        vocabulary (Vocabulary): Intern the tokens and count them here
+        normalizer (KeywordNormalizer): Normalize and dedupe each row as it is split
+
+    Returns:
+        ParsedKeywords: Tokens, offsets and per-file statistics
+    """
+    parsed = ParsedKeywords(partition, keep_tokens, na_values, vocabulary, normalizer)
+    add = parsed.add
+    for value in values:
+        add(value)
+    return parsed
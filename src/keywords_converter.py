@@ -1,88 +1,217 @@
-import pandas as pd
-import numpy as np
-import csv
+import argparse
+import contextlib
+import cProfile
+import glob
+import io
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 
-def convert_keywords_format_numbered(input_file, output_file):
+from columnar_output import EXTENSIONS, FORMATS, check_format, columnar_convert
+from compression import CODECS, SUFFIXES, split_suffix
+from dialect import input_dialect
+from incremental import incremental_convert, manifest_path
+from keyword_columns import SELECTIONS, convert_columns, score_columns, select_columns
+from keyword_parser import KeywordNormalizer, Vocabulary
+from metrics import format_profile, profiling
+from parallel_converter import parallel_convert
+from preview import build_preview
+from reverse_converter import reverse_convert
+from stream_converter import stream_convert
+from vectorized_converter import vectorized_convert
+from vocabulary import TOP_N, frequency_report, scan_vocabulary, vocabulary_path, write_frequencies, write_vocabulary
+
+# Alternative engines selectable with the converters' engine argument
+ENGINES = {
+    'stream': stream_convert,
+    'vectorized': vectorized_convert,
+}
+
+def _print_summary(mode, input_file, output_file, max_keywords, total_rows, cap=None):
+    """Print the end-of-conversion report shared by all engines"""
+    print(f"Conversion completed!")
+    print(f"Original file: {input_file}")
+    print(f"Output file: {output_file}")
+    if mode == 'hashtag_separate':
+        print(f"Maximum regular keywords found: {max_keywords}")
+        print(f"Created {max_keywords} numbered keyword columns + 1 hashtag column")
+    else:
+        print(f"Maximum keywords found: {max_keywords}")
+        if mode == 'same_name':
+            print(f"Created {max_keywords} columns all named 'ASSET_KEYWORDS'")
+        else:
+            print(f"Created {max_keywords} ASSET_KEYWORDS columns")
+    if cap is not None and max_keywords > cap:
+        print(f"Capped at {cap} keyword columns; the rest of each row's keywords are in the overflow column")
+    print(f"Total rows processed: {total_rows}")
+
+def _convert_with_engine(input_file, output_file, mode, engine, workers=None, passthrough=False,
+                         output_format='csv', long_table=False, cap=None, dictionary=False, normalize=False):
     """
-    Convert CSV from @@ delimited keywords to multiple numbered ASSET_KEYWORDS columns
-    
+    Run a conversion through one of the alternative ENGINES, in several
+    processes, or to a columnar output_format (which ignores engine and workers)
+
+    The 'pandas' engine is the vectorized engine (see vectorized_converter).
+    Dictionary-encoded conversions always run on the stream engine, the
+    vocabulary being written next to the output; normalized ones run on the
+    stream engine unless the engine is pandas-based and workers is unset.
+    """
+    if engine not in ENGINES and engine != 'pandas':
+        raise ValueError(f"Unknown engine {engine!r}; expected 'pandas' or one of {', '.join(ENGINES)}")
+    normalizer = KeywordNormalizer() if normalize else None
+    try:
+        check_format(output_format, mode)
+        if output_format != 'csv':
+            if cap is not None:
+                raise ValueError("The keyword cap applies to CSV output; use long_table for a compact columnar file")
+            if dictionary:
+                raise ValueError("Parquet/Arrow keyword columns are always dictionary-encoded")
+            max_keywords, total_rows = columnar_convert(input_file, output_file, mode, 'cli', output_format,
+                                                        long_table, passthrough, normalizer)
+        elif dictionary or (normalize and (engine not in ('pandas', 'vectorized') or (workers or 1) > 1)):
+            # The other engines count keywords from the raw bytes, before normalization
+            vocabulary = Vocabulary() if dictionary else None
+            max_keywords, total_rows = stream_convert(input_file, output_file, mode, style='cli',
+                                                      passthrough=passthrough, cap=cap, vocabulary=vocabulary,
+                                                      normalizer=normalizer)
+            if dictionary:
+                write_vocabulary(vocabulary, vocabulary_path(output_file))
+        elif workers and workers > 1:
+            max_keywords, total_rows = parallel_convert(input_file, output_file, mode, style='cli',
+                                                        workers=workers, passthrough=passthrough, cap=cap)
+        else:
+            convert = ENGINES['vectorized' if engine == 'pandas' else engine]
+            options = {'normalizer': normalizer} if normalizer is not None else {}
+            max_keywords, total_rows = convert(input_file, output_file, mode, style='cli', passthrough=passthrough,
+                                               cap=cap, **options)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return None
+    _print_summary(mode, input_file, output_file, max_keywords, total_rows, cap)
+    if dictionary:
+        print(f"Vocabulary file: {vocabulary_path(output_file)} ({len(vocabulary)} distinct keywords)")
+    return max_keywords, total_rows
+
+def convert_incremental(input_file, output_file, mode, passthrough=False, cap=None):
+    """
+    Convert only the rows appended to input_file since the last incremental
+    run, keeping a manifest next to the output (see incremental.py)
+
+    Args:
+        input_file (str): Path to input CSV file
+        output_file (str): Path to output CSV file (uncompressed)
+        mode (str): 'numbered', 'same_name' or 'hashtag_separate'
+        passthrough (bool): Copy the other columns verbatim
+        cap (int): Write at most cap keyword columns plus an overflow column
+
+    Returns:
+        tuple: (max_keywords, total_rows), or None if the conversion failed
+    """
+    try:
+        result = incremental_convert(input_file, output_file, mode, 'cli', passthrough, cap)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return None
+    _print_summary(mode, input_file, output_file, result['max_keywords'], result['total_rows'], cap)
+    if result['rebuilt']:
+        print(f"Converted in full; manifest: {manifest_path(output_file)}")
+    else:
+        print(f"Appended {result['new_rows']} new rows")
+    return result['max_keywords'], result['total_rows']
+
+def convert_keyword_columns(input_file, output_file, mode, keywords_columns, passthrough=False, cap=None,
+                            normalize=False):
+    """
+    Expand several @@ delimited columns in one pass (see keyword_columns.py)
+
     Args:
         input_file (str): Path to input CSV file
         output_file (str): Path to output CSV file
+        mode (str): 'numbered', 'same_name' or 'hashtag_separate'
+        keywords_columns (list): Column names, or ['auto'] / ['all'] to pick
+            them by their content
+        passthrough (bool): Copy the other columns verbatim
+        cap (int): Write at most cap keyword columns per column plus an overflow column
+        normalize (bool): Normalize and dedupe each cell's keywords
+
+    Returns:
+        tuple: (max_keywords over the columns, total_rows), or None if the
+        conversion failed
     """
-    
-    # Read the CSV file
-    df = pd.read_csv(input_file)
-    
-    # Check if ASSET_KEYWORDS column exists
-    if 'ASSET_KEYWORDS' not in df.columns:
-        print("Error: 'ASSET_KEYWORDS' column not found in the CSV file")
-        print(f"Available columns: {list(df.columns)}")
-        return
-    
-    # Split keywords by @@ delimiter and create a list for each row
-    keyword_lists = []
-    max_keywords = 0
-    
-    for keywords_str in df['ASSET_KEYWORDS']:
-        if pd.isna(keywords_str) or keywords_str == '':
-            # Handle empty/null values
-            keywords = []
-        else:
-            # Split by @@ and strip whitespace
-            keywords = [kw.strip() for kw in str(keywords_str).split('@@') if kw.strip()]
-        
-        keyword_lists.append(keywords)
-        max_keywords = max(max_keywords, len(keywords))
-    
-    # Create new dataframe with original columns (except ASSET_KEYWORDS and Unnamed columns)
-    columns_to_keep = [col for col in df.columns if col != 'ASSET_KEYWORDS' and not col.startswith('Unnamed:')]
-    new_df = df[columns_to_keep].copy()
-    
-    # Add multiple ASSET_KEYWORDS columns with proper indexing
-    for i in range(max_keywords):
-        # Create column names like ASSET_KEYWORDS, ASSET_KEYWORDS_2, etc.
-        if i == 0:
-            col_name = 'ASSET_KEYWORDS'
-        else:
-            col_name = f'ASSET_KEYWORDS_{i+1}'
-        
-        new_df[col_name] = [kw_list[i] if i < len(kw_list) else '' for kw_list in keyword_lists]
-    
-    # Save to CSV with custom header to have empty first column
-    with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
-        writer = csv.writer(csvfile)
-        
-        # Write header with empty first column
-        header = [''] + list(new_df.columns)
-        writer.writerow(header)
-        
-        # Write data rows with first column value, replace NaN with empty string
-        for index, row in new_df.iterrows():
-            original_row = df.iloc[index]
-            first_col_value = original_row.iloc[0] if len(original_row) > 0 else ''
-            if pd.isna(first_col_value):
-                first_col_value = ''
-            
-            # Convert row to list and replace NaN with empty string
-            row_list = []
-            for value in row:
-                if pd.isna(value):
-                    row_list.append('')
-                else:
-                    row_list.append(value)
-            
-            row_data = [first_col_value] + row_list
-            writer.writerow(row_data)
-    
+    try:
+        widths, total_rows = convert_columns(input_file, output_file, keywords_columns, mode, 'cli', passthrough,
+                                             cap, KeywordNormalizer() if normalize else None)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return None
     print(f"Conversion completed!")
     print(f"Original file: {input_file}")
     print(f"Output file: {output_file}")
-    print(f"Maximum keywords found: {max_keywords}")
-    print(f"Created {max_keywords} ASSET_KEYWORDS columns")
-    print(f"Total rows processed: {len(df)}")
+    kind = 'regular keywords' if mode == 'hashtag_separate' else 'keywords'
+    for column, width in widths.items():
+        capped = f" (capped at {cap})" if cap is not None and width > cap else ''
+        print(f"- {column}: at most {width} {kind} per row{capped}")
+    print(f"Total rows processed: {total_rows}")
+    return max(widths.values()), total_rows
+
+def detect_keyword_columns(input_file):
+    """
+    Print how every column of a file scores as an @@ delimited keywords column
+
+    Returns:
+        list: The scores from score_columns, or None if the file has no header
+    """
+    try:
+        scores = score_columns(input_file)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return None
+    print(f"{'column':<32} {'score':>6} {'filled':>7} {'@@':>7} {'#':>7} {'mean':>6}")
+    for score in scores:
+        print(f"{score['column']:<32} {score['score']:>6.2f} {score['filled']:>7.1%} {score['delimited']:>7.1%} "
+              f"{score['hashtags']:>7.1%} {score['mean_keywords']:>6.1f}")
+    for selection in SELECTIONS:
+        try:
+            picked = ', '.join(select_columns(input_file, [selection], scores))
+        except ValueError as e:
+            picked = str(e)
+        print(f"--keywords-column {selection}: {picked}")
+    return scores
+
+def convert_keywords_format_numbered(input_file, output_file, engine='pandas', workers=None, passthrough=False,
+                                     output_format='csv', long_table=False, cap=None, dictionary=False,
+                                     normalize=False):
+    """
+    Convert CSV from @@ delimited keywords to multiple numbered ASSET_KEYWORDS columns
+    
+    Args:
+        input_file (str): Path to input CSV file
+        output_file (str): Path to output CSV file
+        engine (str): 'pandas' (default; column-at-a-time pandas, the same as
+            'vectorized') or 'stream' (constant memory)
+        workers (int): Convert in this many processes with the chunked streaming engine
+        passthrough (bool): Copy the other columns verbatim, without dtype
+            inference or missing-value conversion
+        output_format (str): 'csv' (default), 'parquet', 'arrow' or 'feather';
+            columnar formats store the keyword columns dictionary-encoded
+        long_table (bool): With a columnar format, write one (asset id,
+            position, keyword) row per keyword instead of the wide layout
+        cap (int): Write at most cap keyword columns; the remaining keywords
+            of a row go into an ASSET_KEYWORDS_overflow column, '@@' delimited
+        dictionary (bool): Write keyword ids instead of keywords, with the
+            id -> keyword table in <output>_vocabulary.csv
+        normalize (bool): Put keywords in Unicode NFC and drop repeats within a
+            row that differ only in case or a leading '#'
+
+    Returns:
+        tuple: (max_keywords, total_rows), or None if ASSET_KEYWORDS is missing
+    """
+    return _convert_with_engine(input_file, output_file, 'numbered', engine, workers, passthrough,
+                                output_format, long_table, cap, dictionary, normalize)
 
-def convert_keywords_format_same_name(input_file, output_file):
+def convert_keywords_format_same_name(input_file, output_file, engine='pandas', workers=None, passthrough=False,
+                                      cap=None, dictionary=False, normalize=False):
     """
     Convert CSV from @@ delimited keywords to multiple ASSET_KEYWORDS columns 
     ALL with the same name using manual CSV writing
@@ -90,259 +219,473 @@ def convert_keywords_format_same_name(input_file, output_file):
     Args:
         input_file (str): Path to input CSV file
         output_file (str): Path to output CSV file
+        engine (str): 'pandas' (default; column-at-a-time pandas, the same as
+            'vectorized') or 'stream' (constant memory)
+        workers (int): Convert in this many processes with the chunked streaming engine
+        passthrough (bool): Copy the other columns verbatim, without dtype
+            inference or missing-value conversion
+        cap (int): Write at most cap keyword columns; the remaining keywords
+            of a row go into an ASSET_KEYWORDS_overflow column, '@@' delimited
+        dictionary (bool): Write keyword ids instead of keywords, with the
+            id -> keyword table in <output>_vocabulary.csv
+        normalize (bool): Put keywords in Unicode NFC and drop repeats within a
+            row that differ only in case or a leading '#'
+
+    Returns:
+        tuple: (max_keywords, total_rows), or None if ASSET_KEYWORDS is missing
     """
-    
-    # Read the CSV file
-    df = pd.read_csv(input_file)
-    
-    # Check if ASSET_KEYWORDS column exists
-    if 'ASSET_KEYWORDS' not in df.columns:
-        print("Error: 'ASSET_KEYWORDS' column not found in the CSV file")
-        print(f"Available columns: {list(df.columns)}")
-        return
-    
-    # Split keywords by @@ delimiter and create a list for each row
-    keyword_lists = []
-    max_keywords = 0
-    
-    for keywords_str in df['ASSET_KEYWORDS']:
-        if pd.isna(keywords_str) or keywords_str == '':
-            # Handle empty/null values
-            keywords = []
-        else:
-            # Split by @@ and strip whitespace
-            keywords = [kw.strip() for kw in str(keywords_str).split('@@') if kw.strip()]
-        
-        keyword_lists.append(keywords)
-        max_keywords = max(max_keywords, len(keywords))
-    
-    # Get columns without ASSET_KEYWORDS and without Unnamed: 0
-    other_columns = [col for col in df.columns if col != 'ASSET_KEYWORDS' and not col.startswith('Unnamed:')]
-    
-    # Create header row with empty first column, then other columns, then repeated ASSET_KEYWORDS columns
-    header = [''] + other_columns + ['ASSET_KEYWORDS'] * max_keywords
-    
-    # Write CSV manually to allow duplicate column names
-    with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
-        writer = csv.writer(csvfile)
-        
-        # Write header
-        writer.writerow(header)
-        
-        # Write data rows
-        for index, row in df.iterrows():
-            # Start with the first column value (from Unnamed: 0 or empty), replace NaN with empty string
-            first_col_value = row.iloc[0] if len(row) > 0 else ''
-            if pd.isna(first_col_value):
-                first_col_value = ''
-            row_data = [first_col_value]
-            
-            # Get values for other columns (excluding Unnamed: 0 and ASSET_KEYWORDS), replace NaN with empty string
-            for col in other_columns:
-                value = row[col]
-                if pd.isna(value):
-                    row_data.append('')
-                else:
-                    row_data.append(value)
-            
-            # Add keyword values
-            keywords = keyword_lists[index]
-            for i in range(max_keywords):
-                if i < len(keywords):
-                    row_data.append(keywords[i])
-                else:
-                    row_data.append('')  # Empty string for missing keywords
-            
-            writer.writerow(row_data)
-    
-    print(f"Conversion completed!")
-    print(f"Original file: {input_file}")
-    print(f"Output file: {output_file}")
-    print(f"Maximum keywords found: {max_keywords}")
-    print(f"Created {max_keywords} columns all named 'ASSET_KEYWORDS'")
-    print(f"Total rows processed: {len(df)}")
+    return _convert_with_engine(input_file, output_file, 'same_name', engine, workers, passthrough, cap=cap,
+                                dictionary=dictionary, normalize=normalize)
 
-def convert_keywords_format_hashtag_separate(input_file, output_file):
+def convert_keywords_format_hashtag_separate(input_file, output_file, engine='pandas', workers=None, passthrough=False,
+                                             output_format='csv', long_table=False, cap=None,
+                                             dictionary=False, normalize=False):
     """
     Convert CSV from @@ delimited keywords with hashtag separation
     
     Args:
         input_file (str): Path to input CSV file
         output_file (str): Path to output CSV file
+        engine (str): 'pandas' (default; column-at-a-time pandas, the same as
+            'vectorized') or 'stream' (constant memory)
+        workers (int): Convert in this many processes with the chunked streaming engine
+        passthrough (bool): Copy the other columns verbatim, without dtype
+            inference or missing-value conversion
+        output_format (str): 'csv' (default), 'parquet', 'arrow' or 'feather';
+            columnar formats store the keyword columns dictionary-encoded
+        long_table (bool): With a columnar format, write one (asset id,
+            position, keyword) row per keyword instead of the wide layout
+        cap (int): Write at most cap keyword columns; the remaining keywords
+            of a row go into an ASSET_KEYWORDS_overflow column, '@@' delimited
+        dictionary (bool): Write keyword ids instead of keywords, with the
+            id -> keyword table in <output>_vocabulary.csv
+        normalize (bool): Put keywords in Unicode NFC and drop repeats within a
+            row that differ only in case or a leading '#'
+
+    Returns:
+        tuple: (max_keywords, total_rows), or None if ASSET_KEYWORDS is missing
     """
-    
-    # Read the CSV file
-    df = pd.read_csv(input_file)
-    
-    # Check if ASSET_KEYWORDS column exists
-    if 'ASSET_KEYWORDS' not in df.columns:
-        print("Error: 'ASSET_KEYWORDS' column not found in the CSV file")
-        print(f"Available columns: {list(df.columns)}")
-        return
-    
-    # Split keywords by @@ delimiter and separate hashtag vs regular keywords
-    regular_keyword_lists = []
-    hashtag_keyword_lists = []
-    max_regular_keywords = 0
-    
-    for keywords_str in df['ASSET_KEYWORDS']:
-        if pd.isna(keywords_str) or keywords_str == '':
-            all_keywords = []
-        else:
-            all_keywords = [kw.strip() for kw in str(keywords_str).split('@@') if kw.strip()]
-        
-        regular_keywords = []
-        hashtag_keywords = []
-        
-        for kw in all_keywords:
-            if kw.startswith('#'):
-                hashtag_keywords.append(kw)
-            else:
-                regular_keywords.append(kw)
-        
-        regular_keyword_lists.append(regular_keywords)
-        hashtag_keyword_lists.append(hashtag_keywords)
-        max_regular_keywords = max(max_regular_keywords, len(regular_keywords))
-    
-    # Get columns without ASSET_KEYWORDS and without Unnamed: 0
-    other_columns = [col for col in df.columns if col != 'ASSET_KEYWORDS' and not col.startswith('Unnamed:')]
-    
-    # Create header with numbered regular keyword columns plus final asset_keywords column
-    header = [''] + other_columns
-    for i in range(max_regular_keywords):
-        if i == 0:
-            header.append('ASSET_KEYWORDS')
-        else:
-            header.append(f'ASSET_KEYWORDS_{i+1}')
-    header.append('asset_keywords')  # Final column for hashtag keywords
-    
-    # Write CSV manually
-    with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
-        writer = csv.writer(csvfile)
-        
-        # Write header
-        writer.writerow(header)
-        
-        # Write data rows
-        for index, row in df.iterrows():
-            # Start with the first column value, replace NaN with empty string
-            first_col_value = row.iloc[0] if len(row) > 0 else ''
-            if pd.isna(first_col_value):
-                first_col_value = ''
-            row_data = [first_col_value]
-            
-            # Get values for other columns, replace NaN with empty string
-            for col in other_columns:
-                value = row[col]
-                if pd.isna(value):
-                    row_data.append('')
-                else:
-                    row_data.append(value)
-            
-            # Add regular keyword values
-            regular_keywords = regular_keyword_lists[index]
-            for i in range(max_regular_keywords):
-                if i < len(regular_keywords):
-                    row_data.append(regular_keywords[i])
-                else:
-                    row_data.append('')  # Empty string for missing keywords
-            
-            # Add hashtag keywords in final column
-            hashtag_keywords = hashtag_keyword_lists[index]
-            hashtag_value = '@@'.join(hashtag_keywords) if hashtag_keywords else ''
-            row_data.append(hashtag_value)
-            
-            writer.writerow(row_data)
-    
+    return _convert_with_engine(input_file, output_file, 'hashtag_separate', engine, workers, passthrough,
+                                output_format, long_table, cap, dictionary, normalize)
+
+def convert_keywords_format_delimited(input_file, output_file, keywords_columns=None):
+    """
+    Collapse the keyword columns of a converted CSV back into @@ delimited
+    columns, the reverse of the three conversions above (see reverse_converter.py)
+
+    The layout (numbered, same-name or hashtag, with or without a cap) is
+    detected from the header.
+
+    Args:
+        input_file (str): Path to a converted CSV file
+        output_file (str): Path to output CSV file
+        keywords_columns (list): Original keywords column names; detected
+            from the header when None
+
+    Returns:
+        tuple: (number of collapsed columns, total_rows), or None if no
+        keyword columns were found
+    """
+    try:
+        groups, total_rows = reverse_convert(input_file, output_file, keywords_columns)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return None
     print(f"Conversion completed!")
     print(f"Original file: {input_file}")
     print(f"Output file: {output_file}")
-    print(f"Maximum regular keywords found: {max_regular_keywords}")
-    print(f"Created {max_regular_keywords} numbered keyword columns + 1 hashtag column")
-    print(f"Total rows processed: {len(df)}")
+    for column, mode in groups.items():
+        print(f"- {column}: collapsed from the {mode} layout")
+    print(f"Total rows processed: {total_rows}")
+    return len(groups), total_rows
 
-def preview_conversion(input_file, num_rows=5):
+def preview_conversion(input_file, num_rows=5, estimate=False):
     """
     Preview how the conversion will look for the first few rows
     
+    Only the sample rows are parsed as CSV; the keyword statistics come from a
+    byte-level scan of the ASSET_KEYWORDS column (see preview.py).
+    
     Args:
         input_file (str): Path to input CSV file
         num_rows (int): Number of rows to preview
-    """
+        estimate (bool): Estimate the statistics from sampled blocks of huge files
     
-    # Read the CSV file
-    df = pd.read_csv(input_file)
+    Returns:
+        dict: The preview from build_preview, or None if the column is missing
+    """
     
-    if 'ASSET_KEYWORDS' not in df.columns:
-        print("Error: 'ASSET_KEYWORDS' column not found in the CSV file")
-        print(f"Available columns: {list(df.columns)}")
-        return
+    try:
+        preview = build_preview(input_file, num_rows, estimate)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return None
     
+    approx = '~' if preview['estimated'] else ''
     print("PREVIEW - Sample conversion:")
-    print(f"Total rows in file: {len(df)}")
+    print(f"Total rows in file: {approx}{preview['total_rows']}")
     print("\nBEFORE (original format with @@ delimiter):")
     
     # Show sample rows with their keywords
-    sample_df = df[['RESEARCH_ASSET_ID', 'ASSET_KEYWORDS']].head(num_rows)
-    for index, row in sample_df.iterrows():
-        print(f"Row {index}: ID={row['RESEARCH_ASSET_ID']}")
-        if pd.notna(row['ASSET_KEYWORDS']) and row['ASSET_KEYWORDS']:
-            keywords = [kw.strip() for kw in str(row['ASSET_KEYWORDS']).split('@@') if kw.strip()]
-            print(f"  Keywords: {keywords}")
-            print(f"  Count: {len(keywords)} keywords")
+    for sample in preview['samples']:
+        print(f"Row {sample['row']}: ID={sample['id']}")
+        if sample['keywords']:
+            print(f"  Keywords: {sample['keywords']}")
+            print(f"  Count: {len(sample['keywords'])} keywords")
         else:
             print(f"  Keywords: (empty)")
         print()
     
-    # Calculate max keywords across all rows
-    max_keywords = 0
-    for keywords_str in df['ASSET_KEYWORDS']:
-        if pd.isna(keywords_str) or keywords_str == '':
-            keywords = []
-        else:
-            keywords = [kw.strip() for kw in str(keywords_str).split('@@') if kw.strip()]
-        max_keywords = max(max_keywords, len(keywords))
-    
+    max_keywords = preview['max_keywords']
     print(f"AFTER conversion:")
+    if preview['estimated']:
+        print(f"- Estimated from {preview['rows_scanned']} sampled rows")
     print(f"- Maximum keywords found in any row: {max_keywords}")
     print(f"- Will create {max_keywords} separate columns")
     print(f"- Each keyword will go into its own column")
     print(f"- Empty cells for rows with fewer keywords")
+    print("- Rows by keyword count: " +
+          ", ".join(f"{count}: {rows}" for count, rows in preview['histogram'].items()))
+    print("\nKeyword columns needed (--cap K puts the rest of a row's keywords in an overflow column):")
+    print(f"  {'rows':>7} {'K':>6} {'overflow rows':>14} {'keyword cells':>14}")
+    for cap in preview['caps']:
+        print(f"  {cap['coverage']:>7.1%} {cap['cap']:>6} {approx + str(cap['overflow_rows']):>14} "
+              f"{approx + str(cap['cells']):>14}")
+    return preview
 
-# Example usage
-if __name__ == "__main__":
-    # Your actual file paths
-    input_file = "input.csv"
-    output_file_numbered = "output_numbered_columns.csv"
-    output_file_same_name = "output_same_name_columns.csv"
-    
-    print("=== CSV Keywords Converter ===")
-    print("This script converts @@ delimited keywords to multiple columns")
-    print()
-    
-    # Show preview first
-    preview_conversion(input_file, num_rows=3)
+def keyword_statistics(input_file, top_n=TOP_N, frequencies_file=None):
+    """
+    Print keyword frequencies of a file: hashtag vs regular counts and the
+    most frequent keywords of each kind
     
-    print("\nThree conversion options available:")
-    print("1. Numbered columns: ASSET_KEYWORDS, ASSET_KEYWORDS_2, ASSET_KEYWORDS_3, etc.")
-    print("2. Same name columns: ASSET_KEYWORDS, ASSET_KEYWORDS, ASSET_KEYWORDS, etc.")
-    print("3. Hashtag separation: Regular keywords in numbered columns, hashtag keywords (#psychology, etc.) in final 'asset_keywords' column")
-    print()
+    Args:
+        input_file (str): Path to input CSV file
+        top_n (int): Keywords listed per kind
+        frequencies_file (str): Also write the full frequency table here
     
-    choice = input("Which option do you prefer? (1, 2, or 3): ")
+    Returns:
+        dict: The report from frequency_report plus total_rows, or None if
+        the column is missing
+    """
     
-    if choice == "1":
-        print("\nConverting with numbered columns...")
-        convert_keywords_format_numbered(input_file, output_file_numbered)
-        print(f"\nOutput saved as: {output_file_numbered}")
-    elif choice == "2":
-        print("\nConverting with same name columns...")
-        convert_keywords_format_same_name(input_file, output_file_same_name)
-        print(f"\nOutput saved as: {output_file_same_name}")
-    elif choice == "3":
-        output_file_hashtag = "output_hashtag_separated.csv"
-        print("\nConverting with hashtag separation...")
-        convert_keywords_format_hashtag_separate(input_file, output_file_hashtag)
-        print(f"\nOutput saved as: {output_file_hashtag}")
+    try:
+        vocabulary, total_rows = scan_vocabulary(input_file)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return None
+    
+    report = frequency_report(vocabulary, top_n)
+    report['total_rows'] = total_rows
+    print(f"Total rows in file: {total_rows}")
+    print(f"Keywords: {report['keyword_count']} ({report['distinct']} distinct)")
+    print(f"- Regular: {report['regular_count']} ({report['distinct_regular']} distinct)")
+    print(f"- Hashtags: {report['hashtag_count']} ({report['distinct_hashtags']} distinct)")
+    for title, pairs in (('regular keywords', report['top_regular']), ('hashtags', report['top_hashtags'])):
+        if pairs:
+            print(f"\nTop {len(pairs)} {title}:")
+            for word, count in pairs:
+                print(f"  {count:>10}  {word}")
+    if frequencies_file:
+        write_frequencies(vocabulary, frequencies_file)
+        print(f"\nFrequency table: {frequencies_file}")
+    return report
+
+# Command line modes and the converter, engine mode and output name suffix used for each
+CONVERTERS = {
+    'numbered': convert_keywords_format_numbered,
+    'same_name': convert_keywords_format_same_name,
+    'hashtag': convert_keywords_format_hashtag_separate,
+}
+ENGINE_MODES = {
+    'numbered': 'numbered',
+    'same_name': 'same_name',
+    'hashtag': 'hashtag_separate',
+}
+OUTPUT_SUFFIXES = {
+    'numbered': 'numbered_columns',
+    'same_name': 'same_name_columns',
+    'hashtag': 'hashtag_separated',
+}
+
+# Files picked up from an input directory
+INPUT_PATTERNS = ('*.csv', '*.csv.gz', '*.csv.zst', '*.zip')
+
+def find_input_files(patterns):
+    """
+    Expand file paths, glob patterns and directories into a sorted list of CSV files
+
+    Directories contribute every ``*.csv`` file directly inside them, and
+    compressed ones (``*.csv.gz``, ``*.csv.zst``, ``*.zip``).
+    """
+    files = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for name in INPUT_PATTERNS:
+                files.update(glob.glob(os.path.join(pattern, name)))
+        else:
+            files.update(path for path in glob.glob(pattern) if os.path.isfile(path))
+    return sorted(files)
+
+def output_path(input_file, output_dir, mode, output_format='csv', long_table=False, compression=None):
+    """
+    Output file for input_file in output_dir, e.g. export_numbered_columns.csv,
+    export_numbered_columns.csv.gz with gzip compression, or
+    export_numbered_columns_long.parquet for a long Parquet table
+    """
+    name = os.path.splitext(split_suffix(os.path.basename(input_file))[0])[0]
+    suffix = OUTPUT_SUFFIXES[mode] + ('_long' if long_table else '')
+    extension = EXTENSIONS[output_format] + (SUFFIXES[compression] if compression else '')
+    return os.path.join(output_dir, f"{name}_{suffix}{extension}")
+
+def reverse_output_path(input_file, output_dir, compression=None):
+    """
+    Output file for collapsing input_file in output_dir: the conversion suffix
+    is replaced, so export_numbered_columns.csv gives export_delimited.csv
+    """
+    name = os.path.splitext(split_suffix(os.path.basename(input_file))[0])[0]
+    for suffix in OUTPUT_SUFFIXES.values():
+        if name.endswith(f"_{suffix}"):
+            name = name[:-len(suffix) - 1]
+            break
+    extension = '.csv' + (SUFFIXES[compression] if compression else '')
+    return os.path.join(output_dir, f"{name}_delimited{extension}")
+
+def frequencies_path(input_file, output_dir):
+    """Frequency table for input_file in output_dir, e.g. export_keyword_frequencies.csv"""
+    name = os.path.splitext(split_suffix(os.path.basename(input_file))[0])[0]
+    return os.path.join(output_dir, f"{name}_keyword_frequencies.csv")
+
+def is_up_to_date(input_file, output_file):
+    """True if output_file exists and is newer than input_file"""
+    return (os.path.exists(output_file)
+            and os.path.getmtime(output_file) >= os.path.getmtime(input_file))
+
+def _convert_file(task):
+    """Convert one file for the batch CLI, returning a result dict for the summary"""
+    (input_file, output_file, mode, engine, workers, passthrough, output_format, long_table, cap, dictionary,
+     incremental, keywords_columns, reverse, normalize, profile, profile_dump) = task
+    result = {'input_file': input_file, 'output_file': output_file,
+              'bytes': os.path.getsize(input_file), 'rows': 0, 'seconds': 0.0, 'error': None, 'stages': None,
+              'dialect': None}
+    log = io.StringIO()
+    profiler = cProfile.Profile() if profile_dump else None
+    start = time.perf_counter()
+    try:
+        # Sniffed once here; every pass of the conversion reuses the cached result
+        dialect = input_dialect(input_file)
+        if not dialect.is_default:
+            result['dialect'] = dialect.describe()
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(contextlib.redirect_stdout(log))
+            if profile:
+                result['stages'] = stack.enter_context(profiling(memory=True)).stages
+            if profiler is not None:
+                stack.enter_context(profiler)
+            options = {'output_format': output_format, 'long_table': long_table} if output_format != 'csv' else {}
+            if cap is not None:
+                options['cap'] = cap
+            if dictionary:
+                options['dictionary'] = True
+            if normalize:
+                options['normalize'] = True
+            if reverse:
+                converted = convert_keywords_format_delimited(input_file, output_file, keywords_columns)
+            elif keywords_columns:
+                converted = convert_keyword_columns(input_file, output_file, ENGINE_MODES[mode], keywords_columns,
+                                                    passthrough, cap, normalize)
+            elif incremental:
+                converted = convert_incremental(input_file, output_file, ENGINE_MODES[mode], passthrough, cap)
+            else:
+                converted = CONVERTERS[mode](input_file, output_file, engine=engine, workers=workers,
+                                             passthrough=passthrough, **options)
+        if converted is None:
+            # Converters print their error before returning None; fall back if one did not
+            lines = log.getvalue().strip().splitlines()
+            result['error'] = lines[0] if lines else 'Conversion failed'
+        else:
+            result['rows'] = converted[1]
+    except Exception as e:
+        result['error'] = str(e)
+    result['seconds'] = time.perf_counter() - start
+    if profiler is not None:
+        name = os.path.basename(split_suffix(input_file)[0])
+        profiler.dump_stats(os.path.join(profile_dump, f"{os.path.splitext(name)[0]}.prof"))
+    return result
+
+def _print_batch_summary(results, skipped):
+    """Print per-file throughput and totals for a batch run"""
+    print(f"{'file':<40} {'rows':>10} {'MB':>8} {'seconds':>8} {'rows/s':>10} {'MB/s':>7}")
+    for result in results:
+        name = os.path.basename(result['input_file'])
+        if result['error']:
+            print(f"{name:<40} FAILED: {result['error']}")
+            continue
+        mb = result['bytes'] / 1e6
+        seconds = max(result['seconds'], 1e-9)
+        print(f"{name:<40} {result['rows']:>10} {mb:>8.1f} {seconds:>8.2f} "
+              f"{result['rows'] / seconds:>10.0f} {mb / seconds:>7.1f}")
+        if result['dialect']:
+            print(f"  read as {result['dialect']}")
+
+    converted = [r for r in results if not r['error']]
+    print(f"\nConverted {len(converted)} file(s), skipped {skipped} up-to-date, "
+          f"failed {len(results) - len(converted)}")
+    print(f"Total rows processed: {sum(r['rows'] for r in converted)}")
+
+    for result in results:
+        if result['stages']:
+            print(f"\n{os.path.basename(result['input_file'])}:")
+            print(format_profile(result['stages']))
+
+def main(argv=None):
+    """Command line entry point: convert one or many exports in parallel"""
+    parser = argparse.ArgumentParser(
+        description="Convert @@ delimited ASSET_KEYWORDS to multiple columns")
+    parser.add_argument('inputs', nargs='+',
+                        help="CSV files, glob patterns (quote them) or directories")
+    parser.add_argument('--mode', choices=list(CONVERTERS), default='numbered',
+                        help="numbered: ASSET_KEYWORDS, ASSET_KEYWORDS_2, ...; "
+                             "same_name: repeated ASSET_KEYWORDS; "
+                             "hashtag: regular keywords numbered, hashtags in 'asset_keywords'")
+    parser.add_argument('-o', '--output-dir', default='.',
+                        help="Directory for converted files (default: current directory)")
+    parser.add_argument('--engine', choices=['pandas'] + list(ENGINES), default='pandas',
+                        help="Conversion engine (default: pandas)")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help="Files converted concurrently (default: CPU count)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Processes used within each file (chunked conversion)")
+    parser.add_argument('--passthrough', action='store_true',
+                        help="Copy the other columns exactly as read (no type or NA conversion)")
+    parser.add_argument('--format', choices=['csv'] + list(FORMATS), default='csv', dest='output_format',
+                        help="Output format (default: csv); parquet/arrow/feather dictionary-encode "
+                             "the keyword columns (numbered and hashtag modes)")
+    parser.add_argument('--long', action='store_true', dest='long_table',
+                        help="With --format parquet/arrow/feather, write one (asset id, position, keyword) "
+                             "row per keyword instead of one column per keyword")
+    parser.add_argument('--compress', choices=list(CODECS), default=None,
+                        help="Compress the output CSV while writing it (.gz, .zst or .zip)")
+    parser.add_argument('--cap', type=int, default=None, metavar='K',
+                        help="Write at most K keyword columns plus an overflow column holding the rest "
+                             "(see --preview for the keyword-count distribution)")
+    parser.add_argument('--dictionary', action='store_true',
+                        help="Write keyword ids instead of keywords, with the ids in <output>_vocabulary.csv "
+                             "(stream engine)")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Convert only rows appended since the last --incremental run and append them "
+                             "to the output (stream engine; <output>.manifest.json tracks progress)")
+    parser.add_argument('--normalize', action='store_true',
+                        help="Put keywords in Unicode NFC and keep only the first of a row's keywords that "
+                             "differ only in case, surrounding spaces or a leading '#'")
+    parser.add_argument('--keywords-column', action='append', dest='keywords_columns', metavar='NAME',
+                        help="Expand this column instead of ASSET_KEYWORDS; repeat it to expand several columns "
+                             "in one pass. 'auto' picks the column that looks most like @@ delimited keywords, "
+                             "'all' every such column (stream engine)")
+    parser.add_argument('--reverse', action='store_true',
+                        help="Collapse the keyword columns of converted files back into @@ delimited columns "
+                             "(<name>_delimited.csv); the layout is detected from the header, --keywords-column "
+                             "names the original columns")
+    parser.add_argument('--detect', action='store_true',
+                        help="Score every column of each file as a keywords column instead of converting")
+    parser.add_argument('--profile', action='store_true',
+                        help="Report wall time, rows/s, bytes and peak memory of each conversion stage "
+                             "(read, split, layout, write)")
+    parser.add_argument('--profile-dump', metavar='DIR', default=None,
+                        help="Also write a cProfile dump of each conversion to DIR/<name>.prof "
+                             "(implies --profile)")
+    parser.add_argument('--force', action='store_true',
+                        help="Convert even if the output is newer than the input")
+    parser.add_argument('--preview', action='store_true',
+                        help="Preview the conversion of each file instead of converting")
+    parser.add_argument('--estimate', action='store_true',
+                        help="With --preview, estimate statistics of huge files from sampled blocks")
+    parser.add_argument('--stats', action='store_true',
+                        help="Report keyword frequencies of each file and write <name>_keyword_frequencies.csv "
+                             "to the output directory instead of converting")
+    parser.add_argument('--top', type=int, default=TOP_N, metavar='N',
+                        help=f"With --stats, list the N most frequent keywords and hashtags (default: {TOP_N})")
+    args = parser.parse_args(argv)
+    if args.output_format != 'csv' and args.mode == 'same_name':
+        parser.error("--format parquet/arrow/feather supports the numbered and hashtag modes only")
+    if args.long_table and args.output_format == 'csv':
+        parser.error("--long needs --format parquet, arrow or feather")
+    if args.cap is not None and args.cap < 0:
+        parser.error("--cap must be 0 or more")
+    if args.cap is not None and args.output_format != 'csv':
+        parser.error("--cap applies to CSV output; use --long for a compact columnar file")
+    if args.compress and args.output_format != 'csv':
+        parser.error("--compress applies to CSV output; Parquet/Arrow are compressed internally")
+    if args.incremental and (args.output_format != 'csv' or args.compress or args.dictionary or args.normalize):
+        parser.error("--incremental appends to an uncompressed CSV output without --dictionary or --normalize")
+    if args.keywords_columns and (args.output_format != 'csv' or args.dictionary or args.incremental):
+        parser.error("--keywords-column writes CSV and cannot be combined with --dictionary or --incremental")
+    if args.keywords_columns and len(args.keywords_columns) > 1 and set(args.keywords_columns) & set(SELECTIONS):
+        parser.error("--keywords-column auto/all cannot be combined with column names")
+    if args.reverse and (args.output_format != 'csv' or args.dictionary or args.incremental or args.cap is not None
+                         or args.passthrough or args.normalize):
+        parser.error("--reverse writes CSV and cannot be combined with --cap, --dictionary, --incremental, "
+                     "--normalize or --passthrough (other columns are always copied as read)")
+    if args.reverse and args.keywords_columns and set(args.keywords_columns) & set(SELECTIONS):
+        parser.error("--reverse takes the original column names; auto/all apply to @@ delimited inputs")
+    if args.dictionary and args.output_format != 'csv':
+        parser.error("--dictionary applies to CSV output; Parquet/Arrow keyword columns are dictionary-encoded")
+
+    if args.profile_dump:
+        args.profile = True
+        os.makedirs(args.profile_dump, exist_ok=True)
+
+    input_files = find_input_files(args.inputs)
+    if not input_files:
+        print("Error: no CSV files matched the given inputs")
+        return 1
+
+    if args.detect:
+        failed = False
+        for input_file in input_files:
+            print(f"=== {input_file} ===")
+            failed = detect_keyword_columns(input_file) is None or failed
+        return 1 if failed else 0
+
+    if args.preview:
+        for input_file in input_files:
+            print(f"=== {input_file} ===")
+            preview_conversion(input_file, num_rows=3, estimate=args.estimate)
+        return 0
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    if args.stats:
+        failed = False
+        for input_file in input_files:
+            print(f"=== {input_file} ===")
+            report = keyword_statistics(input_file, args.top, frequencies_path(input_file, args.output_dir))
+            failed = failed or report is None
+        return 1 if failed else 0
+
+    tasks = []
+    skipped = 0
+    for input_file in input_files:
+        if args.reverse:
+            output_file = reverse_output_path(input_file, args.output_dir, args.compress)
+        else:
+            output_file = output_path(input_file, args.output_dir, args.mode, args.output_format, args.long_table,
+                                      args.compress)
+        if not args.force and is_up_to_date(input_file, output_file):
+            print(f"Skipping {input_file}: {output_file} is up to date")
+            skipped += 1
+            continue
+        tasks.append((input_file, output_file, args.mode, args.engine, args.workers, args.passthrough,
+                      args.output_format, args.long_table, args.cap, args.dictionary, args.incremental,
+                      args.keywords_columns, args.reverse, args.normalize, args.profile, args.profile_dump))
+
+    jobs = max(1, min(args.jobs, len(tasks)))
+    if jobs == 1:
+        results = [_convert_file(task) for task in tasks]
     else:
-        print("Invalid choice. Please run again and select 1, 2, or 3.")
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(_convert_file, tasks))
+
+    _print_batch_summary(results, skipped)
+    return 1 if any(r['error'] for r in results) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
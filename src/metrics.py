@@ -0,0 +1,316 @@
+"""
+Stage timings for conversions and Prometheus metrics for the web app.
+
+Every converter marks its stages with ``stage(name)``: ``read`` (loading the
+export), ``split`` (splitting the keywords column; for the streaming engines
+this is the first pass, which reads the file as it goes), ``layout``
+(building the output columns) and ``write`` (rendering and writing the
+output, again reading the input for the streaming engines). Stages are only
+recorded inside ``profiling()``; everywhere else ``stage`` does nothing, so
+the converters pay nothing for the instrumentation when it is not wanted.
+
+A stage records its wall time and, when the converter knows them, the rows
+it handled and the bytes it read and wrote. With ``profiling(memory=True)``
+it also records the process's peak resident memory during the stage (on
+Linux the peak is reset before each stage; elsewhere it is the peak since
+the process started). Work done in child processes (``workers=N``) is timed
+but not included in the memory figure.
+
+The web app's metrics are kept in a small ``Registry`` of counters and
+histograms rendered in the Prometheus text exposition format, so no client
+library is needed. A server runs several processes and a scrape reaches only
+one of them, so a registry given a shared ``folder`` saves its values there
+(one JSON file per process) and renders the sum of every process's values.
+"""
+
+import contextlib
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+STAGES = ('read', 'split', 'layout', 'write')
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_profile = contextvars.ContextVar('conversion_profile', default=None)
+
+def _reset_peak_rss():
+    # Writing 5 to clear_refs resets VmHWM (Linux 4.0+)
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+def peak_rss():
+    """Peak resident memory of this process in bytes, or None where unknown"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def file_size(path):
+    """Size of a file path in bytes, or None for a missing file or a file object"""
+    if isinstance(path, (str, os.PathLike)) and os.path.isfile(path):
+        return os.path.getsize(path)
+    return None
+
+class Profile:
+    """
+    Stage records of the conversions run inside one profiling() block
+
+    ``stages`` holds one dict per stage: stage, seconds, rows, bytes_in,
+    bytes_out and peak_rss (None where not known).
+    """
+
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.stages = []
+
+    @contextlib.contextmanager
+    def stage(self, name, **fields):
+        record = {'stage': name, 'seconds': 0.0, 'rows': None, 'bytes_in': None, 'bytes_out': None,
+                  'peak_rss': None}
+        record.update(fields)
+        if self.memory:
+            _reset_peak_rss()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - start
+            if self.memory:
+                record['peak_rss'] = peak_rss()
+            self.stages.append(record)
+
+    def totals(self):
+        """Seconds per stage name, summed over repeated stages"""
+        totals = {}
+        for record in self.stages:
+            totals[record['stage']] = totals.get(record['stage'], 0.0) + record['seconds']
+        return totals
+
+@contextlib.contextmanager
+def profiling(memory=False):
+    """Record the stages of conversions run in this block (this thread only) in a new Profile"""
+    profile = Profile(memory)
+    token = _profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _profile.reset(token)
+
+def stage(name, **fields):
+    """
+    Context manager timing one stage of the active profile
+
+    Yields the stage's record so the converter can fill in rows, bytes_in
+    and bytes_out; without an active profile nothing is recorded.
+    """
+    profile = _profile.get()
+    if profile is None:
+        return contextlib.nullcontext({})
+    return profile.stage(name, **fields)
+
+def format_profile(stages):
+    """Stage records (Profile.stages) as a text table"""
+    def number(value, scale=1, digits=1):
+        return '-' if value is None else f"{value / scale:.{digits}f}"
+
+    lines = [f"{'stage':<8} {'seconds':>8} {'rows':>10} {'rows/s':>10} {'MB in':>8} {'MB out':>8} {'peak MB':>8}"]
+    for record in stages:
+        rows = record['rows']
+        rate = rows / record['seconds'] if rows is not None and record['seconds'] > 0 else None
+        lines.append(f"{record['stage']:<8} {record['seconds']:>8.3f} {'-' if rows is None else rows:>10} "
+                     f"{number(rate, digits=0):>10} {number(record['bytes_in'], 1e6):>8} "
+                     f"{number(record['bytes_out'], 1e6):>8} {number(record['peak_rss'], 1e6):>8}")
+    return '\n'.join(lines)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{value}"' for name, value in extra]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Monotonic counter with labels"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dump(self):
+        """The values per label set, as JSON-friendly [labels, value] pairs"""
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def merge(self, dumps):
+        """Sum of the values of several dumps, keyed by label tuple"""
+        values = {}
+        for dump in dumps:
+            for key, value in dump:
+                key = tuple(key)
+                values[key] = values.get(key, 0) + value
+        return values
+
+    def samples(self, values=None):
+        if values is None:
+            with self._lock:
+                values = dict(self._values)
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}" for key, value in sorted(values.items())]
+
+class Histogram:
+    """Histogram with labels and cumulative buckets, like prometheus_client's"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    def dump(self):
+        """The bucket counts and sum per label set, as JSON-friendly [labels, [counts, sum]] pairs"""
+        with self._lock:
+            return [[list(key), [list(counts), total]] for key, (counts, total) in self._values.items()]
+
+    def merge(self, dumps):
+        """Sum of the bucket counts and sums of several dumps, keyed by label tuple"""
+        values = {}
+        for dump in dumps:
+            for key, (counts, total) in dump:
+                # Values saved with other buckets cannot be added up
+                if len(counts) != len(self.buckets):
+                    continue
+                key = tuple(key)
+                merged, merged_total = values.get(key, ([0] * len(self.buckets), 0.0))
+                values[key] = ([a + b for a, b in zip(merged, counts)], merged_total + total)
+        return values
+
+    def samples(self, values=None):
+        if values is None:
+            with self._lock:
+                values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        lines = []
+        for key, (counts, total) in sorted(values.items()):
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [('le', _number(bound))])} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {counts[-1]}")
+        return lines
+
+class Registry:
+    """
+    A set of metrics rendered together in the Prometheus text format
+
+    Args:
+        folder (str): Folder shared by the server's processes; save() writes
+            this process's values there and render() adds up every process's
+            values. Without it only this process's values are rendered.
+    """
+
+    def __init__(self, folder=None):
+        self._metrics = []
+        self.folder = folder
+        self._save_lock = threading.Lock()
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self.register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def _path(self):
+        return os.path.join(self.folder, f'metrics-{os.getpid()}.json')
+
+    def save(self):
+        """Write this process's values to the shared folder, if there is one"""
+        if self.folder is None:
+            return
+        snapshot = {metric.name: metric.dump() for metric in self._metrics}
+        path = self._path()
+        with self._save_lock:
+            os.makedirs(self.folder, exist_ok=True)
+            with open(path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f)
+            os.replace(path + '.tmp', path)
+
+    def _snapshots(self):
+        # Values saved by the other processes; this process's are read live
+        if self.folder is None:
+            return []
+        own = os.path.basename(self._path())
+        snapshots = []
+        try:
+            names = os.listdir(self.folder)
+        except OSError:
+            return []
+        for name in names:
+            if name == own or not (name.startswith('metrics-') and name.endswith('.json')):
+                continue
+            try:
+                with open(os.path.join(self.folder, name), encoding='utf-8') as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def render(self):
+        snapshots = self._snapshots()
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            dumps = [metric.dump()] + [snapshot.get(metric.name, []) for snapshot in snapshots]
+            lines.extend(metric.samples(metric.merge(dumps)))
+        return '\n'.join(lines) + '\n'
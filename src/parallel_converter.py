@@ -0,0 +1,224 @@
+"""
+Multiprocess chunked conversion for very large exports.
+
+The input is cut into byte ranges that start on row boundaries (a newline that
+is not inside a quoted field), then a ``ProcessPoolExecutor`` works through
+the chunks in phases:
+
+1. every worker scans its chunk's keywords column; the per-chunk maxima are
+   reduced to the global ``max_keywords`` and the row counts give each chunk's
+   first row
+2. every worker records the column types of its chunk (see column_types); the
+   main process merges them in input order into the formats of the whole file
+   (skipped with ``passthrough=True``)
+3. every worker renders its chunk to CSV bytes with the streaming engine's row
+   writer and the main process writes the chunks out in input order
+
+When the keywords column itself holds numbers pandas re-formats, the keywords
+are scanned once more as formatted between phases 2 and 3.
+
+The output is identical to ``stream_convert``, and so to the pandas
+converters. Files must use ``\\n`` or ``\\r\\n`` line endings. Compressed inputs
+cannot be split at byte offsets, and the workers parse UTF-8 with ','
+delimiters, so compressed inputs and inputs in another dialect (see dialect)
+are converted by stream_convert instead.
+"""
+
+import csv
+import io
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from column_types import ColumnTypes
+from compression import atomic_output, detect_codec, open_output
+from dialect import input_dialect
+from keyword_parser import ParsedKeywords
+from metrics import file_size, stage
+from stream_converter import (check_mode, data_rows, find_keywords_column, output_layout,
+                              read_columns, scan_rows, stream_convert, write_rows)
+
+_BLOCK_SIZE = 1 << 20
+# Upper bound on the bytes one worker holds in memory for a chunk
+MAX_CHUNK_BYTES = 64 << 20
+
+def find_row_starts(input_file, targets):
+    """
+    Find, for each byte offset in targets, the start of the first row after it
+
+    A row starts after a newline that is outside quoted fields; quote state is
+    tracked with the parity of '"' bytes, which also covers escaped quotes.
+
+    Args:
+        input_file (str): Path to the CSV file
+        targets (list): Ascending byte offsets
+
+    Returns:
+        list: Distinct row start offsets, at most one per target
+    """
+    starts = []
+    pending = deque(targets)
+    in_quotes = False
+    offset = 0
+    with open(input_file, 'rb') as f:
+        while pending:
+            block = f.read(_BLOCK_SIZE)
+            if not block:
+                break
+            pos = 0
+            end = offset + len(block)
+            while pending and pending[0] < end:
+                newline = block.find(b'\n', max(pos, pending[0] - offset))
+                if newline < 0:
+                    break
+                in_quotes ^= bool(block.count(b'"', pos, newline) & 1)
+                pos = newline + 1
+                if not in_quotes:
+                    row_start = offset + pos
+                    starts.append(row_start)
+                    while pending and pending[0] < row_start:
+                        pending.popleft()
+            in_quotes ^= bool(block.count(b'"', pos) & 1)
+            offset = end
+    return starts
+
+def split_chunks(input_file, chunks):
+    """
+    Split a CSV file into byte ranges aligned on row boundaries
+
+    Returns:
+        tuple: (header_end, [(start, end), ...]) covering the data rows
+    """
+    size = os.path.getsize(input_file)
+    step = max(size // max(chunks, 1), 1)
+    targets = [0] + list(range(step, size, step))
+    starts = find_row_starts(input_file, targets)
+    if not starts:
+        return size, []
+    header_end = starts[0]
+    bounds = [s for s in starts if s < size] + [size]
+    return header_end, [(a, b) for a, b in zip(bounds, bounds[1:]) if b > a]
+
+def _chunk_reader(input_file, start, end):
+    with open(input_file, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return csv.reader(io.StringIO(data.decode('utf-8'), newline=''))
+
+def _scan_chunk(task):
+    input_file, start, end, width, kw_index = task
+    stats = scan_rows(_chunk_reader(input_file, start, end), width, kw_index)
+    return stats.max_keywords, stats.max_regular, stats.rows
+
+def _type_chunk(task):
+    input_file, start, end, width, first_row = task
+    types = ColumnTypes(width, first_row)
+    for row in data_rows(_chunk_reader(input_file, start, end), width):
+        types.add(row)
+    return types.blocks
+
+def _rescan_chunk(task):
+    input_file, start, end, width, kw_index, formats, first_row = task
+    stats = ParsedKeywords(keep_tokens=False, na_values=())
+    rows = data_rows(_chunk_reader(input_file, start, end), width)
+    for cells in formats.apply(rows, '', kw_index, first_row):
+        stats.add(cells[kw_index])
+    return stats.max_keywords, stats.max_regular
+
+def _render_chunk(task):
+    input_file, start, end, layout, first_row = task
+    buffer = io.StringIO()
+    write_rows(data_rows(_chunk_reader(input_file, start, end), layout['width']), buffer, layout,
+               first_row=first_row)
+    return buffer.getvalue().encode('utf-8')
+
+def _ordered_results(executor, fn, tasks, window):
+    """Like executor.map, but with at most ``window`` tasks in flight"""
+    futures = deque()
+    for task in tasks:
+        futures.append(executor.submit(fn, task))
+        if len(futures) >= window:
+            yield futures.popleft().result()
+    while futures:
+        yield futures.popleft().result()
+
+def parallel_convert(input_file, output_file, mode='numbered', style='cli', workers=None, passthrough=False,
+                     cap=None):
+    """
+    Convert an @@ delimited keywords CSV using several processes
+
+    Args:
+        input_file (str): Path to input CSV file
+        output_file (str): Path to output CSV file
+        mode (str): One of 'numbered', 'same_name' or 'hashtag_separate'
+        style (str): 'cli' to match keywords_converter.py, 'web' to match web_app.py
+        workers (int): Number of worker processes (default: CPU count)
+        passthrough (bool): Copy fields outside the keywords column verbatim
+        cap (int): Write at most cap keyword columns and join the remaining
+            keywords of a row with '@@' into an overflow column
+
+    Returns:
+        tuple: (max_keywords, total_rows); for 'hashtag_separate' max_keywords
+        counts regular keywords only
+
+    Raises:
+        ValueError: If the keywords column cannot be found
+    """
+    check_mode(mode, style)
+    if detect_codec(input_file) is not None or not input_dialect(input_file).is_default:
+        return stream_convert(input_file, output_file, mode, style, passthrough=passthrough, cap=cap)
+    workers = workers or os.cpu_count() or 1
+
+    with open(input_file, 'r', newline='', encoding='utf-8-sig') as csvfile:
+        columns = read_columns(csv.reader(csvfile))
+    keywords_col = find_keywords_column(columns, style)
+    kw_index = columns.index(keywords_col)
+
+    size = os.path.getsize(input_file)
+    chunks = max(workers * 4, size // MAX_CHUNK_BYTES + 1)
+    _, ranges = split_chunks(input_file, chunks)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        with stage('split', bytes_in=size) as record:
+            max_keywords = 0
+            total_rows = 0
+            first_rows = []
+            scan_tasks = [(input_file, start, end, len(columns), kw_index) for start, end in ranges]
+            for chunk_max, chunk_max_regular, rows in executor.map(_scan_chunk, scan_tasks):
+                chunk_width = chunk_max_regular if mode == 'hashtag_separate' else chunk_max
+                max_keywords = max(max_keywords, chunk_width)
+                first_rows.append(total_rows)
+                total_rows += rows
+            record['rows'] = total_rows
+
+        formats = None
+        if not passthrough:
+            with stage('types', rows=total_rows, bytes_in=size):
+                types = ColumnTypes(len(columns))
+                type_tasks = [(input_file, start, end, len(columns), first_row)
+                              for (start, end), first_row in zip(ranges, first_rows)]
+                for blocks in executor.map(_type_chunk, type_tasks):
+                    types.update(ColumnTypes(len(columns), blocks=blocks))
+                formats = types.formats()
+                if formats.converts(kw_index):
+                    rescan_tasks = [(input_file, start, end, len(columns), kw_index, formats, first_row)
+                                    for (start, end), first_row in zip(ranges, first_rows)]
+                    widths = list(executor.map(_rescan_chunk, rescan_tasks))
+                    max_keywords = max((chunk_max_regular if mode == 'hashtag_separate' else chunk_max
+                                        for chunk_max, chunk_max_regular in widths), default=0)
+
+        with stage('layout'):
+            layout = output_layout(columns, keywords_col, mode, style, max_keywords, passthrough, cap,
+                                   formats=formats)
+            header = io.StringIO()
+            csv.writer(header, lineterminator=layout['lineterminator']).writerow(layout['header'])
+        with stage('write', rows=total_rows, bytes_in=size) as record, atomic_output(output_file) as path:
+            with open_output(path) as outfile:
+                outfile.write(header.getvalue().encode('utf-8'))
+                render_tasks = [(input_file, start, end, layout, first_row)
+                                for (start, end), first_row in zip(ranges, first_rows)]
+                for data in _ordered_results(executor, _render_chunk, render_tasks, workers * 2):
+                    outfile.write(data)
+    record['bytes_out'] = file_size(output_file)
+
+    return max_keywords, total_rows
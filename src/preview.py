@@ -0,0 +1,213 @@
+"""
+Conversion preview that reads only what it needs.
+
+Sample rows come from the first records of the file. The keyword statistics
+(maximum keywords per row and a histogram of rows by keyword count) come from
+a binary scan that cuts out just the keywords field of each record and counts
+its '@@' delimiters with ``keyword_parser.count_keywords`` (records are cut
+with ``csv_bytes``); no other column is decoded.
+
+For huge files ``estimate=True`` scans SAMPLE_BLOCKS evenly spaced blocks
+instead of the whole file and extrapolates the row count from the share of
+bytes scanned; the maximum and histogram then describe the sampled rows only.
+Compressed exports cannot be sampled at an offset, so they are always scanned
+in full (decompressed as a stream). Exports in another encoding or delimiter
+than UTF-8 and ',' (see dialect) are scanned in full through the csv module.
+
+``cap_report`` turns the histogram into candidate values for the converters'
+keyword cap: for each share of rows, the number of keyword columns that holds
+all keywords of that share, how many rows would overflow and how many keyword
+cells the wide output would hold.
+"""
+
+import csv
+import io
+import os
+from collections import Counter
+from itertools import islice
+
+from compression import detect_codec, open_input
+from csv_bytes import iter_records, keyword_fields
+from dialect import csv_reader, input_dialect, open_input_text
+from keyword_parser import NA_VALUES, count_keywords, split_keywords
+from stream_converter import data_rows, find_keywords_column, pandas_column_names, read_columns
+
+SAMPLE_BLOCKS = 16
+SAMPLE_BLOCK_BYTES = 1 << 20
+# Column shown next to each sample row when the export has it
+ID_COLUMN = 'RESEARCH_ASSET_ID'
+# Shares of rows cap_report finds a keyword cap for
+CAP_COVERAGE = (0.5, 0.9, 0.95, 0.99, 0.999, 1.0)
+
+def _limited_lines(f, limit):
+    """Lines of binary file f until at least limit bytes have been read"""
+    consumed = 0
+    for line in f:
+        yield line
+        consumed += len(line)
+        if consumed >= limit:
+            return
+
+def _resync(f, width, limit):
+    """
+    Move f, just placed at an arbitrary offset, to the start of a whole record
+
+    Picks the first line without quotes that has exactly width fields, which
+    cannot be the inside of a quoted field in practice. Falls back to the
+    first line break when no such line appears within limit bytes.
+    """
+    f.readline()
+    fallback = f.tell()
+    position = fallback
+    while position - fallback < limit:
+        line = f.readline()
+        if not line:
+            break
+        if b'"' not in line and line.count(b',') == width - 1:
+            f.seek(position)
+            return
+        position += len(line)
+    f.seek(fallback)
+
+def count_rows(lines, kw_index, histogram):
+    """
+    Add the keyword count of every record in lines to histogram
+
+    Returns:
+        int: Number of data rows counted (blank lines are skipped like pandas)
+    """
+    rows = 0
+    for field in keyword_fields(iter_records(lines), kw_index):
+        histogram[count_keywords(field)] += 1
+        rows += 1
+    return rows
+
+def _count_text_rows(input_file, histogram):
+    """
+    count_rows for inputs in another dialect, read through the csv module
+
+    Returns:
+        tuple: (columns, keywords_col)
+    """
+    with open_input_text(input_file) as csvfile:
+        reader = csv_reader(csvfile)
+        columns = read_columns(reader)
+        keywords_col = find_keywords_column(columns, 'cli')
+        kw_index = columns.index(keywords_col)
+        for row in data_rows(reader, len(columns)):
+            histogram[count_keywords(row[kw_index].encode('utf-8'))] += 1
+    return columns, keywords_col
+
+def cap_report(histogram, coverage=CAP_COVERAGE):
+    """
+    Candidate keyword caps from a {keyword count: rows} histogram
+
+    Returns:
+        list: One dict per share in coverage: coverage, cap (fewest keyword
+        columns holding every keyword of that share of rows), overflow_rows
+        (rows with more keywords than cap) and cells (rows x cap)
+    """
+    total_rows = sum(histogram.values())
+    counts = sorted(histogram.items())
+    report = []
+    for share in coverage:
+        covered = 0
+        cap = 0
+        for count, rows in counts:
+            if covered >= share * total_rows:
+                break
+            covered += rows
+            cap = count
+        report.append({
+            'coverage': share,
+            'cap': cap,
+            'overflow_rows': total_rows - covered,
+            'cells': total_rows * cap,
+        })
+    return report
+
+def _sample_rows(input_file, columns, keywords_col, num_rows):
+    with open_input_text(input_file) as csvfile:
+        reader = csv_reader(csvfile)
+        next(reader)
+        kw_index = columns.index(keywords_col)
+        id_index = columns.index(ID_COLUMN) if ID_COLUMN in columns else None
+        samples = []
+        for index, row in enumerate(islice(data_rows(reader, len(columns)), num_rows)):
+            asset_id = row[id_index] if id_index is not None else None
+            samples.append({
+                'row': index,
+                'id': None if asset_id in NA_VALUES else asset_id,
+                'keywords': split_keywords(row[kw_index]),
+            })
+    return samples
+
+def build_preview(input_file, num_rows=5, estimate=False):
+    """
+    Collect a preview of the conversion without loading the whole file
+
+    Args:
+        input_file (str): Path to input CSV file
+        num_rows (int): Number of sample rows
+        estimate (bool): Scan evenly spaced blocks instead of every row when
+            the file is larger than the blocks together
+
+    Returns:
+        dict: columns, keywords_col, samples (row, id, keywords), total_rows,
+        max_keywords, histogram ({keyword count: rows}), caps (see cap_report),
+        estimated, rows_scanned and bytes_scanned
+
+    Raises:
+        ValueError: If the 'ASSET_KEYWORDS' column is missing
+    """
+    size = os.path.getsize(input_file)
+    compressed = detect_codec(input_file) is not None
+    histogram = Counter()
+    if not input_dialect(input_file).is_default:
+        # The byte-level scan expects UTF-8 split on ','
+        columns, keywords_col = _count_text_rows(input_file, histogram)
+        rows_scanned = total_rows = sum(histogram.values())
+        bytes_scanned = size
+        estimated = False
+    else:
+        with open_input(input_file) as f:
+            header = next(iter_records(f), b'')
+            data_start = f.tell()
+            row = next(csv.reader(io.StringIO(header.decode('utf-8-sig'), newline='')), [])
+            if not row:
+                raise ValueError('No columns to parse from file')
+            columns = pandas_column_names(row)
+            keywords_col = find_keywords_column(columns, 'cli')
+            kw_index = columns.index(keywords_col)
+
+            data_bytes = size - data_start
+            estimated = estimate and not compressed and data_bytes > SAMPLE_BLOCKS * SAMPLE_BLOCK_BYTES
+            if estimated:
+                rows_scanned = 0
+                bytes_scanned = 0
+                step = data_bytes // SAMPLE_BLOCKS
+                for block in range(SAMPLE_BLOCKS):
+                    f.seek(data_start + block * step)
+                    if block:
+                        _resync(f, len(columns), SAMPLE_BLOCK_BYTES)
+                    start = f.tell()
+                    rows_scanned += count_rows(_limited_lines(f, SAMPLE_BLOCK_BYTES), kw_index, histogram)
+                    bytes_scanned += f.tell() - start
+                total_rows = round(rows_scanned * data_bytes / max(bytes_scanned, 1))
+            else:
+                rows_scanned = total_rows = count_rows(f, kw_index, histogram)
+                bytes_scanned = f.tell() - data_start
+
+    return {
+        'input_file': input_file,
+        'columns': columns,
+        'keywords_col': keywords_col,
+        'samples': _sample_rows(input_file, columns, keywords_col, num_rows),
+        'total_rows': total_rows,
+        'max_keywords': max(histogram, default=0),
+        'histogram': dict(sorted(histogram.items())),
+        'caps': cap_report(histogram),
+        'estimated': estimated,
+        'rows_scanned': rows_scanned,
+        'bytes_scanned': bytes_scanned,
+    }
@@ -0,0 +1,162 @@
+"""
+On-disk cache of conversion results keyed by input content.
+
+Results are stored under a key derived from the SHA-256 of the uploaded bytes,
+the conversion mode, the keywords column and any other options, so a repeated
+upload is answered from disk without converting. Parsed keyword buffers are
+cached separately per (content hash, keywords column), which lets a different
+conversion mode on the same input skip the split stage.
+
+Entries are evicted least-recently-used first (by file modification time,
+refreshed on every hit) once the cache grows beyond its size budget.
+
+Every file is written under a temporary name and moved into place with
+``os.replace``, so several server processes can share one cache folder: a
+reader sees either a complete entry or a miss, and two processes publishing
+the same key write identical content.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+from contextlib import contextmanager
+
+# Part of every parsed-buffer key; bumped whenever ParsedKeywords (or what is
+# cached with it) changes its layout, so buffers pickled by an older version
+# are never loaded
+PARSED_VERSION = 3
+
+class ResultCache:
+    """
+    Size-bounded LRU cache of converted files and parsed keyword buffers
+
+    Args:
+        cache_folder (str): Directory holding the cache entries
+        max_bytes (int): Total size the cache is trimmed back to after writes
+    """
+
+    def __init__(self, cache_folder, max_bytes=512 * 1024 * 1024):
+        self.cache_folder = cache_folder
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(cache_folder, exist_ok=True)
+
+    @staticmethod
+    def result_key(content_hash, mode, keywords_col, options=None):
+        """Cache key for one conversion of one input"""
+        key = json.dumps([content_hash, mode, keywords_col, options or {}], sort_keys=True)
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def parsed_key(content_hash, keywords_col, normalized=False, passthrough=False):
+        """
+        Cache key for the parsed keywords column of one input (normalized or as
+        split), and its column types unless read with passthrough
+        """
+        parts = [content_hash, keywords_col, 'parsed', PARSED_VERSION]
+        if normalized:
+            parts.append('normalized')
+        if passthrough:
+            parts.append('passthrough')
+        key = json.dumps(parts)
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def _path(self, key, suffix):
+        return os.path.join(self.cache_folder, key + suffix)
+
+    def _touch(self, *paths):
+        for path in paths:
+            os.utime(path)
+
+    def get_result(self, key):
+        """
+        Look up a cached conversion
+
+        Returns:
+            tuple: (path, metadata) of the cached output, or None on a miss
+        """
+        path, meta_path = self._path(key, '.csv'), self._path(key, '.json')
+        try:
+            with open(meta_path) as f:
+                metadata = json.load(f)
+            self._touch(path, meta_path)
+        except (OSError, ValueError):
+            return None
+        return path, metadata
+
+    @contextmanager
+    def result_writer(self, key, metadata):
+        """
+        Write a conversion result into the cache as it is produced
+
+        Yields a binary file; the entry is published atomically when the block
+        completes and discarded if it is interrupted (e.g. the client went away).
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_folder, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                yield f
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        os.replace(tmp_path, self._path(key, '.csv'))
+        # The metadata is published last; get_result treats a key without it as a miss
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_folder, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(metadata, f)
+        os.replace(tmp_path, self._path(key, '.json'))
+        self.evict()
+
+    def get_parsed(self, key):
+        """Return a cached (ParsedKeywords, ColumnFormats) pair, or None on a miss"""
+        path = self._path(key, '.parsed')
+        try:
+            with open(path, 'rb') as f:
+                parsed = pickle.load(f)
+            self._touch(path)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # A truncated or incompatible pickle can raise almost anything
+            # (AttributeError, ImportError, ValueError...); drop it and re-parse
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return parsed
+
+    def put_parsed(self, key, parsed):
+        """Store a (ParsedKeywords, ColumnFormats) pair, as returned by get_parsed"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_folder, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(parsed, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self._path(key, '.parsed'))
+        self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes"""
+        with self._lock:
+            entries = []
+            total = 0
+            for entry in os.scandir(self.cache_folder):
+                if entry.name.endswith('.tmp') or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+            entries.sort()
+            removed = 0
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                removed += 1
+            return removed
@@ -0,0 +1,288 @@
+"""
+Collapsing converted keyword columns back into one @@ delimited column.
+
+Curators edit the converted output in a spreadsheet and the result has to go
+back into Esploro as a single '@@' delimited column. The layout is read from
+the header alone, for every group of keyword columns it holds:
+
+- numbered: ``K``, ``K_2``, ``K_3``, ... (``K`` present, so ``FIELD_1``,
+  ``FIELD_2`` are not taken for a group)
+- same_name: ``K`` repeated
+- hashtag: either of the above followed by a hashtag column named after ``K``
+  in lower case (``K_hashtags`` when ``K`` already is), or ``asset_keywords``
+  for the single keywords column of a web conversion
+- with a cap, the ``K_overflow`` column
+
+A header in none of these shapes holding ``ASSET_KEYWORDS`` is a numbered
+conversion one keyword wide. Columns can also be named explicitly.
+
+Each group is replaced by one ``K`` column at the position of its first
+column (where the converters put the keyword columns, after the other
+columns). Its value is the group's non-blank cells joined with '@@' in
+keyword order, then the overflow and hashtag cells, which already hold '@@'
+delimited keywords (a lone keyword that reads as a missing value, such as
+``NA``, gets a trailing '@@' so it survives); so in hashtag mode the hashtags follow the regular
+keywords rather than keeping their original places. Every other column is
+copied exactly as read, the CLI's unnamed first column included, so
+converting the result again gives the output it was collapsed from.
+
+The output width is known from the header, so rows are collapsed in a single
+pass from ``csv.reader`` to ``csv.writer`` and memory stays constant whatever
+the size of the file. Inputs are read in their sniffed dialect (an export
+saved from Excel may use ';' and cp1252, see dialect) and may be compressed;
+the output is UTF-8 with ',' and '\\r\\n' line endings.
+"""
+
+import csv
+import io
+import re
+from itertools import islice
+
+from compression import atomic_output, open_output_text
+from dialect import csv_reader, open_input_text
+from keyword_parser import NA_VALUES
+from metrics import file_size, stage
+from stream_converter import CHUNK_ROWS, data_rows, hashtag_column
+
+HASHTAG_COLUMN = 'asset_keywords'
+DEFAULT_COLUMN = 'ASSET_KEYWORDS'
+_NUMBERED = re.compile(r'(.+)_([0-9]+)$')
+
+def _group(header, positions, keywords_col):
+    # Keyword cells in keyword order: K (repeated in same_name mode), then K_2, K_3, ...
+    numbered = {}
+    for i, name in enumerate(header):
+        match = _NUMBERED.match(name)
+        if match and match.group(1) == keywords_col and int(match.group(2)) >= 2:
+            numbered.setdefault(int(match.group(2)), i)
+    keyword_indexes = positions.get(keywords_col, []) + [numbered[n] for n in sorted(numbered)]
+    overflow = positions.get(f'{keywords_col}_overflow', [None])[0]
+    hashtag_col = hashtag_column(keywords_col)
+    hashtag = positions[hashtag_col][0] if hashtag_col in positions else None
+    return {
+        'column': keywords_col,
+        'keyword_indexes': keyword_indexes,
+        'overflow': overflow,
+        'hashtag': hashtag,
+    }
+
+def detect_groups(header, keywords_cols=None):
+    """
+    Find the groups of keyword columns in a converted file's header
+
+    Args:
+        header (list): The header row as read (duplicate names kept)
+        keywords_cols (list): Names of the original keywords columns; detected
+            from the header when None
+
+    Returns:
+        list: One dict per group in header order: column, mode ('numbered',
+        'same_name' or 'hashtag_separate'), keyword_indexes (in keyword
+        order), overflow and hashtag (index or None)
+
+    Raises:
+        ValueError: If a named column has no keyword columns, or none are found
+    """
+    positions = {}
+    for i, name in enumerate(header):
+        positions.setdefault(name, []).append(i)
+
+    if keywords_cols is None:
+        keywords_cols = []
+        for name in positions:
+            if not name or name in keywords_cols:
+                continue
+            if (len(positions[name]) > 1 or f'{name}_2' in positions
+                    or f'{name}_overflow' in positions
+                    or hashtag_column(name) in positions):
+                keywords_cols.append(name)
+        # An overflow column whose keyword columns were all capped away (--cap 0)
+        for name in positions:
+            if name.endswith('_overflow') and name[:-len('_overflow')] and name[:-len('_overflow')] not in positions:
+                keywords_cols.append(name[:-len('_overflow')])
+        if not keywords_cols and (DEFAULT_COLUMN in positions or HASHTAG_COLUMN in positions):
+            keywords_cols = [DEFAULT_COLUMN]
+        if not keywords_cols:
+            raise ValueError("No keyword columns found; expected e.g. ASSET_KEYWORDS, ASSET_KEYWORDS_2, ... "
+                             f"or repeated ASSET_KEYWORDS columns\nAvailable columns: {header}")
+
+    groups = []
+    for keywords_col in keywords_cols:
+        group = _group(header, positions, keywords_col)
+        group['mode'] = 'same_name' if len(positions.get(keywords_col, [])) > 1 else 'numbered'
+        groups.append(group)
+    # A web conversion's single keywords column keeps its hashtags in 'asset_keywords'
+    unclaimed = [group for group in groups if group['hashtag'] is None]
+    claimed = {group['hashtag'] for group in groups} | {group['overflow'] for group in groups}
+    claimed.update(i for group in groups for i in group['keyword_indexes'])
+    if HASHTAG_COLUMN in positions and len(unclaimed) == 1 and positions[HASHTAG_COLUMN][0] not in claimed:
+        unclaimed[0]['hashtag'] = positions[HASHTAG_COLUMN][0]
+
+    for group in groups:
+        if group['hashtag'] is not None:
+            group['mode'] = 'hashtag_separate'
+        if not group['keyword_indexes'] and group['overflow'] is None and group['hashtag'] is None:
+            raise ValueError(f"Column {group['column']!r} not found in the CSV file\nAvailable columns: {header}")
+    used = [i for group in groups for i in _members(group)]
+    if len(set(used)) != len(used):
+        raise ValueError("A column belongs to more than one keyword column group")
+    return sorted(groups, key=lambda group: min(_members(group)))
+
+def _members(group):
+    extra = [i for i in (group['overflow'], group['hashtag']) if i is not None]
+    return group['keyword_indexes'] + extra
+
+def _runs(indexes):
+    # Consecutive indexes as (start, stop) slices, so rows are cut with slicing
+    runs = []
+    for i in indexes:
+        if runs and runs[-1][1] == i:
+            runs[-1][1] = i + 1
+        else:
+            runs.append([i, i + 1])
+    return [tuple(run) for run in runs]
+
+def reverse_layout(header, keywords_cols=None):
+    """
+    Describe the collapsed output of a converted file
+
+    Returns:
+        dict: width (input columns), header, segments and groups (from
+        detect_groups). Each segment is (start, stop, None) for a run of
+        columns copied as read, or (position, None, runs) for a group, runs
+        being the (start, stop) slices of its cells in keyword order
+    """
+    groups = detect_groups(header, keywords_cols)
+    starts = {min(_members(group)): group for group in groups}
+    members = {i for group in groups for i in _members(group)}
+    out_header = []
+    copied = []
+    segments = []
+    for i, name in enumerate(header):
+        if i in starts:
+            segments.extend((start, stop, None) for start, stop in _runs(copied))
+            copied = []
+            segments.append((i, None, _runs(_members(starts[i]))))
+            out_header.append(starts[i]['column'])
+        elif i not in members:
+            copied.append(i)
+            out_header.append(name)
+    segments.extend((start, stop, None) for start, stop in _runs(copied))
+    return {
+        'width': len(header),
+        'header': out_header,
+        'segments': segments,
+        'groups': groups,
+    }
+
+def collapse_rows(rows, layout):
+    """
+    Yield every row (as produced by data_rows) with each keyword column group
+    joined into one cell
+
+    Empty cells are skipped; blank ones are kept, as splitting the joined
+    value drops them again.
+    """
+    segments = layout['segments']
+    for row in rows:
+        cells = []
+        for start, stop, runs in segments:
+            if runs is None:
+                cells += row[start:stop]
+                continue
+            if len(runs) == 1:
+                keywords = row[runs[0][0]:runs[0][1]]
+            else:
+                keywords = [cell for run_start, run_stop in runs for cell in row[run_start:run_stop]]
+            value = '@@'.join(filter(None, keywords))
+            if value in NA_VALUES and value:
+                # A lone 'NA' or 'null' keyword would read back as a missing value
+                value += '@@'
+            cells.append(value)
+        yield cells
+
+def read_layout(csvfile, keywords_cols=None):
+    """
+    Read the header of an open converted CSV text stream and describe its collapsed output
+
+    Returns:
+        dict: As returned by reverse_layout
+
+    Raises:
+        ValueError: If the file is empty or no keyword columns are found
+    """
+    header = next(csv_reader(csvfile), None)
+    if not header:
+        raise ValueError('No columns to parse from file')
+    return reverse_layout(header, keywords_cols)
+
+def iter_collapsed(csvfile, layout, chunk_rows=CHUNK_ROWS, progress=None):
+    """
+    Collapse a seekable converted CSV text stream, yielding CSV text in chunks
+
+    Args:
+        csvfile: Text stream whose header read_layout has read
+        layout (dict): Layout from read_layout
+        chunk_rows (int): Rows per yielded chunk
+        progress (callable): Called with the number of rows collapsed so far
+            after every chunk
+
+    Yields:
+        str: The header, then blocks of up to chunk_rows collapsed rows
+    """
+    csvfile.seek(0)
+    reader = csv_reader(csvfile)
+    next(reader)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\r\n')
+    writer.writerow(layout['header'])
+    rows = collapse_rows(data_rows(reader, layout['width']), layout)
+    total_rows = 0
+    while True:
+        chunk = list(islice(rows, chunk_rows))
+        writer.writerows(chunk)
+        total_rows += len(chunk)
+        if buffer.tell():
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if progress is not None:
+            progress(total_rows)
+        if len(chunk) < chunk_rows:
+            break
+
+def reverse_convert(input_file, output_file, keywords_cols=None):
+    """
+    Collapse the keyword columns of a converted CSV back into @@ delimited columns
+
+    Args:
+        input_file (str): Path to a converted CSV file (any mode, style and cap)
+        output_file (str): Path to output CSV file
+        keywords_cols (list): Original keywords column names; detected from
+            the header when None
+
+    Returns:
+        tuple: (groups, total_rows) where groups maps each collapsed column to
+        the mode its layout was detected as
+
+    Raises:
+        ValueError: If no keyword columns are found
+    """
+    bytes_in = file_size(input_file)
+    total_rows = 0
+
+    def progress(rows_done):
+        nonlocal total_rows
+        total_rows = rows_done
+
+    with open_input_text(input_file) as csvfile, atomic_output(output_file) as path, open_output_text(path) as outfile:
+        with stage('layout'):
+            layout = read_layout(csvfile, keywords_cols)
+
+        with stage('write', bytes_in=bytes_in) as record:
+            for chunk in iter_collapsed(csvfile, layout, progress=progress):
+                outfile.write(chunk)
+            record['rows'] = total_rows
+    record['bytes_out'] = file_size(output_file)
+    return {group['column']: group['mode'] for group in layout['groups']}, total_rows
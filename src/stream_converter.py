@@ -0,0 +1,506 @@
+"""
+Streaming engine for the @@ delimited keyword conversions.
+
+The pandas converters read the whole export into a DataFrame and keep a list of
+keyword lists for every row, so memory grows with the size of the file. This
+module performs the same three conversions in two passes with constant memory:
+
+1. find the widest row (``max_keywords``) and the type pandas would infer
+   for every column (see column_types)
+2. stream rows from ``csv.reader`` to ``csv.writer``, expanding keywords on the
+   fly and writing the other fields the way pandas writes them
+
+Two output styles are supported so the result has the existing converters'
+layout byte for byte (header, keyword columns, padding, line endings):
+
+- ``'cli'``: ``keywords_converter.py`` (``ASSET_KEYWORDS`` column, empty first
+  header cell repeating the first field, ``Unnamed:`` columns dropped)
+- ``'web'``: ``web_app.py`` (first column with 'keyword' in its name)
+
+The output is identical to the pandas engine's: numbers and booleans are
+re-formatted as ``to_csv`` writes what ``read_csv`` parsed (``001`` becomes
+``1``, ``1.50`` becomes ``1.5``, ``true`` becomes ``True``, an integer column
+with empty cells is written as floats) and missing-value markers become empty
+cells. With ``passthrough=True`` no type is inferred and every other field
+reaches the output exactly as it was read, as the pandas engine then reads
+every column as text.
+
+Compressed inputs are decompressed as a stream and outputs named ``.gz``,
+``.zst`` or ``.zip`` are compressed as they are written (see compression).
+Inputs are decoded and parsed in the encoding and csv dialect sniffed from
+their first bytes (see dialect); the output is always UTF-8 and ','.
+
+Rows are rendered as strings rather than padded cell lists: a row with few
+keywords gets its padding as one slice of a precomputed run of commas, so a
+single asset with hundreds of keywords no longer makes every row build and
+write hundreds of empty cells. With ``cap=K`` only the first K keywords get
+their own column and the rest of a row's keywords are joined with '@@' into
+an overflow column.
+
+With a ``vocabulary`` the output is dictionary-encoded: keyword cells hold the
+keyword's id in the vocabulary, which the caller writes out separately (see
+vocabulary.write_vocabulary).
+
+With a ``normalizer`` (keyword_parser.KeywordNormalizer) both passes normalize
+and dedupe each row's keywords as they split it, so ``max_keywords`` and the
+output width count the normalized keywords.
+"""
+
+import csv
+import io
+import os
+from itertools import islice
+
+from column_types import ColumnTypes
+from compression import atomic_output, open_output_text
+from dialect import csv_reader, open_input_text
+from keyword_parser import NA_VALUES, ParsedKeywords, Vocabulary, partition_hashtags, split_keywords
+from metrics import file_size, stage
+
+MODES = ('numbered', 'same_name', 'hashtag_separate')
+STYLES = ('cli', 'web')
+# Rows per chunk yielded by iter_converted
+CHUNK_ROWS = 1000
+
+def pandas_column_names(header):
+    """Return the column names pandas.read_csv would give this header row"""
+    names = []
+    seen = set()
+    for i, name in enumerate(header):
+        if name == '':
+            name = f'Unnamed: {i}'
+        unique_name = name
+        suffix = 1
+        while unique_name in seen:
+            unique_name = f'{name}.{suffix}'
+            suffix += 1
+        seen.add(unique_name)
+        names.append(unique_name)
+    return names
+
+def find_keywords_column(columns, style='cli'):
+    """
+    Find the keywords column for the given output style
+
+    Raises:
+        ValueError: If no suitable column exists
+    """
+    if style == 'cli':
+        if 'ASSET_KEYWORDS' in columns:
+            return 'ASSET_KEYWORDS'
+        raise ValueError("'ASSET_KEYWORDS' column not found in the CSV file\n"
+                         f"Available columns: {list(columns)}")
+
+    for col in columns:
+        if 'keyword' in col.lower():
+            return col
+    raise ValueError("No keywords column found. Please ensure your CSV has a column containing 'keyword' in its name.")
+
+def hashtag_column(keywords_col):
+    """
+    Hashtag column of keywords_col when several columns are converted at once:
+    the name in lower case, or ``<name>_hashtags`` for a name that already is
+    """
+    name = keywords_col.lower()
+    return name if name != keywords_col else f'{keywords_col}_hashtags'
+
+def keyword_header(keywords_col, mode, width, overflow=False, hashtag_col='asset_keywords'):
+    """
+    Header cells for ``width`` keyword columns in the given mode, followed by
+    the overflow column of a capped conversion when ``overflow`` is set and
+    the hashtag column ``hashtag_col`` in hashtag mode
+    """
+    if mode == 'same_name':
+        header = [keywords_col] * width
+    else:
+        header = [keywords_col if i == 0 else f'{keywords_col}_{i+1}' for i in range(width)]
+    if overflow:
+        header.append(f'{keywords_col}_overflow')
+    if mode == 'hashtag_separate':
+        header.append(hashtag_col)
+    return header
+
+def check_mode(mode, style):
+    """Raise ValueError for an unknown conversion mode or output style"""
+    if mode not in MODES:
+        raise ValueError(f"Unknown conversion mode {mode!r}; expected one of {', '.join(MODES)}")
+    if style not in STYLES:
+        raise ValueError(f"Unknown output style {style!r}; expected one of {', '.join(STYLES)}")
+
+def data_rows(reader, width):
+    """
+    Yield data rows padded to the header width, skipping blank lines like pandas
+
+    pandas also skips a line of only spaces and tabs (unless quoted, which
+    csv.reader does not tell apart).
+    """
+    for row in reader:
+        if not row or (len(row) == 1 and not row[0].strip(' \t')):
+            continue
+        if len(row) > width:
+            raise ValueError(f"Error tokenizing data. Expected {width} fields in line {reader.line_num}, saw {len(row)}")
+        if len(row) < width:
+            row = row + [''] * (width - len(row))
+        yield row
+
+def read_columns(reader):
+    """Read the header row and return pandas-style column names"""
+    header = next(reader, None)
+    if not header:
+        raise ValueError('No columns to parse from file')
+    return pandas_column_names(header)
+
+def scan_rows(reader, width, kw_index, normalizer=None, types=None):
+    """
+    Collect keyword statistics for the data rows of reader without keeping tokens
+
+    Args:
+        types (ColumnTypes): Also record every row's values here
+
+    Returns:
+        ParsedKeywords: Statistics-only buffer (rows, max_keywords, max_regular, ...)
+    """
+    stats = ParsedKeywords(keep_tokens=False, normalizer=normalizer)
+    add = stats.add
+    if types is None:
+        for row in data_rows(reader, width):
+            add(row[kw_index])
+    else:
+        add_types = types.add
+        for row in data_rows(reader, width):
+            add(row[kw_index])
+            add_types(row)
+    return stats
+
+def reparse_keywords(rows, kw_index, formats, parsed, first_row=0):
+    """
+    Fill parsed with the keywords cells of rows as the pandas engine splits them
+
+    Only needed when formats rewrites the keywords column: pandas splits the
+    text it writes for the numbers and booleans it parsed there, and keeps
+    missing-value markers in a block it left as read.
+
+    Args:
+        rows: Data rows (as produced by data_rows)
+        parsed (ParsedKeywords): An empty buffer with ``na_values=()``
+        first_row (int): Position of the first row among the file's data rows
+    """
+    add = parsed.add
+    for cells in formats.apply(rows, '', kw_index, first_row):
+        add(cells[kw_index])
+    return parsed
+
+def _rows_again(csvfile, width):
+    # The data rows of a text stream already read once
+    csvfile.seek(0)
+    reader = csv_reader(csvfile)
+    next(reader)
+    return data_rows(reader, width)
+
+def scan_csv(csvfile, mode='numbered', style='cli', normalizer=None, passthrough=False, types=None):
+    """
+    First pass over an open text stream: find the widest row and the column types
+
+    Args:
+        types (ColumnTypes): Record the column types in this (empty)
+            ColumnTypes rather than a new one
+
+    Returns:
+        tuple: (columns, keywords_col, max_keywords, total_rows, formats)
+        where formats is the ColumnFormats for the second pass, or None with
+        passthrough
+    """
+    check_mode(mode, style)
+    reader = csv_reader(csvfile)
+    columns = read_columns(reader)
+    keywords_col = find_keywords_column(columns, style)
+    kw_index = columns.index(keywords_col)
+    if passthrough:
+        types = None
+    elif types is None:
+        types = ColumnTypes(len(columns))
+    stats = scan_rows(reader, len(columns), kw_index, normalizer, types)
+    formats = None if types is None else types.formats()
+    if formats is not None and formats.converts(kw_index):
+        stats = reparse_keywords(_rows_again(csvfile, len(columns)), kw_index, formats,
+                                 ParsedKeywords(keep_tokens=False, na_values=(), normalizer=normalizer))
+
+    max_keywords = stats.max_regular if mode == 'hashtag_separate' else stats.max_keywords
+    return columns, keywords_col, max_keywords, stats.rows, formats
+
+def parse_csv(csvfile, style='cli', normalizer=None, passthrough=False):
+    """
+    First pass that keeps the split keywords for reuse by iter_converted
+
+    Returns:
+        tuple: (columns, keywords_col, parsed, formats) where parsed is a
+        ParsedKeywords buffer in original keyword order, its tokens interned
+        in ``parsed.vocabulary``, and formats the ColumnFormats for the second
+        pass (None with passthrough)
+    """
+    if style not in STYLES:
+        raise ValueError(f"Unknown output style {style!r}; expected one of {', '.join(STYLES)}")
+    reader = csv_reader(csvfile)
+    columns = read_columns(reader)
+    keywords_col = find_keywords_column(columns, style)
+    kw_index = columns.index(keywords_col)
+    parsed = ParsedKeywords(vocabulary=Vocabulary(), normalizer=normalizer)
+    add = parsed.add
+    if passthrough:
+        for row in data_rows(reader, len(columns)):
+            add(row[kw_index])
+        return columns, keywords_col, parsed, None
+
+    types = ColumnTypes(len(columns))
+    add_types = types.add
+    for row in data_rows(reader, len(columns)):
+        add(row[kw_index])
+        add_types(row)
+    formats = types.formats()
+    if formats.converts(kw_index):
+        parsed = reparse_keywords(_rows_again(csvfile, len(columns)), kw_index, formats,
+                                  ParsedKeywords(na_values=(), vocabulary=Vocabulary(), normalizer=normalizer))
+    return columns, keywords_col, parsed, formats
+
+def scan_max_keywords(input_file, mode='numbered', style='cli'):
+    """
+    First pass over a file: read only the keywords column and find the widest row
+
+    Returns:
+        tuple: (columns, keywords_col, max_keywords, total_rows)
+    """
+    with open_input_text(input_file) as csvfile:
+        return scan_csv(csvfile, mode, style, passthrough=True)[:4]
+
+def output_layout(columns, keywords_col, mode, style, max_keywords, passthrough=False, cap=None, normalizer=None,
+                  formats=None):
+    """
+    Describe the output file for a conversion once max_keywords is known
+
+    With passthrough, fields outside the keywords column are written exactly
+    as read instead of turning missing-value markers into na_rep. Otherwise
+    formats (from the first pass) rewrites them the way pandas writes them;
+    without it only missing-value markers are replaced. With cap, at most cap
+    keyword columns are written plus an overflow column, and the layout's
+    max_keywords is the number of keyword columns actually written. The
+    normalizer the keywords were scanned with splits them again for writing.
+
+    Returns:
+        dict: Header, kept column indexes and writer settings used by write_rows
+    """
+    if cap is not None:
+        if cap < 0:
+            raise ValueError(f"The keyword cap must be 0 or more, got {cap}")
+        max_keywords = min(max_keywords, cap)
+    if style == 'cli':
+        keep = [i for i, col in enumerate(columns)
+                if col != keywords_col and not col.startswith('Unnamed:')]
+        header = [''] + [columns[i] for i in keep]
+        na_rep = ''
+        lineterminator = '\r\n'
+    else:
+        keep = [i for i, col in enumerate(columns) if col != keywords_col]
+        header = [columns[i] for i in keep]
+        # web same_name writes rows with csv.writer straight from iterrows (NaN
+        # becomes 'nan'); the other web modes go through DataFrame.to_csv
+        na_rep = 'nan' if mode == 'same_name' else ''
+        lineterminator = '\r\n' if mode == 'same_name' else os.linesep
+    header += keyword_header(keywords_col, mode, max_keywords, overflow=cap is not None)
+
+    return {
+        'mode': mode,
+        'style': style,
+        'width': len(columns),
+        'kw_index': columns.index(keywords_col),
+        'keep': keep,
+        'header': header,
+        'na_rep': na_rep,
+        'lineterminator': lineterminator,
+        'max_keywords': max_keywords,
+        'passthrough': passthrough,
+        'cap': cap,
+        'normalizer': normalizer,
+        'formats': None if passthrough else formats,
+    }
+
+def write_rows(rows, out, layout, keyword_lists=None, vocabulary=None, first_row=0):
+    """
+    Expand the keywords of every row (as produced by data_rows) and write it
+
+    Each row is rendered as one string, its padding taken from a precomputed
+    run of commas, and all rows go to out in a single write. Rows with a field
+    that needs quoting are rendered by csv.writer instead, so the output is
+    identical to writing padded cell lists with csv.writer.
+
+    Args:
+        rows: Padded data rows
+        out: Text stream for the output
+        layout (dict): Output layout from output_layout
+        keyword_lists: Optional iterator of already split keywords, one list
+            per row; the keywords column is split here when omitted
+        vocabulary (Vocabulary): Write every keyword as its id in this
+            vocabulary (dictionary-encoded output)
+        first_row (int): Position of the first row among the file's data rows,
+            where the layout's formats are applied to a part of a file
+
+    Returns:
+        int: Number of rows written
+    """
+    formats = layout['formats']
+    if formats is not None:
+        rows = formats.apply(rows, layout['na_rep'], layout['kw_index'], first_row)
+    keep = layout['keep']
+    kw_index = layout['kw_index']
+    na_rep = layout['na_rep']
+    max_keywords = layout['max_keywords']
+    cap = layout['cap']
+    first_column = layout['style'] == 'cli'
+    hashtag_separate = layout['mode'] == 'hashtag_separate'
+    # Formatted rows already hold na_rep for missing cells
+    copy_cells = layout['passthrough'] or formats is not None
+    na_values = () if formats is not None else NA_VALUES
+    terminator = layout['lineterminator']
+    normalizer = layout['normalizer']
+    commas = ',' * max_keywords
+
+    fallback = io.StringIO()
+    writer = csv.writer(fallback, lineterminator=terminator)
+    lines = []
+    total_rows = 0
+    for row in rows:
+        if copy_cells:
+            cells = [row[i] for i in keep]
+            if first_column:
+                first_col_value = row[0]
+                # A missing keywords cell is None in formatted rows
+                cells.insert(0, '' if first_col_value is None else first_col_value)
+        else:
+            cells = [na_rep if row[i] in NA_VALUES else row[i] for i in keep]
+            if first_column:
+                first_col_value = row[0]
+                cells.insert(0, '' if first_col_value in NA_VALUES else first_col_value)
+
+        if keyword_lists is None:
+            keywords = split_keywords(row[kw_index], na_values, normalizer)
+        else:
+            keywords = next(keyword_lists)
+        # Cells after the padding: the overflow column, then the hashtag column
+        trailing = []
+        if hashtag_separate:
+            keywords, hashtag_keywords = partition_hashtags(keywords)
+        if vocabulary is not None:
+            keywords = list(map(str, vocabulary.intern(keywords)))
+            if hashtag_separate:
+                hashtag_keywords = list(map(str, vocabulary.intern(hashtag_keywords)))
+        if cap is not None:
+            trailing.append('@@'.join(keywords[cap:]))
+            keywords = keywords[:cap]
+        if hashtag_separate:
+            trailing.append('@@'.join(hashtag_keywords))
+        cells += keywords
+        padding = max_keywords - len(keywords)
+
+        line = ','.join(cells) + commas[:padding]
+        if trailing:
+            line += ',' + ','.join(trailing)
+        cell_count = len(cells) + padding + len(trailing)
+        # A comma inside a field (or no cell before the padding) shows up as a
+        # wrong comma count; quotes and line breaks need csv quoting, and
+        # csv.writer writes a lone empty cell as '""'
+        if (line.count(',') == cell_count - 1 and '"' not in line and '\r' not in line
+                and '\n' not in line and (line or cell_count != 1)):
+            lines.append(line)
+            lines.append(terminator)
+        else:
+            writer.writerow(cells + [''] * padding + trailing)
+            lines.append(fallback.getvalue())
+            fallback.seek(0)
+            fallback.truncate()
+        total_rows += 1
+    out.write(''.join(lines))
+    return total_rows
+
+def stream_convert(input_file, output_file, mode='numbered', style='cli', progress=None, passthrough=False,
+                   cap=None, vocabulary=None, normalizer=None, types=None):
+    """
+    Convert an @@ delimited keywords CSV without loading it into memory
+
+    Args:
+        input_file (str): Path to input CSV file
+        output_file (str): Path to output CSV file
+        mode (str): One of 'numbered', 'same_name' or 'hashtag_separate'
+        style (str): 'cli' to match keywords_converter.py, 'web' to match web_app.py
+        progress (callable): Called as progress(rows_written, total_rows)
+            after every CHUNK_ROWS rows of the second pass
+        passthrough (bool): Copy fields outside the keywords column verbatim,
+            missing-value markers included
+        cap (int): Write at most cap keyword columns and join the remaining
+            keywords of a row with '@@' into an overflow column
+        vocabulary (Vocabulary): Write keyword ids instead of keywords, numbering
+            and counting the keywords in this (empty) vocabulary
+        normalizer (KeywordNormalizer): Normalize and dedupe each row's keywords
+        types (ColumnTypes): Record the column types in this (empty)
+            ColumnTypes, for a caller that keeps them
+
+    Returns:
+        tuple: (max_keywords, total_rows); for 'hashtag_separate' max_keywords
+        counts regular keywords only
+
+    Raises:
+        ValueError: If the keywords column cannot be found
+    """
+    bytes_in = file_size(input_file)
+    with open_input_text(input_file) as csvfile, atomic_output(output_file) as path, open_output_text(path) as outfile:
+        with stage('split', bytes_in=bytes_in) as record:
+            columns, keywords_col, max_keywords, total_rows, formats = scan_csv(csvfile, mode, style, normalizer,
+                                                                                passthrough, types)
+            record['rows'] = total_rows
+        with stage('layout'):
+            layout = output_layout(columns, keywords_col, mode, style, max_keywords, passthrough, cap, normalizer,
+                                   formats)
+
+        with stage('write', rows=total_rows, bytes_in=bytes_in) as record:
+            # Each chunk holds CHUNK_ROWS rows (the first also carries the header)
+            chunks = iter_converted(csvfile, layout, vocabulary=vocabulary)
+            for chunk_number, chunk in enumerate(chunks, 1):
+                outfile.write(chunk)
+                if progress is not None:
+                    progress(min(chunk_number * CHUNK_ROWS, total_rows), total_rows)
+    record['bytes_out'] = file_size(output_file)
+
+    return max_keywords, total_rows
+
+def iter_converted(csvfile, layout, parsed=None, chunk_rows=CHUNK_ROWS, vocabulary=None):
+    """
+    Second pass over a seekable text stream, yielding converted CSV text in chunks
+
+    Args:
+        csvfile: Text stream already scanned with scan_csv or parse_csv
+        layout (dict): Output layout from output_layout
+        parsed (ParsedKeywords): Keywords already split by parse_csv, so the
+            keywords column is not split again
+        chunk_rows (int): Rows per yielded chunk
+        vocabulary (Vocabulary): Write keyword ids from this vocabulary instead
+            of keywords
+
+    Yields:
+        str: The header, then blocks of up to chunk_rows converted rows
+    """
+    csvfile.seek(0)
+    reader = csv_reader(csvfile)
+    next(reader)
+
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator=layout['lineterminator']).writerow(layout['header'])
+    rows = data_rows(reader, layout['width'])
+    keyword_lists = None if parsed is None else map(parsed.keywords, range(len(parsed)))
+    first_row = 0
+    while True:
+        written = write_rows(islice(rows, chunk_rows), buffer, layout, keyword_lists, vocabulary, first_row)
+        first_row += written
+        if buffer.tell():
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if written < chunk_rows:
+            break
@@ -0,0 +1,200 @@
+"""
+Vectorized pandas engine for the @@ delimited keyword conversions.
+
+Instead of looping with ``iterrows`` and calling ``pd.isna`` cell by cell, the
+keywords column is split into one flat stacked Series indexed by row
+position, scattered into a padded keyword matrix with numpy indexing and
+written with one ``DataFrame.to_csv`` call; hashtag and overflow columns are
+joined from contiguous slices of the stacked tokens. The whole column is
+joined into one string and split with a single ``str.split``, the way
+keyword_parser splits one cell, and every distinct keyword is stored once
+(``pd.factorize``), so the stacked tokens share one string per keyword.
+Output is identical to writing the DataFrame row by row with ``csv.writer``
+for both output styles. This is what the converters' default ``'pandas'``
+engine runs.
+
+With a ``normalizer`` (keyword_parser.KeywordNormalizer) each cell is
+normalized and deduped as it is split, before the hashtags are separated,
+like the other engines do.
+
+``read_export`` is the engine's DataFrame reader; with ``passthrough=True`` every column is read as plain text, without dtype
+inference or missing-value detection. The delimiter, quote character and
+encoding sniffed from the start of the file (see dialect) are handed to
+``pd.read_csv``, so semicolon or cp1252 exports parse on the first attempt.
+"""
+
+import csv
+import os
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+
+from compression import atomic_output, detect_codec, open_input, open_output_text
+from dialect import input_dialect
+from keyword_parser import NA_VALUES, split_keywords
+from metrics import file_size, stage
+from stream_converter import find_keywords_column, keyword_header, check_mode
+
+# Separators of the joined keywords column: the end of a token, and a row
+# boundary (a token of its own). Neither is whitespace, so strip keeps them
+_TOKEN_END = '\x01'
+_ROW_END = '\x02'
+
+def read_export(input_file, passthrough=False):
+    """
+    Read an export into a DataFrame
+
+    With passthrough every cell stays the string it was in the file (IDs keep
+    their leading zeros, 'NA' stays 'NA'); keyword cells are still treated as
+    missing by the keyword parser when they hold a missing-value marker.
+    Compressed exports are decompressed as they are read, and exports in
+    another dialect are read with the sniffed delimiter and encoding.
+    """
+    options = {'dtype': str, 'keep_default_na': False} if passthrough else {}
+    dialect = input_dialect(input_file)
+    if not dialect.is_default:
+        options.update(sep=dialect.delimiter, quotechar=dialect.quotechar, encoding=dialect.encoding)
+    if detect_codec(input_file) is None:
+        return pd.read_csv(input_file, **options)
+    with open_input(input_file) as f:
+        return pd.read_csv(f, **options)
+
+def _split_stacked(keywords, normalizer=None):
+    """
+    Split a keywords Series into one stacked Series of non-empty tokens
+
+    The result is indexed by row position and keeps each row's token order,
+    and equal tokens are one string object. Missing cells were masked before,
+    so nothing is treated as missing here.
+    """
+    present = (keywords.notna() & (keywords != '')).to_numpy()
+    positions = np.flatnonzero(present)
+    texts = keywords[present].astype(str).tolist()
+    joined = _ROW_END.join(texts)
+    if normalizer is None and _TOKEN_END not in joined and joined.count(_ROW_END) == len(texts) - 1:
+        # '@@' never spans a row boundary, so replacing it left to right
+        # splits every row as str.split would
+        text = joined.replace('@@', _TOKEN_END).replace(_ROW_END, _TOKEN_END + _ROW_END + _TOKEN_END)
+        split = text.split(_TOKEN_END)
+        tokens = np.array(list(map(str.strip, split)), dtype=object)
+        boundary = tokens == _ROW_END
+        rows = positions[np.cumsum(boundary)] if len(positions) else np.zeros(len(tokens), dtype=np.int64)
+        keep = ~boundary & (tokens != '')
+        tokens, rows = tokens[keep], rows[keep]
+    else:
+        # Rows normalized one by one, or holding the separators
+        split = [split_keywords(text, (), normalizer) for text in texts]
+        lengths = np.fromiter(map(len, split), dtype=np.int64, count=len(split))
+        rows = np.repeat(positions, lengths)
+        tokens = np.array(list(chain.from_iterable(split)), dtype=object)
+    codes, words = pd.factorize(tokens)
+    return pd.Series(words[codes], index=rows, dtype=object)
+
+def _keyword_matrix(tokens, n_rows):
+    """Scatter stacked tokens into a rows x max_keywords object matrix padded with ''"""
+    rows = tokens.index.to_numpy()
+    if len(rows) == 0:
+        return np.empty((n_rows, 0), dtype=object)
+    positions = tokens.groupby(level=0, sort=False).cumcount().to_numpy()
+    matrix = np.full((n_rows, positions.max() + 1), '', dtype=object)
+    matrix[rows, positions] = tokens.to_numpy()
+    return matrix
+
+def _join_rows(tokens, n_rows):
+    """
+    Join each row's stacked tokens with '@@' into an n_rows object array padded with ''
+
+    Tokens of a row are contiguous in a stacked Series, so the row boundaries
+    are found with numpy and each row is one slice join, instead of a
+    per-group Python aggregation in pandas.
+    """
+    column = np.full(n_rows, '', dtype=object)
+    if len(tokens) == 0:
+        return column
+    rows = tokens.index.to_numpy()
+    values = tokens.tolist()
+    starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+    ends = np.r_[starts[1:], len(rows)].tolist()
+    column[rows[starts]] = ['@@'.join(values[start:end]) for start, end in zip(starts.tolist(), ends)]
+    return column
+
+def vectorized_convert(input_file, output_file, mode='numbered', style='cli', passthrough=False, cap=None,
+                       normalizer=None):
+    """
+    Convert an @@ delimited keywords CSV with column-at-a-time pandas operations
+
+    Args:
+        input_file (str): Path to input CSV file
+        output_file (str): Path to output CSV file
+        mode (str): One of 'numbered', 'same_name' or 'hashtag_separate'
+        style (str): 'cli' to match keywords_converter.py, 'web' to match web_app.py
+        passthrough (bool): Copy fields outside the keywords column verbatim
+        cap (int): Write at most cap keyword columns and join the remaining
+            keywords of a row with '@@' into an overflow column
+        normalizer (KeywordNormalizer): Normalize and dedupe each row's keywords
+
+    Returns:
+        tuple: (max_keywords, total_rows); for 'hashtag_separate' max_keywords
+        counts regular keywords only
+
+    Raises:
+        ValueError: If the keywords column cannot be found
+    """
+    check_mode(mode, style)
+    if cap is not None and cap < 0:
+        raise ValueError(f"The keyword cap must be 0 or more, got {cap}")
+    with stage('read', bytes_in=file_size(input_file)) as record:
+        df = read_export(input_file, passthrough)
+        record['rows'] = len(df)
+    keywords_col = find_keywords_column(df.columns, style)
+    df = df.reset_index(drop=True)
+
+    with stage('split', rows=len(df)):
+        keywords = df[keywords_col]
+        if passthrough:
+            keywords = keywords.mask(keywords.isin(NA_VALUES))
+        tokens = _split_stacked(keywords, normalizer)
+        if mode == 'hashtag_separate':
+            is_hashtag = tokens.str.startswith('#').to_numpy(dtype=bool)
+            hashtag_column = _join_rows(tokens[is_hashtag], len(df))
+            tokens = tokens[~is_hashtag]
+        matrix = _keyword_matrix(tokens, len(df))
+        max_keywords = matrix.shape[1]
+        if cap is not None:
+            positions = tokens.groupby(level=0, sort=False).cumcount().to_numpy()
+            overflow_column = _join_rows(tokens[positions >= cap], len(df))
+            matrix = matrix[:, :cap]
+
+    with stage('layout'):
+        if style == 'cli':
+            kept = [col for col in df.columns if col != keywords_col and not col.startswith('Unnamed:')]
+            header = [''] + kept
+            out = df[kept]
+            out.insert(0, '', df.iloc[:, 0] if len(df.columns) > 0 else '', allow_duplicates=True)
+            na_rep = ''
+            lineterminator = '\r\n'
+        else:
+            kept = [col for col in df.columns if col != keywords_col]
+            header = kept
+            out = df[kept]
+            na_rep = 'nan' if mode == 'same_name' else ''
+            lineterminator = '\r\n' if mode == 'same_name' else os.linesep
+        header = header + keyword_header(keywords_col, mode, matrix.shape[1], overflow=cap is not None)
+
+        # Positional column labels so repeated names (same_name mode) are harmless
+        extra = [overflow_column] if cap is not None else []
+        if mode == 'hashtag_separate':
+            extra.append(hashtag_column)
+        width = out.shape[1] + matrix.shape[1]
+        blocks = [out.set_axis(range(out.shape[1]), axis=1),
+                  pd.DataFrame(matrix, columns=range(out.shape[1], width))]
+        blocks += [pd.DataFrame({width + i: column}) for i, column in enumerate(extra)]
+        out = pd.concat(blocks, axis=1)
+
+    with stage('write', rows=len(df)) as record, atomic_output(output_file) as path, open_output_text(path) as csvfile:
+        csv.writer(csvfile, lineterminator=lineterminator).writerow(header)
+        out.to_csv(csvfile, header=False, index=False, na_rep=na_rep, lineterminator=lineterminator)
+    record['bytes_out'] = file_size(output_file)
+
+    return max_keywords, len(df)
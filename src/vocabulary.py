@@ -0,0 +1,95 @@
+"""
+Keyword frequency tables and vocabulary files.
+
+Exports repeat a small vocabulary across millions of assets. A ParsedKeywords
+buffer given a ``keyword_parser.Vocabulary`` keeps one integer id per keyword
+occurrence instead of a separate string object, and the vocabulary counts
+every occurrence on the way, so frequency tables (top keywords, hashtag vs
+regular counts) come out of the same split pass.
+
+``stream_convert(..., vocabulary=...)`` uses the ids for dictionary-encoded
+output: keyword cells hold ids instead of keywords, and the vocabulary is
+written next to the output with ``write_vocabulary``.
+"""
+
+import csv
+import os
+
+from compression import open_output_text, split_suffix
+from dialect import csv_reader, open_input_text
+from keyword_parser import ParsedKeywords, Vocabulary
+from stream_converter import data_rows, find_keywords_column, read_columns
+
+# Keywords listed per table by frequency_report
+TOP_N = 10
+
+def frequency_report(vocabulary, top_n=TOP_N):
+    """
+    Summarise a vocabulary
+
+    Returns:
+        dict: keyword_count, hashtag_count, regular_count, distinct,
+        distinct_hashtags, distinct_regular, top_regular and top_hashtags
+        (lists of (keyword, count))
+    """
+    hashtag_count = 0
+    distinct_hashtags = 0
+    for word, count in zip(vocabulary.words, vocabulary.counts):
+        if word[0] == '#':
+            hashtag_count += count
+            distinct_hashtags += 1
+    keyword_count = sum(vocabulary.counts)
+    return {
+        'keyword_count': keyword_count,
+        'hashtag_count': hashtag_count,
+        'regular_count': keyword_count - hashtag_count,
+        'distinct': len(vocabulary),
+        'distinct_hashtags': distinct_hashtags,
+        'distinct_regular': len(vocabulary) - distinct_hashtags,
+        'top_regular': vocabulary.most_common(top_n, hashtags=False),
+        'top_hashtags': vocabulary.most_common(top_n, hashtags=True),
+    }
+
+def scan_vocabulary(input_file, style='cli'):
+    """
+    Count every keyword of an export without keeping its rows
+
+    Returns:
+        tuple: (vocabulary, total_rows)
+
+    Raises:
+        ValueError: If the keywords column cannot be found
+    """
+    vocabulary = Vocabulary()
+    stats = ParsedKeywords(keep_tokens=False, vocabulary=vocabulary)
+    with open_input_text(input_file) as csvfile:
+        reader = csv_reader(csvfile)
+        columns = read_columns(reader)
+        kw_index = columns.index(find_keywords_column(columns, style))
+        add = stats.add
+        for row in data_rows(reader, len(columns)):
+            add(row[kw_index])
+    return vocabulary, stats.rows
+
+def vocabulary_path(output_file):
+    """Vocabulary file written next to a dictionary-encoded output, e.g. out_vocabulary.csv for out.csv.gz"""
+    return os.path.splitext(split_suffix(output_file)[0])[0] + '_vocabulary.csv'
+
+def write_frequencies(vocabulary, output_file):
+    """Write a frequency table as CSV: keyword, count, hashtag (1 or 0), most frequent first"""
+    with open_output_text(output_file) as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['keyword', 'count', 'hashtag'])
+        for word, count in vocabulary.most_common():
+            writer.writerow([word, count, int(word[0] == '#')])
+
+def write_vocabulary(vocabulary, output_file):
+    """
+    Write a vocabulary as CSV: id, keyword, count, hashtag (1 or 0), in id
+    order, so the ids of a dictionary-encoded output can be decoded
+    """
+    with open_output_text(output_file) as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['id', 'keyword', 'count', 'hashtag'])
+        for word_id, (word, count) in enumerate(zip(vocabulary.words, vocabulary.counts)):
+            writer.writerow([word_id, word, count, int(word[0] == '#')])
@@ -1,187 +1,340 @@
-from flask import Flask, request, send_file, render_template, flash, redirect, url_for
-import pandas as pd
-import csv
+from flask import (Flask, Response, current_app, request, send_file, render_template, flash, redirect, url_for,
+                   jsonify)
+import hashlib
 import os
+import secrets
+import shutil
 from werkzeug.utils import secure_filename
 import tempfile
+import time
 from datetime import datetime
 
-app = Flask(__name__)
-app.secret_key = 'your-secret-key-here'  # Change this to a random secret key
+from columnar_output import EXTENSIONS, MIMETYPES, check_format, columnar_convert
+from compression import CODECS, SUFFIXES, compress_chunks, detect_codec, open_input, split_suffix
+from dialect import csv_reader, open_input_text
+from jobs import JobManager, QueueFullError
+from keyword_columns import convert_columns
+from keyword_parser import KeywordNormalizer
+from metrics import CONTENT_TYPE, Registry, profiling
+from parallel_converter import parallel_convert
+from result_cache import ResultCache
+from reverse_converter import iter_collapsed, read_layout
+from stream_converter import (MODES, find_keywords_column, iter_converted, output_layout, parse_csv,
+                              read_columns, stream_convert)
+from vectorized_converter import vectorized_convert
+
+ENGINES = {
+    'stream': stream_convert,
+    'vectorized': vectorized_convert,
+}
+
+def _convert_with_engine(input_file, output_file, mode, engine, workers=None, passthrough=False,
+                         output_format='csv', long_table=False, cap=None, normalize=False):
+    """
+    Run a conversion through one of the alternative ENGINES, in several
+    processes, or to a columnar output_format (which ignores engine and workers)
+
+    The 'pandas' engine is the vectorized engine (see vectorized_converter).
+    Normalized conversions run on the stream engine unless the engine is
+    pandas-based and workers is unset.
+    """
+    check_format(output_format, mode)
+    normalizer = KeywordNormalizer() if normalize else None
+    if output_format != 'csv':
+        if cap is not None:
+            raise ValueError("The keyword cap applies to CSV output; use long_table for a compact columnar file")
+        return columnar_convert(input_file, output_file, mode, 'web', output_format, long_table, passthrough,
+                                normalizer)
+    if normalize and (engine not in ('pandas', 'vectorized') or (workers or 1) > 1):
+        return stream_convert(input_file, output_file, mode, style='web', passthrough=passthrough, cap=cap,
+                              normalizer=normalizer)
+    if workers and workers > 1:
+        return parallel_convert(input_file, output_file, mode, style='web', workers=workers, passthrough=passthrough,
+                                cap=cap)
+    if engine == 'pandas':
+        engine = 'vectorized'
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine!r}; expected 'pandas' or one of {', '.join(ENGINES)}")
+    options = {'normalizer': normalizer} if normalizer is not None else {}
+    return ENGINES[engine](input_file, output_file, mode, style='web', passthrough=passthrough, cap=cap, **options)
 
 # Configuration
-UPLOAD_FOLDER = 'uploads'
-DOWNLOAD_FOLDER = 'downloads'
 ALLOWED_EXTENSIONS = {'csv'}
+# Download mimetype of each output compression
+COMPRESSED_MIMETYPES = {'gzip': 'application/gzip', 'zstd': 'application/zstd', 'zip': 'application/zip'}
+# Streamed uploads stay in memory up to this size before spilling to a temp file
+SPOOL_MAX_BYTES = 16 * 1024 * 1024
+COPY_CHUNK_BYTES = 64 * 1024
+# Converted results and parsed keywords, keyed by upload content (LRU beyond the size budget)
+CACHE_FOLDER = 'cache'
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+# Background jobs (delivery=job): folder, concurrent conversions, queue limit, result lifetime
+JOB_FOLDER = 'jobs'
+JOB_WORKERS = 2
+MAX_PENDING_JOBS = 20
+JOB_TTL_SECONDS = 3600
+# Where each server process saves its metrics, so /metrics adds up all processes
+METRICS_FOLDER = 'metrics'
+# Largest request body accepted, matching the documented 10MB upload limit
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+# Largest size a compressed upload may decompress to
+MAX_DECOMPRESSED_BYTES = 512 * 1024 * 1024
+
+# Defaults for create_app; every key can be overridden with a KEYWORDS_ prefixed
+# environment variable (KEYWORDS_JOB_WORKERS=4, KEYWORDS_MAX_CONTENT_LENGTH=104857600)
+DEFAULT_CONFIG = {
+    # Signs the session cookie that carries flash messages; must be the same in
+    # every server process. A random key is generated (with a warning) if unset
+    'SECRET_KEY': None,
+    'MAX_CONTENT_LENGTH': MAX_UPLOAD_BYTES,
+    'MAX_DECOMPRESSED_BYTES': MAX_DECOMPRESSED_BYTES,
+    # Parent of the temporary folder each delivery=file request works in, and
+    # where large streamed uploads spill; None uses the system temp directory
+    'WORK_FOLDER': None,
+    'CACHE_FOLDER': CACHE_FOLDER,
+    'CACHE_MAX_BYTES': CACHE_MAX_BYTES,
+    'JOB_FOLDER': JOB_FOLDER,
+    'JOB_WORKERS': JOB_WORKERS,
+    'MAX_PENDING_JOBS': MAX_PENDING_JOBS,
+    'JOB_TTL_SECONDS': JOB_TTL_SECONDS,
+    'METRICS_FOLDER': METRICS_FOLDER,
+    # Server processes and request timeout used by wsgi.py
+    'WEB_WORKERS': os.cpu_count() or 1,
+    'WEB_TIMEOUT': 300,
+}
+
+# Prometheus metrics served at /metrics, summed over the processes sharing
+# METRICS_FOLDER (create_app sets the folder)
+metrics = Registry()
+conversion_seconds = metrics.histogram('keywords_conversion_seconds', 'Time taken to convert an upload',
+                                       ('conversion_type', 'delivery'))
+conversions_total = metrics.counter('keywords_conversions_total', 'Conversions by outcome',
+                                    ('conversion_type', 'delivery', 'status'))
+rows_total = metrics.counter('keywords_rows_converted_total', 'Data rows converted', ('conversion_type',))
+stage_seconds = metrics.histogram('keywords_stage_seconds', 'Time spent in each conversion stage',
+                                  ('conversion_type', 'stage'))
+
+def observe_conversion(mode, delivery, seconds, status='success', rows=0, stages=None):
+    """
+    Record one finished conversion in the metrics
 
-# Create directories if they don't exist
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-os.makedirs(DOWNLOAD_FOLDER, exist_ok=True)
+    Args:
+        mode (str): Conversion mode, the conversion_type label
+        delivery (str): 'stream', 'file' or 'job'
+        seconds (float): Wall time of the conversion
+        status (str): 'success', 'cached' or 'error'
+        rows (int): Data rows converted
+        stages (dict): Seconds per stage name (Profile.totals())
+    """
+    conversions_total.inc(conversion_type=mode, delivery=delivery, status=status)
+    if status != 'error':
+        conversion_seconds.observe(seconds, conversion_type=mode, delivery=delivery)
+        rows_total.inc(rows, conversion_type=mode)
+        for name, stage_time in (stages or {}).items():
+            stage_seconds.observe(stage_time, conversion_type=mode, stage=name)
+    try:
+        metrics.save()
+    except OSError:
+        # The values are still counted here and saved with the next conversion
+        pass
+
+def _observe_job(job):
+    status = 'success' if job['status'] == 'done' else 'error'
+    observe_conversion(job['mode'], 'job', job['finished'] - job['created'], status, job['total_rows'] or 0,
+                       job['stages'])
 
 def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    # Compressed exports (.csv.gz, .csv.zst, or a .zip holding the CSV) are
+    # accepted too; size limits apply to the uploaded, compressed bytes
+    name, codec = split_suffix(filename.lower())
+    if codec == 'zip':
+        return True
+    return '.' in name and name.rsplit('.', 1)[1] in ALLOWED_EXTENSIONS
 
-def convert_keywords_format_same_name(input_file, output_file):
+def convert_keywords_format_same_name(input_file, output_file, engine='pandas', workers=None, passthrough=False,
+                                      cap=None, normalize=False):
     """Convert CSV from @@ delimited keywords to multiple ASSET_KEYWORDS columns"""
-    
-    # Read the CSV file
-    df = pd.read_csv(input_file)
-    
-    # Find the keywords column (case insensitive)
-    keywords_col = None
-    for col in df.columns:
-        if 'keyword' in col.lower():
-            keywords_col = col
-            break
-    
-    if keywords_col is None:
-        raise ValueError("No keywords column found. Please ensure your CSV has a column containing 'keyword' in its name.")
-    
-    # Split keywords by @@ delimiter
-    keyword_lists = []
-    max_keywords = 0
-    
-    for keywords_str in df[keywords_col]:
-        if pd.isna(keywords_str) or keywords_str == '':
-            keywords = []
-        else:
-            keywords = [kw.strip() for kw in str(keywords_str).split('@@') if kw.strip()]
-        
-        keyword_lists.append(keywords)
-        max_keywords = max(max_keywords, len(keywords))
-    
-    # Get columns without the original keywords column
-    other_columns = [col for col in df.columns if col != keywords_col]
-    
-    # Create header row with repeated keywords columns
-    header = other_columns + [keywords_col] * max_keywords
-    
-    # Write CSV manually to allow duplicate column names
-    with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow(header)
-        
-        for index, row in df.iterrows():
-            row_data = [row[col] for col in other_columns]
-            keywords = keyword_lists[index]
-            
-            for i in range(max_keywords):
-                if i < len(keywords):
-                    row_data.append(keywords[i])
-                else:
-                    row_data.append('')
-            
-            writer.writerow(row_data)
-    
-    return max_keywords, len(df)
+    return _convert_with_engine(input_file, output_file, 'same_name', engine, workers, passthrough, cap=cap,
+                                normalize=normalize)
 
-def convert_keywords_format_numbered(input_file, output_file):
-    """Convert CSV from @@ delimited keywords to numbered keyword columns"""
-    
-    # Read the CSV file
-    df = pd.read_csv(input_file)
-    
-    # Find the keywords column (case insensitive)
-    keywords_col = None
-    for col in df.columns:
-        if 'keyword' in col.lower():
-            keywords_col = col
-            break
-    
-    if keywords_col is None:
-        raise ValueError("No keywords column found. Please ensure your CSV has a column containing 'keyword' in its name.")
-    
-    # Split keywords by @@ delimiter
-    keyword_lists = []
-    max_keywords = 0
-    
-    for keywords_str in df[keywords_col]:
-        if pd.isna(keywords_str) or keywords_str == '':
-            keywords = []
-        else:
-            keywords = [kw.strip() for kw in str(keywords_str).split('@@') if kw.strip()]
-        
-        keyword_lists.append(keywords)
-        max_keywords = max(max_keywords, len(keywords))
-    
-    # Create new dataframe without original keywords column
-    new_df = df.drop(keywords_col, axis=1).copy()
-    
-    # Add numbered keyword columns
-    for i in range(max_keywords):
-        if i == 0:
-            col_name = keywords_col
-        else:
-            col_name = f'{keywords_col}_{i+1}'
-        
-        new_df[col_name] = [kw_list[i] if i < len(kw_list) else '' for kw_list in keyword_lists]
-    
-    new_df.to_csv(output_file, index=False)
-    return max_keywords, len(df)
+def convert_keywords_format_numbered(input_file, output_file, engine='pandas', workers=None, passthrough=False,
+                                     output_format='csv', long_table=False, cap=None, normalize=False):
+    """Convert CSV from @@ delimited keywords to numbered keyword columns (or Parquet/Arrow)"""
+    return _convert_with_engine(input_file, output_file, 'numbered', engine, workers, passthrough,
+                                output_format, long_table, cap, normalize)
 
-def convert_keywords_format_hashtag_separate(input_file, output_file):
-    """Convert CSV from @@ delimited keywords with hashtag separation"""
-    
-    # Read the CSV file
-    df = pd.read_csv(input_file)
-    
-    # Find the keywords column (case insensitive)
-    keywords_col = None
-    for col in df.columns:
-        if 'keyword' in col.lower():
-            keywords_col = col
-            break
-    
-    if keywords_col is None:
-        raise ValueError("No keywords column found. Please ensure your CSV has a column containing 'keyword' in its name.")
-    
-    # Split keywords by @@ delimiter and separate hashtag vs regular keywords
-    regular_keyword_lists = []
-    hashtag_keyword_lists = []
-    max_regular_keywords = 0
-    
-    for keywords_str in df[keywords_col]:
-        if pd.isna(keywords_str) or keywords_str == '':
-            all_keywords = []
-        else:
-            all_keywords = [kw.strip() for kw in str(keywords_str).split('@@') if kw.strip()]
-        
-        regular_keywords = []
-        hashtag_keywords = []
-        
-        for kw in all_keywords:
-            if kw.startswith('#'):
-                hashtag_keywords.append(kw)
-            else:
-                regular_keywords.append(kw)
-        
-        regular_keyword_lists.append(regular_keywords)
-        hashtag_keyword_lists.append(hashtag_keywords)
-        max_regular_keywords = max(max_regular_keywords, len(regular_keywords))
-    
-    # Create new dataframe without original keywords column
-    new_df = df.drop(keywords_col, axis=1).copy()
-    
-    # Add numbered regular keyword columns
-    for i in range(max_regular_keywords):
-        if i == 0:
-            col_name = keywords_col
-        else:
-            col_name = f'{keywords_col}_{i+1}'
-        
-        new_df[col_name] = [kw_list[i] if i < len(kw_list) else '' for kw_list in regular_keyword_lists]
-    
-    # Add final asset_keywords column for hashtag keywords
-    new_df['asset_keywords'] = ['@@'.join(hashtag_list) if hashtag_list else '' for hashtag_list in hashtag_keyword_lists]
-    
-    new_df.to_csv(output_file, index=False)
-    return max_regular_keywords + 1, len(df)
+def convert_keywords_format_hashtag_separate(input_file, output_file, engine='pandas', workers=None, passthrough=False,
+                                             output_format='csv', long_table=False, cap=None, normalize=False):
+    """Convert CSV from @@ delimited keywords with hashtag separation (or to Parquet/Arrow)"""
+    max_regular_keywords, total_rows = _convert_with_engine(input_file, output_file, 'hashtag_separate', engine, workers,
+                                                            passthrough, output_format, long_table, cap, normalize)
+    return max_regular_keywords + 1, total_rows
 
-@app.route('/')
 def index():
     return render_template('index.html')
 
-@app.route('/upload', methods=['POST'])
+def _spool_upload(stream):
+    """Copy an upload stream in chunks into a spooled buffer, returning (spool, sha256 hex digest)"""
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES, dir=current_app.config['WORK_FOLDER'])
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(COPY_CHUNK_BYTES), b''):
+        digest.update(chunk)
+        spool.write(chunk)
+    spool.seek(0)
+    return spool, digest.hexdigest()
+
+def _check_decompressed_size(stream):
+    """
+    Read a compressed upload stream to its end and rewind it
+
+    Raises:
+        DecompressedSizeError: If it decompresses to more than MAX_DECOMPRESSED_BYTES
+    """
+    if detect_codec(stream) is None:
+        return
+    reader = open_input(stream, current_app.config['MAX_DECOMPRESSED_BYTES'])
+    try:
+        while reader.read(COPY_CHUNK_BYTES):
+            pass
+    finally:
+        reader.close()
+        stream.seek(0)
+
+def _flash_success(mode, max_keywords, total_rows):
+    created_columns = max_keywords + 1 if mode == 'hashtag_separate' else max_keywords
+    flash(f'Conversion successful! Created {created_columns} keyword columns from {total_rows} rows.')
+
+def _file_chunks(f):
+    with f:
+        yield from iter(lambda: f.read(COPY_CHUNK_BYTES), b'')
+
+def stream_upload(file, conversion_type, download_name, passthrough=False, compression=None, cap=None,
+                  normalize=False):
+    """
+    Convert an uploaded file straight from its request stream
+
+    The request stream is copied in chunks into a spooled buffer (kept in
+    memory up to SPOOL_MAX_BYTES, since Flask closes request files before a
+    streamed body is sent) while its SHA-256 is computed. A result cached for
+    the same content, mode and keywords column is sent as is. Otherwise the
+    keywords column is parsed and the column types recorded (or both taken
+    from the parsed-keywords cache), and converted rows are yielded in chunks
+    as the response body while being written to the cache. Nothing else is
+    written to disk. The other columns are written as the pandas engine
+    writes them, or with passthrough copied exactly as uploaded.
+
+    Compressed uploads are decompressed as they are parsed, and rejected once
+    they decompress to more than MAX_DECOMPRESSED_BYTES. With compression
+    ('gzip' or 'zstd') the response body is compressed chunk by chunk; the
+    cache keeps the uncompressed result. With cap, at most cap keyword columns
+    are written plus an overflow column. With normalize, keywords are
+    normalized and deduped per row as they are parsed (cached separately).
+
+    Raises:
+        ValueError: If no keywords column is found
+    """
+    # Unknown conversion types fall back to numbered, like the file path below
+    mode = conversion_type if conversion_type in MODES else 'numbered'
+    result_cache = current_app.extensions['result_cache']
+    started = time.perf_counter()
+    spool, content_hash = _spool_upload(file.stream)
+    csvfile = open_input_text(spool, current_app.config['MAX_DECOMPRESSED_BYTES'])
+    try:
+        columns = read_columns(csv_reader(csvfile))
+        keywords_col = find_keywords_column(columns, 'web')
+
+        options = {'style': 'web', 'passthrough': passthrough}
+        if cap is not None:
+            options['cap'] = cap
+        if normalize:
+            options['normalize'] = True
+        result_key = ResultCache.result_key(content_hash, mode, keywords_col, options)
+        cached = result_cache.get_result(result_key)
+        if cached is not None:
+            try:
+                # Opened right away, so another process evicting the entry
+                # cannot remove it from under the response
+                cached_file = open(cached[0], 'rb')
+            except OSError:
+                cached = None
+        if cached is not None:
+            csvfile.close()
+            spool.close()
+            metadata = cached[1]
+            observe_conversion(mode, 'stream', time.perf_counter() - started, 'cached', metadata['total_rows'])
+            _flash_success(mode, metadata['max_keywords'], metadata['total_rows'])
+            if compression:
+                return _download_response(compress_chunks(_file_chunks(cached_file), compression),
+                                          COMPRESSED_MIMETYPES[compression], download_name)
+            return send_file(cached_file, mimetype='text/csv', as_attachment=True, download_name=download_name)
+
+        parsed_key = ResultCache.parsed_key(content_hash, keywords_col, normalize, passthrough)
+        cached_parse = result_cache.get_parsed(parsed_key)
+        split_started = time.perf_counter()
+        if cached_parse is None:
+            csvfile.seek(0)
+            columns, keywords_col, parsed, formats = parse_csv(csvfile, 'web',
+                                                               KeywordNormalizer() if normalize else None,
+                                                               passthrough)
+            result_cache.put_parsed(parsed_key, (parsed, formats))
+        else:
+            parsed, formats = cached_parse
+    except Exception:
+        csvfile.close()
+        spool.close()
+        observe_conversion(mode, 'stream', time.perf_counter() - started, 'error')
+        raise
+
+    stages = {'read': split_started - started, 'split': time.perf_counter() - split_started}
+    layout_started = time.perf_counter()
+    max_keywords = parsed.max_regular if mode == 'hashtag_separate' else parsed.max_keywords
+    layout = output_layout(columns, keywords_col, mode, 'web', max_keywords, passthrough, cap, formats=formats)
+    metadata = {'max_keywords': max_keywords, 'total_rows': len(parsed)}
+    stages['layout'] = time.perf_counter() - layout_started
+
+    def generate():
+        # The response body is written while the client downloads it, so the
+        # conversion is only observed once the last chunk has been produced
+        write_started = time.perf_counter()
+        try:
+            with spool, csvfile, result_cache.result_writer(result_key, metadata) as cache_file:
+                for chunk in iter_converted(csvfile, layout, parsed):
+                    data = chunk.encode('utf-8')
+                    cache_file.write(data)
+                    yield data
+        except Exception:
+            observe_conversion(mode, 'stream', time.perf_counter() - started, 'error')
+            raise
+        stages['write'] = time.perf_counter() - write_started
+        observe_conversion(mode, 'stream', time.perf_counter() - started, rows=len(parsed), stages=stages)
+
+    _flash_success(mode, max_keywords, len(parsed))
+    if compression:
+        return _download_response(compress_chunks(generate(), compression),
+                                  COMPRESSED_MIMETYPES[compression], download_name)
+    return _download_response(generate(), 'text/csv', download_name)
+
+def _download_response(body, mimetype, download_name):
+    """Streamed attachment response for a generator of body chunks"""
+    response = Response(body, mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{download_name}"'
+    return response
+
+def submit_job(file, conversion_type, download_name, passthrough=False, compression=None, cap=None,
+               normalize=False):
+    """Queue a background conversion and return its job ID as JSON (202)"""
+    mode = conversion_type if conversion_type in MODES else 'numbered'
+    try:
+        job_id = current_app.extensions['job_manager'].submit(file, mode, download_name, passthrough, compression,
+                                                              cap, normalize)
+    except QueueFullError as e:
+        return jsonify({'error': str(e)}), 503
+    return jsonify({
+        'job_id': job_id,
+        'status_url': url_for('job_status', job_id=job_id),
+        'download_url': url_for('job_download', job_id=job_id),
+    }), 202
+
 def upload_file():
     if 'file' not in request.files:
         flash('No file selected')
@@ -189,6 +342,26 @@ def upload_file():
     
     file = request.files['file']
     conversion_type = request.form.get('conversion_type', 'same_name')
+    # 'stream' (default) converts from the request stream, 'job' queues a
+    # background conversion, 'file' saves, converts and sends in a temporary
+    # folder; all three write the pandas engine's output
+    delivery = request.form.get('delivery', 'stream')
+    # Copy the non-keyword columns exactly as uploaded (no type or NA conversion)
+    passthrough = request.form.get('passthrough', '').lower() in ('1', 'true', 'on', 'yes')
+    # 'csv' (default), 'parquet', 'arrow' or 'feather'; columnar formats always
+    # use the file delivery, optionally as a long (asset id, position, keyword) table
+    output_format = request.form.get('output_format', 'csv').lower()
+    long_table = request.form.get('long_table', '').lower() in ('1', 'true', 'on', 'yes')
+    # 'gzip', 'zstd' or 'zip' compresses the converted CSV as it is written;
+    # zip archives are built on disk, so they use the file delivery
+    compression = request.form.get('compression', '').lower() or None
+    # Keep at most this many keyword columns, the rest go to an overflow column
+    cap = request.form.get('cap', '').strip()
+    # NFC-normalize keywords and drop case/'#' variants repeated within a row
+    normalize = request.form.get('normalize', '').lower() in ('1', 'true', 'on', 'yes')
+    # Columns to expand instead of the first 'keyword' column: names (several
+    # are converted in one pass), 'auto' or 'all' (see keyword_columns.py)
+    keywords_columns = [name for name in request.form.getlist('keywords_column') if name.strip()]
     
     if file.filename == '':
         flash('No file selected')
@@ -196,30 +369,84 @@ def upload_file():
     
     if file and allowed_file(file.filename):
         try:
-            # Save uploaded file
+            cap = int(cap) if cap else None
             filename = secure_filename(file.filename)
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            input_path = os.path.join(UPLOAD_FOLDER, f"{timestamp}_{filename}")
-            file.save(input_path)
-            
-            # Generate output filename
-            name, ext = os.path.splitext(filename)
+            name, ext = os.path.splitext(split_suffix(filename)[0])
+            ext = ext or '.csv'
+            if output_format != 'csv':
+                check_format(output_format, conversion_type)
+                if compression:
+                    raise ValueError("Parquet/Arrow outputs are compressed internally; leave compression empty")
+                ext = EXTENSIONS[output_format]
+                delivery = 'file'
+            if compression:
+                if compression not in CODECS:
+                    raise ValueError(f"Unknown compression {compression!r}; expected one of {', '.join(CODECS)}")
+                ext += SUFFIXES[compression]
+                if compression == 'zip' and delivery == 'stream':
+                    delivery = 'file'
+            if keywords_columns:
+                if output_format != 'csv':
+                    raise ValueError("keywords_column applies to CSV output")
+                delivery = 'file'
             output_filename = f"{name}_converted_{timestamp}{ext}"
-            output_path = os.path.join(DOWNLOAD_FOLDER, output_filename)
             
-            # Convert file
-            if conversion_type == 'same_name':
-                max_keywords, total_rows = convert_keywords_format_same_name(input_path, output_path)
-            elif conversion_type == 'hashtag_separate':
-                max_keywords, total_rows = convert_keywords_format_hashtag_separate(input_path, output_path)
-            else:
-                max_keywords, total_rows = convert_keywords_format_numbered(input_path, output_path)
+            if delivery == 'stream':
+                return stream_upload(file, conversion_type, output_filename, passthrough, compression, cap,
+                                     normalize)
+            # The other deliveries convert a saved copy, so its size is checked first
+            _check_decompressed_size(file.stream)
+            if delivery == 'job':
+                return submit_job(file, conversion_type, output_filename, passthrough, compression, cap,
+                                  normalize)
             
-            # Clean up input file
-            os.remove(input_path)
-            
-            flash(f'Conversion successful! Created {max_keywords} keyword columns from {total_rows} rows.')
-            return send_file(output_path, as_attachment=True, download_name=output_filename)
+            # Save, convert and send in a folder of this request's own, so
+            # concurrent requests (in any number of processes) never share paths
+            mode = conversion_type if conversion_type in MODES else 'numbered'
+            options = {'output_format': output_format, 'long_table': long_table} if output_format != 'csv' else {}
+            if cap is not None:
+                options['cap'] = cap
+            if normalize:
+                options['normalize'] = True
+            started = time.perf_counter()
+            workdir = tempfile.mkdtemp(prefix='convert-', dir=current_app.config['WORK_FOLDER'])
+            try:
+                input_path = os.path.join(workdir, f"input_{filename}")
+                file.save(input_path)
+                output_path = os.path.join(workdir, output_filename)
+                
+                # Convert file
+                with profiling() as profile:
+                    if keywords_columns:
+                        widths, total_rows = convert_columns(input_path, output_path, keywords_columns, mode,
+                                                             'web', passthrough, cap,
+                                                             KeywordNormalizer() if normalize else None)
+                        max_keywords = max(widths.values())
+                    elif conversion_type == 'same_name':
+                        max_keywords, total_rows = convert_keywords_format_same_name(
+                            input_path, output_path, passthrough=passthrough, cap=cap, normalize=normalize)
+                    elif conversion_type == 'hashtag_separate':
+                        max_keywords, total_rows = convert_keywords_format_hashtag_separate(
+                            input_path, output_path, passthrough=passthrough, **options)
+                    else:
+                        max_keywords, total_rows = convert_keywords_format_numbered(
+                            input_path, output_path, passthrough=passthrough, **options)
+                
+                flash(f'Conversion successful! Created {max_keywords} keyword columns from {total_rows} rows.')
+                mimetype = (COMPRESSED_MIMETYPES[compression] if compression
+                            else MIMETYPES.get(output_format, 'text/csv'))
+                response = send_file(output_path, mimetype=mimetype, as_attachment=True,
+                                     download_name=output_filename)
+            except Exception:
+                shutil.rmtree(workdir, ignore_errors=True)
+                observe_conversion(mode, 'file', time.perf_counter() - started, 'error')
+                raise
+            observe_conversion(mode, 'file', time.perf_counter() - started, rows=total_rows, stages=profile.totals())
+            # send_file already holds the output open, so removing the folder
+            # here does not cut the download short
+            shutil.rmtree(workdir, ignore_errors=True)
+            return response
             
         except Exception as e:
             flash(f'Error processing file: {str(e)}')
@@ -228,9 +455,137 @@ def upload_file():
     flash('Invalid file type. Please upload a CSV file.')
     return redirect(url_for('index'))
 
-@app.route('/help')
+def reverse_upload():
+    """
+    Collapse the keyword columns of an uploaded converted file back into @@
+    delimited columns, streaming the result (see reverse_converter.py)
+
+    The layout is detected from the header; ``keywords_column`` fields name
+    the original columns instead. Post ``compression=gzip`` or ``zstd`` for a
+    compressed download.
+    """
+    file = request.files.get('file')
+    if file is None or file.filename == '':
+        flash('No file selected')
+        return redirect(url_for('index'))
+    if not allowed_file(file.filename):
+        flash('Invalid file type. Please upload a CSV file.')
+        return redirect(url_for('index'))
+    keywords_columns = [name for name in request.form.getlist('keywords_column') if name.strip()] or None
+    compression = request.form.get('compression', '').lower() or None
+
+    started = time.perf_counter()
+    spool, _ = _spool_upload(file.stream)
+    csvfile = open_input_text(spool, current_app.config['MAX_DECOMPRESSED_BYTES'])
+    try:
+        if compression and compression not in ('gzip', 'zstd'):
+            raise ValueError("Collapsed files can be compressed with gzip or zstd")
+        layout = read_layout(csvfile, keywords_columns)
+    except Exception as e:
+        csvfile.close()
+        spool.close()
+        observe_conversion('reverse', 'stream', time.perf_counter() - started, 'error')
+        flash(f'Error processing file: {str(e)}')
+        return redirect(url_for('index'))
+
+    name = os.path.splitext(split_suffix(secure_filename(file.filename))[0])[0]
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    download_name = f"{name}_delimited_{timestamp}.csv" + (SUFFIXES[compression] if compression else '')
+
+    def generate():
+        rows_done = 0
+
+        def progress(rows):
+            nonlocal rows_done
+            rows_done = rows
+
+        try:
+            with spool, csvfile:
+                for chunk in iter_collapsed(csvfile, layout, progress=progress):
+                    yield chunk.encode('utf-8')
+        except Exception:
+            observe_conversion('reverse', 'stream', time.perf_counter() - started, 'error')
+            raise
+        observe_conversion('reverse', 'stream', time.perf_counter() - started, rows=rows_done)
+
+    if compression:
+        return _download_response(compress_chunks(generate(), compression), COMPRESSED_MIMETYPES[compression],
+                                  download_name)
+    return _download_response(generate(), 'text/csv', download_name)
+
+def job_status(job_id):
+    job = current_app.extensions['job_manager'].get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    total_rows = job['total_rows']
+    job['progress'] = job['rows_done'] / total_rows if total_rows else (1.0 if job['status'] == 'done' else 0.0)
+    return jsonify(job)
+
+def job_download(job_id):
+    job_manager = current_app.extensions['job_manager']
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    if job['status'] != 'done':
+        return jsonify({'error': f"Job is {job['status']}", 'status': job['status']}), 409
+    codec = split_suffix(job['download_name'])[1]
+    return send_file(os.path.abspath(job_manager.output_path(job_id)), as_attachment=True,
+                     mimetype=COMPRESSED_MIMETYPES.get(codec, 'text/csv'), download_name=job['download_name'])
+
+def metrics_endpoint():
+    """Conversion counters and latency histograms in the Prometheus text format"""
+    return Response(metrics.render(), content_type=CONTENT_TYPE)
+
 def help_page():
     return render_template('help.html')
 
+def request_too_large(error):
+    """Uploads over MAX_CONTENT_LENGTH are refused before they are read"""
+    limit_mb = current_app.config['MAX_CONTENT_LENGTH'] / (1024 * 1024)
+    flash(f'File too large: uploads are limited to {limit_mb:g}MB.')
+    return redirect(url_for('index'))
+
+def create_app(config=None):
+    """
+    Build the web app
+
+    The configuration is DEFAULT_CONFIG, then KEYWORDS_ prefixed environment
+    variables, then config. Each app gets its own job manager and result cache
+    (``app.extensions['job_manager']`` and ``['result_cache']``); apps in
+    several processes can share their folders. Nothing else is written to
+    disk outside the per-request temporary folders.
+
+    Args:
+        config (dict): Configuration overriding the defaults and the environment
+
+    Returns:
+        Flask: The configured app
+    """
+    app = Flask(__name__)
+    app.config.from_mapping(DEFAULT_CONFIG)
+    app.config.from_prefixed_env('KEYWORDS')
+    app.config.from_mapping(config or {})
+    if not app.config['SECRET_KEY']:
+        app.config['SECRET_KEY'] = secrets.token_hex(32)
+        app.logger.warning('KEYWORDS_SECRET_KEY is not set; using a random key, so flash messages '
+                           'only work with a single server process')
+
+    app.extensions['job_manager'] = JobManager(app.config['JOB_FOLDER'], app.config['JOB_WORKERS'],
+                                               app.config['MAX_PENDING_JOBS'], app.config['JOB_TTL_SECONDS'],
+                                               on_finish=_observe_job)
+    app.extensions['result_cache'] = ResultCache(app.config['CACHE_FOLDER'], app.config['CACHE_MAX_BYTES'])
+    metrics.folder = app.config['METRICS_FOLDER']
+
+    app.add_url_rule('/', 'index', index)
+    app.add_url_rule('/upload', 'upload_file', upload_file, methods=['POST'])
+    app.add_url_rule('/reverse', 'reverse_upload', reverse_upload, methods=['POST'])
+    app.add_url_rule('/jobs/<job_id>', 'job_status', job_status)
+    app.add_url_rule('/jobs/<job_id>/download', 'job_download', job_download)
+    app.add_url_rule('/metrics', 'metrics_endpoint', metrics_endpoint)
+    app.add_url_rule('/help', 'help_page', help_page)
+    app.register_error_handler(413, request_too_large)
+    return app
+
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    # Development server; debug mode with KEYWORDS_DEBUG=true. See wsgi.py for production
+    create_app().run()
\ No newline at end of file
@@ -0,0 +1,88 @@
+"""
+Production entry point for the web app.
+
+Importing this module builds no app: each server process calls the
+``wsgi:create_app`` factory once it has started (the background job threads
+of an app built before a fork would not survive it), e.g. from the src folder
+
+    gunicorn --chdir src --workers 4 --timeout 300 'wsgi:create_app()'
+    waitress-serve --call wsgi:create_app
+
+or run this file to serve with gunicorn (several processes, Linux/macOS) or,
+where gunicorn is not installed, waitress (one process with worker threads):
+
+    python src/wsgi.py [--host 0.0.0.0] [--port 8000] [--workers 4]
+
+The app is configured from KEYWORDS_ prefixed environment variables (see
+DEFAULT_CONFIG in web_app). KEYWORDS_SECRET_KEY must be set so that every
+process signs flash messages with the same key. Processes share the cache and
+job folders, while each request works in a temporary folder of its own.
+"""
+
+import argparse
+import os
+import sys
+
+from flask import Config
+
+from web_app import DEFAULT_CONFIG, create_app
+
+def settings():
+    """DEFAULT_CONFIG with its KEYWORDS_ environment overrides, read without building the app"""
+    config = Config('')
+    config.from_mapping(DEFAULT_CONFIG)
+    config.from_prefixed_env('KEYWORDS')
+    return config
+
+def serve(host, port, workers, timeout):
+    """
+    Serve the app with gunicorn, or waitress if gunicorn is not installed
+
+    Returns:
+        bool: False if neither server is installed
+    """
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        BaseApplication = None
+
+    if BaseApplication is not None:
+        class Server(BaseApplication):
+            def load_config(self):
+                self.cfg.set('bind', f'{host}:{port}')
+                self.cfg.set('workers', workers)
+                self.cfg.set('timeout', timeout)
+
+            def load(self):
+                # Each worker process builds its own app (job threads do not survive a fork)
+                return create_app()
+
+        Server().run()
+        return True
+
+    try:
+        import waitress
+    except ImportError:
+        return False
+    waitress.serve(create_app(), host=host, port=port, threads=workers, channel_timeout=timeout)
+    return True
+
+def main(argv=None):
+    config = settings()
+    parser = argparse.ArgumentParser(description='Serve the keywords converter web app')
+    parser.add_argument('--host', default='127.0.0.1', help='Interface to listen on')
+    parser.add_argument('--port', type=int, default=8000, help='Port to listen on')
+    parser.add_argument('--workers', type=int, default=config['WEB_WORKERS'],
+                        help='Server processes (gunicorn) or threads (waitress)')
+    args = parser.parse_args(argv)
+
+    if 'KEYWORDS_SECRET_KEY' not in os.environ:
+        print("Error: set KEYWORDS_SECRET_KEY to the same random value for every server process")
+        return 1
+    if not serve(args.host, args.port, args.workers, config['WEB_TIMEOUT']):
+        print("Error: production serving requires gunicorn or waitress (pip install gunicorn)")
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,41 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import pytest
+
+import keywords_converter
+import web_app
+
+# The pandas converters every other engine is checked against
+CONVERTERS = {
+    ('cli', 'numbered'): keywords_converter.convert_keywords_format_numbered,
+    ('cli', 'same_name'): keywords_converter.convert_keywords_format_same_name,
+    ('cli', 'hashtag_separate'): keywords_converter.convert_keywords_format_hashtag_separate,
+    ('web', 'numbered'): web_app.convert_keywords_format_numbered,
+    ('web', 'same_name'): web_app.convert_keywords_format_same_name,
+    ('web', 'hashtag_separate'): web_app.convert_keywords_format_hashtag_separate,
+}
+
+@pytest.fixture
+def pandas_output(tmp_path):
+    """pandas_output(export, style, mode, cap=None): bytes the pandas engine writes for export"""
+    def convert(export, style, mode, cap=None):
+        output = tmp_path / f'pandas_{style}_{mode}.csv'
+        CONVERTERS[style, mode](str(export), str(output), cap=cap)
+        return output.read_bytes()
+    return convert
+
+@pytest.fixture
+def client(tmp_path):
+    """Test client of a web app keeping its cache, jobs, metrics and uploads under tmp_path"""
+    app = web_app.create_app({
+        'SECRET_KEY': 'test',
+        'TESTING': True,
+        'WORK_FOLDER': str(tmp_path),
+        'CACHE_FOLDER': str(tmp_path / 'cache'),
+        'JOB_FOLDER': str(tmp_path / 'jobs'),
+        'METRICS_FOLDER': str(tmp_path / 'metrics'),
+    })
+    return app.test_client()
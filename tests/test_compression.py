@@ -0,0 +1,91 @@
+"""
+atomic_output: a conversion that fails part way leaves no output file behind
+(nor replaces an earlier one), so the batch CLI's up-to-date check never
+mistakes an empty or partial file for a finished conversion.
+
+max_bytes: a compressed input that decompresses past the limit is stopped
+while it is read, in every pass and in the web app's deliveries.
+"""
+
+import gzip
+import io
+import os
+
+import pytest
+
+from compression import DecompressedSizeError, atomic_output, open_input, open_output_text
+from keyword_columns import convert_columns
+from reverse_converter import reverse_convert
+from stream_converter import stream_convert
+
+# The third row has one field too many, which the first pass only finds after
+# the output would have been opened
+MALFORMED = 'ID,ASSET_KEYWORDS,Title\n1,a@@b,First\n2,c,Second,extra\n'
+
+def test_atomic_output_replaces_only_on_success(tmp_path):
+    output = tmp_path / 'out.csv.gz'
+    with atomic_output(str(output)) as path, open_output_text(path) as f:
+        f.write('a,b\r\n')
+    assert gzip.decompress(output.read_bytes()) == b'a,b\r\n'
+    # The gzip header names the output, not the temporary file
+    assert b'out.csv\x00' in output.read_bytes()[:32]
+
+    with pytest.raises(RuntimeError):
+        with atomic_output(str(output)) as path, open_output_text(path) as f:
+            f.write('partial')
+            raise RuntimeError
+    assert gzip.decompress(output.read_bytes()) == b'a,b\r\n'
+    assert os.listdir(tmp_path) == ['out.csv.gz']
+
+@pytest.mark.parametrize('convert', [
+    lambda source, target: stream_convert(source, target),
+    lambda source, target: convert_columns(source, target, ['ASSET_KEYWORDS']),
+    lambda source, target: reverse_convert(source, target),
+], ids=['stream', 'keyword_columns', 'reverse'])
+def test_failed_conversion_leaves_no_output(tmp_path, convert):
+    export = tmp_path / 'export.csv'
+    export.write_text(MALFORMED, encoding='utf-8')
+    output = tmp_path / 'converted.csv'
+
+    with pytest.raises(ValueError):
+        convert(str(export), str(output))
+    assert sorted(os.listdir(tmp_path)) == ['export.csv']
+
+def _bomb(rows=20000):
+    # About 2MB of CSV in a few KB of gzip
+    header = 'ID,ASSET_KEYWORDS,Title\n'
+    return gzip.compress((header + ('2,c@@d,' + 'y' * 100 + '\n') * rows).encode('utf-8'))
+
+def test_open_input_stops_past_max_bytes():
+    data = _bomb()
+    size = len(gzip.decompress(data))
+    with open_input(io.BytesIO(data), max_bytes=size) as f:
+        assert len(f.read()) == size
+        f.seek(0)
+        assert len(f.read()) == size
+
+    source = io.BytesIO(data)
+    with pytest.raises(DecompressedSizeError):
+        with open_input(source, max_bytes=size - 1) as f:
+            while f.read(4096):
+                pass
+    # The caller's file object stays open
+    assert not source.closed
+
+@pytest.mark.parametrize('delivery', ['stream', 'file', 'job'])
+def test_web_app_rejects_large_decompressed_uploads(client, delivery):
+    def upload():
+        return client.post('/upload', data={'delivery': delivery, 'conversion_type': 'numbered',
+                                             'file': (io.BytesIO(_bomb()), 'export.csv.gz')},
+                           content_type='multipart/form-data')
+
+    client.application.config['MAX_DECOMPRESSED_BYTES'] = 64 * 1024
+    response = upload()
+    assert response.status_code == 302
+    with client.session_transaction() as session:
+        assert 'decompresses to more than 65536 bytes' in str(session['_flashes'])
+
+    client.application.config['MAX_DECOMPRESSED_BYTES'] = 4 * 1024 * 1024
+    response = upload()
+    assert response.status_code == (202 if delivery == 'job' else 200)
+    response.close()
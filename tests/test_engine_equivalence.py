@@ -0,0 +1,181 @@
+"""
+Every engine writes what the pandas engine writes: the same keyword columns
+and the other columns formatted the way ``DataFrame.to_csv`` writes the
+values ``read_csv`` parsed (numbers, booleans, missing values), byte for
+byte, for every mode and style, with and without a cap.
+"""
+
+import io
+import time
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from column_types import pandas_chunk_rows
+from incremental import incremental_convert
+from jobs import JobManager
+from keyword_columns import convert_columns
+from parallel_converter import parallel_convert
+from stream_converter import stream_convert
+
+EXPORTS = {
+    # Leading zeros, floats, booleans and missing values in typed columns,
+    # integers beyond int64 and uint64, and lines pandas skips
+    'typed': (
+        'ID,ASSET_KEYWORDS,Title,Score,Flag,Count,Big\n'
+        '001,research@@methodology@@#psychology@@#science,Psychology Research Study,1.50,true,3,'
+        '99999999999999999999\n'
+        '2,data@@analysis@@#statistics@@machine learning,"Data, Analysis Report",1e3,FALSE,,1\n'
+        '\n'
+        '3,NA,Missing Keywords,NA,True,4,-5\n'
+        '   \n'
+        '4,null,Null Keywords,,NA,5,18446744073709551615\n'
+        '5,,Empty Keywords,-0.25,false,6,\n'
+        '6,coding@@NA@@programming@@null@@#technology,Software Development,7,TRUE,NA,7\n'
+    ),
+    # Numbers and booleans in the keywords column are split as pandas writes them
+    'numeric_keywords': (
+        'ID,ASSET_KEYWORDS,Title\n'
+        '1,12,First\n'
+        '2,1.50,Second\n'
+        '3,NA,Third\n'
+        '4,007,Fourth\n'
+    ),
+}
+
+def _write_export(tmp_path, name):
+    export = tmp_path / f'{name}.csv'
+    export.write_text(EXPORTS[name], encoding='utf-8', newline='')
+    return export
+
+def _stream(export, output, style, mode, cap):
+    stream_convert(str(export), str(output), mode, style, cap=cap)
+    return output.read_bytes()
+
+def _parallel(export, output, style, mode, cap):
+    parallel_convert(str(export), str(output), mode, style, workers=2, cap=cap)
+    return output.read_bytes()
+
+def _incremental(export, output, style, mode, cap):
+    # Convert the first rows, then append the rest to the same input
+    text = export.read_text(encoding='utf-8')
+    lines = text.splitlines(keepends=True)
+    half = len(lines) // 2
+    grown = export.with_name('grown.csv')
+    grown.write_text(''.join(lines[:half]), encoding='utf-8', newline='')
+    incremental_convert(str(grown), str(output), mode, style, cap=cap)
+    with open(grown, 'a', encoding='utf-8', newline='') as f:
+        f.write(''.join(lines[half:]))
+    incremental_convert(str(grown), str(output), mode, style, cap=cap)
+    return output.read_bytes()
+
+def _keyword_columns(export, output, style, mode, cap):
+    convert_columns(str(export), str(output), ['ASSET_KEYWORDS'], mode, style, cap=cap)
+    return output.read_bytes()
+
+def _jobs(export, output, style, mode, cap):
+    if style != 'web':
+        pytest.skip('Jobs convert in the web style')
+    manager = JobManager(str(output.with_name('jobs')), max_workers=1)
+    upload = FileStorage(io.BytesIO(export.read_bytes()), filename='export.csv')
+    job_id = manager.submit(upload, mode, 'converted.csv', cap=cap)
+    deadline = time.monotonic() + 30
+    while manager.get(job_id)['status'] in ('queued', 'running'):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert manager.get(job_id)['status'] == 'done'
+    with open(manager.output_path(job_id), 'rb') as f:
+        return f.read()
+
+ENGINES = {
+    'stream': _stream,
+    'parallel': _parallel,
+    'incremental': _incremental,
+    'keyword_columns': _keyword_columns,
+    'jobs': _jobs,
+}
+
+@pytest.mark.parametrize('export_name', sorted(EXPORTS))
+@pytest.mark.parametrize('cap', [None, 2])
+@pytest.mark.parametrize('style, mode', [(style, mode) for style in ('cli', 'web')
+                                         for mode in ('numbered', 'same_name', 'hashtag_separate')])
+@pytest.mark.parametrize('engine', sorted(ENGINES))
+def test_engine_matches_pandas(tmp_path, pandas_output, engine, style, mode, cap, export_name):
+    export = _write_export(tmp_path, export_name)
+    converted = ENGINES[engine](export, tmp_path / 'converted.csv', style, mode, cap)
+    assert converted == pandas_output(export, style, mode, cap)
+
+@pytest.mark.parametrize('cap', [None, 2])
+@pytest.mark.parametrize('mode', ['numbered', 'same_name', 'hashtag_separate'])
+@pytest.mark.parametrize('export_name', sorted(EXPORTS))
+def test_web_stream_matches_pandas(tmp_path, client, pandas_output, export_name, mode, cap):
+    export = _write_export(tmp_path, export_name)
+    expected = pandas_output(export, 'web', mode, cap)
+    form = {'conversion_type': mode, 'delivery': 'stream', 'cap': '' if cap is None else str(cap)}
+
+    # The second upload is served from the result cache; the one without a
+    # cap after it reuses the cached keywords and column types
+    for options in (form, form, dict(form, cap='')):
+        response = client.post('/upload', data=dict(options, file=(io.BytesIO(export.read_bytes()), 'export.csv')),
+                               content_type='multipart/form-data')
+        assert response.status_code == 200
+        if options['cap'] == form['cap']:
+            assert response.data == expected
+        else:
+            assert response.data == pandas_output(export, 'web', mode)
+
+@pytest.mark.parametrize('mode', ['numbered', 'hashtag_separate'])
+@pytest.mark.parametrize('export_name', sorted(EXPORTS))
+def test_columnar_matches_pandas(tmp_path, pandas_output, export_name, mode):
+    pq = pytest.importorskip('pyarrow.parquet')
+    from columnar_output import columnar_convert
+
+    export = _write_export(tmp_path, export_name)
+    output = tmp_path / 'converted.parquet'
+    columnar_convert(str(export), str(output), mode, 'cli', 'parquet')
+    table = pq.read_table(str(output))
+    columns = [[str(value) if value is not None else '' for value in column.to_pylist()]
+               for column in table.columns]
+    rows = [','.join(cells) for cells in zip(*columns)]
+
+    # Compare with the CSV text of rows that need no quoting
+    expected = pandas_output(export, 'cli', mode).decode('utf-8').splitlines()
+    assert table.column_names == expected[0].split(',')
+    assert [row for row in rows if '"' not in row and row.count(',') == len(columns) - 1] == \
+           [line for line in expected[1:] if '"' not in line]
+
+@pytest.mark.filterwarnings('ignore:Columns .* have mixed types', 'ignore:DataFrame is highly fragmented')
+def test_types_follow_pandas_blocks(tmp_path, pandas_output):
+    # pandas infers the types of a wide file block by block: a block of
+    # integers stays integers (written without '.0') even when a later
+    # block of the same column holds text
+    width = 8200
+    block = pandas_chunk_rows(width)
+    assert block < 100
+    header = ['ID', 'ASSET_KEYWORDS', 'Mixed', 'Wide'] + [f'C{i}' for i in range(width - 4)]
+    rows = []
+    for row in range(block * 2 + 10):
+        mixed = str(row) if row < block else ('text' if row == block + 3 else f'{row}.5')
+        rows.append([str(row), f'k{row % 7}@@#tag{row % 3}', mixed, '' if row % 5 else str(row)] +
+                    [''] * (width - 4))
+    export = tmp_path / 'wide.csv'
+    export.write_text('\n'.join(','.join(row) for row in [header] + rows) + '\n', encoding='utf-8')
+
+    expected = pandas_output(export, 'cli', 'numbered')
+    for engine in (_stream, _parallel, _incremental):
+        assert engine(export, tmp_path / 'converted.csv', 'cli', 'numbered', None) == expected
+
+@pytest.mark.parametrize('mode', ['numbered', 'same_name', 'hashtag_separate'])
+def test_web_deliveries_match(tmp_path, client, mode):
+    # The default (streamed) delivery returns the same file as delivery=file
+    export = _write_export(tmp_path, 'typed')
+    bodies = []
+    for delivery in (None, 'file'):
+        form = {'conversion_type': mode, 'file': (io.BytesIO(export.read_bytes()), 'export.csv')}
+        if delivery:
+            form['delivery'] = delivery
+        response = client.post('/upload', data=form, content_type='multipart/form-data')
+        assert response.status_code == 200
+        bodies.append(response.data)
+        response.close()
+    assert bodies[0] == bodies[1]
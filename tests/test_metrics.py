@@ -0,0 +1,49 @@
+"""Metrics saved by several server processes are rendered summed."""
+
+import json
+import os
+
+from metrics import Registry
+
+def _registry(folder):
+    registry = Registry(str(folder))
+    counter = registry.counter('jobs_total', 'Jobs', ('status',))
+    histogram = registry.histogram('job_seconds', 'Job time', ('mode',))
+    return registry, counter, histogram
+
+def test_render_sums_processes(tmp_path):
+    registry, counter, histogram = _registry(tmp_path)
+    counter.inc(2, status='done')
+    histogram.observe(0.2, mode='numbered')
+
+    # Another process's saved values (its registry has the same metrics)
+    other, other_counter, other_histogram = _registry(tmp_path)
+    other_counter.inc(3, status='done')
+    other_counter.inc(status='error')
+    other_histogram.observe(0.2, mode='numbered')
+    snapshot = {'jobs_total': other_counter.dump(), 'job_seconds': other_histogram.dump()}
+    (tmp_path / 'metrics-1.json').write_text(json.dumps(snapshot), encoding='utf-8')
+    # Unreadable files are skipped
+    (tmp_path / 'metrics-2.json').write_text('{', encoding='utf-8')
+
+    lines = registry.render().splitlines()
+    assert 'jobs_total{status="done"} 5' in lines
+    assert 'jobs_total{status="error"} 1' in lines
+    assert 'job_seconds_count{mode="numbered"} 2' in lines
+    assert 'job_seconds_sum{mode="numbered"} 0.4' in lines
+
+def test_save_is_read_back(tmp_path):
+    registry, counter, _ = _registry(tmp_path)
+    counter.inc(status='done')
+    registry.save()
+    assert [path.name for path in tmp_path.iterdir()] == [f'metrics-{os.getpid()}.json']
+
+    # Saved values are not counted twice by the process that saved them
+    assert 'jobs_total{status="done"} 1' in registry.render().splitlines()
+
+def test_without_folder(tmp_path):
+    registry = Registry()
+    counter = registry.counter('jobs_total', 'Jobs', ('status',))
+    counter.inc(status='done')
+    registry.save()
+    assert 'jobs_total{status="done"} 1' in registry.render().splitlines()
@@ -0,0 +1,75 @@
+"""
+Round trips through reverse_convert: converting an export, collapsing the
+result back and converting that again must reproduce the first conversion
+byte for byte, for every mode and style, with and without a cap.
+"""
+
+import pytest
+
+import keywords_converter
+import web_app
+from keyword_columns import convert_columns
+from reverse_converter import detect_groups, reverse_convert
+
+EXPORT = (
+    'ID,ASSET_KEYWORDS,Title\n'
+    '1,research@@methodology@@#psychology@@#science,Psychology Research Study\n'
+    '2,data@@analysis@@#statistics@@machine learning@@neural networks,"Data, Analysis Report"\n'
+    '3,NA,Missing Keywords\n'
+    '4,null,Null Keywords\n'
+    '5,,Empty Keywords\n'
+    '6,coding@@NA@@programming@@null@@#technology,Software Development\n'
+    '7,#education,Hashtag Only\n'
+)
+
+CONVERTERS = {
+    ('cli', 'numbered'): keywords_converter.convert_keywords_format_numbered,
+    ('cli', 'same_name'): keywords_converter.convert_keywords_format_same_name,
+    ('cli', 'hashtag_separate'): keywords_converter.convert_keywords_format_hashtag_separate,
+    ('web', 'numbered'): web_app.convert_keywords_format_numbered,
+    ('web', 'same_name'): web_app.convert_keywords_format_same_name,
+    ('web', 'hashtag_separate'): web_app.convert_keywords_format_hashtag_separate,
+}
+
+@pytest.mark.parametrize('cap', [None, 2])
+@pytest.mark.parametrize('style, mode', sorted(CONVERTERS))
+def test_round_trip_is_byte_identical(tmp_path, style, mode, cap):
+    convert = CONVERTERS[style, mode]
+    export = tmp_path / 'export.csv'
+    export.write_text(EXPORT, encoding='utf-8')
+    converted = tmp_path / 'converted.csv'
+    collapsed = tmp_path / 'collapsed.csv'
+    reconverted = tmp_path / 'reconverted.csv'
+
+    assert convert(str(export), str(converted), cap=cap) is not None
+    groups, total_rows = reverse_convert(str(converted), str(collapsed))
+    assert total_rows == 7
+    assert list(groups) == ['ASSET_KEYWORDS']
+    assert convert(str(collapsed), str(reconverted), cap=cap) is not None
+
+    assert reconverted.read_bytes() == converted.read_bytes()
+
+def test_detect_groups_without_keyword_columns():
+    with pytest.raises(ValueError):
+        detect_groups(['ID', 'Title', 'Description'])
+
+@pytest.mark.parametrize('mode', ['numbered', 'same_name', 'hashtag_separate'])
+def test_lower_case_keyword_columns_round_trip(tmp_path, mode):
+    # A lower-case column cannot name its hashtag column after itself
+    export = tmp_path / 'export.csv'
+    export.write_text('ID,tags,SUBJECTS\n1,a@@#b@@c,x@@#y\n2,#d,z\n3,,\n', encoding='utf-8')
+    converted = tmp_path / 'converted.csv'
+    collapsed = tmp_path / 'collapsed.csv'
+    reconverted = tmp_path / 'reconverted.csv'
+
+    convert_columns(str(export), str(converted), ['tags', 'SUBJECTS'], mode)
+    header = converted.read_text(encoding='utf-8').splitlines()[0].split(',')
+    if mode == 'hashtag_separate':
+        assert header.count('tags') == 1
+        assert 'tags_hashtags' in header and 'subjects' in header
+
+    groups, total_rows = reverse_convert(str(converted), str(collapsed))
+    assert total_rows == 3
+    assert groups == {'tags': mode, 'SUBJECTS': mode}
+    convert_columns(str(collapsed), str(reconverted), ['tags', 'SUBJECTS'], mode)
+    assert reconverted.read_bytes() == converted.read_bytes()